@@ -0,0 +1,238 @@
+##
+## calexpr.py - part of wxfalsecolor
+##
+## $Id$
+## $URL$
+
+"""compiler for custom -r/-g/-b channel expressions
+
+Channel expressions are written in the cal language of pcomb. This
+module compiles the subset that is used in practice (arithmetic,
+if(), select(), floor(), log10(), clip() and the functions defined
+in TEMPLATE_PC0) into closures that evaluate the expression for an
+array of normalized values <v>. The expression is never passed to
+eval(). Anything outside the subset raises CalExprError and has to
+be handled by pcomb.
+"""
+
+import math
+import re
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import colormap
+
+
+_TOKENS = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)|([A-Za-z_][\w.]*)|(\S))")
+
+
+class CalExprError(Exception):
+    """expression is not supported by the array compiler"""
+    pass
+
+
+
+def _if(cond, a, b):
+    return numpy.where(numpy.asarray(cond) > 0, a, b)
+
+def _select(i, *args):
+    idx = numpy.floor(numpy.asarray(i) + .5)
+    result = numpy.where(idx == 0, len(args), numpy.nan)
+    for n,a in enumerate(args):
+        result = numpy.where(idx == n+1, a, result)
+    return result
+
+def _clip(x):
+    return numpy.clip(x, 0, 1)
+
+def _frac(x):
+    return x - numpy.floor(x)
+
+def _or(a, b):
+    return numpy.where(numpy.asarray(a) > 0, a, b)
+
+def _neq(a, b):
+    return numpy.where(numpy.asarray(a) - b - 1e-7 > 0, 1, numpy.asarray(b) - a - 1e-7)
+
+def _btwn(a, x, b):
+    return numpy.where(numpy.asarray(a) - x > 0, -1, numpy.asarray(b) - x)
+
+
+## name: (number of arguments or None for any, implementation)
+FUNCTIONS = {
+    'if':      (3, _if),
+    'select':  (None, _select),
+    'floor':   (1, numpy and numpy.floor),
+    'ceil':    (1, numpy and numpy.ceil),
+    'sqrt':    (1, numpy and numpy.sqrt),
+    'exp':     (1, numpy and numpy.exp),
+    'log':     (1, numpy and numpy.log),
+    'log10':   (1, numpy and numpy.log10),
+    'clip':    (1, _clip),
+    'frac':    (1, _frac),
+    'or':      (2, _or),
+    'neq':     (2, _neq),
+    'btwn':    (3, _btwn),
+    'def_red': (1, lambda x: colormap.interpTable(x, colormap.DEF_RED)),
+    'def_grn': (1, lambda x: colormap.interpTable(x, colormap.DEF_GRN)),
+    'def_blu': (1, lambda x: colormap.interpTable(x, colormap.DEF_BLU)),
+    'old_red': (1, lambda x: colormap.oldColors(x)[0]),
+    'old_grn': (1, lambda x: colormap.oldColors(x)[1]),
+    'old_blu': (1, lambda x: colormap.oldColors(x)[2])}
+
+
+
+class _Parser(object):
+    """recursive descent parser that returns closures of <v>"""
+
+    def __init__(self, text, constants, functions):
+        self.text = text
+        self.constants = constants
+        self.functions = functions
+        self.tokens = self._tokenize(text)
+        self.pos = 0
+
+    def _tokenize(self, text):
+        """split text into (kind, value) tokens"""
+        tokens = []
+        for number, name, op in _TOKENS.findall(text):
+            if number:
+                tokens.append(('num', float(number)))
+            elif name:
+                tokens.append(('name', name))
+            elif op:
+                if op not in "+-*/^(),":
+                    raise CalExprError("unsupported character '%s' in '%s'" % (op, text))
+                tokens.append(('op', op))
+        return tokens
+
+    def _peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def _next(self):
+        token = self._peek()
+        self.pos += 1
+        return token
+
+    def _expect(self, op):
+        if self._next() != ('op', op):
+            raise CalExprError("expected '%s' in '%s'" % (op, self.text))
+
+    def parse(self):
+        """compile complete expression"""
+        f = self._sum()
+        if self._peek() != (None, None):
+            raise CalExprError("unexpected '%s' in '%s'" % (self._peek()[1], self.text))
+        return f
+
+    def _sum(self):
+        f = self._product()
+        while self._peek() in (('op','+'), ('op','-')):
+            op = self._next()[1]
+            f = self._binary(op, f, self._product())
+        return f
+
+    def _product(self):
+        f = self._power()
+        while self._peek() in (('op','*'), ('op','/')):
+            op = self._next()[1]
+            f = self._binary(op, f, self._power())
+        return f
+
+    def _power(self):
+        ## '^' is right associative like in calcomp
+        f = self._unary()
+        if self._peek() == ('op','^'):
+            self._next()
+            f = self._binary('^', f, self._power())
+        return f
+
+    def _unary(self):
+        if self._peek() == ('op','-'):
+            self._next()
+            f = self._unary()
+            return lambda v: -f(v)
+        if self._peek() == ('op','+'):
+            self._next()
+        return self._primary()
+
+    def _primary(self):
+        kind, value = self._next()
+        if kind == 'num':
+            return lambda v: value
+        elif kind == 'op' and value == '(':
+            f = self._sum()
+            self._expect(')')
+            return f
+        elif kind == 'name':
+            if self._peek() == ('op','('):
+                return self._call(value)
+            elif value == 'v':
+                return lambda v: v
+            elif self.constants.has_key(value):
+                c = self.constants[value]
+                return lambda v: c
+            raise CalExprError("unsupported variable '%s' in '%s'" % (value, self.text))
+        raise CalExprError("syntax error in '%s'" % self.text)
+
+    def _call(self, name):
+        """compile function call with arguments"""
+        if not self.functions.has_key(name):
+            raise CalExprError("unsupported function '%s' in '%s'" % (name, self.text))
+        nargs, func = self.functions[name]
+        self._expect('(')
+        args = [self._sum()]
+        while self._peek() == ('op',','):
+            self._next()
+            args.append(self._sum())
+        self._expect(')')
+        if nargs is not None and len(args) != nargs:
+            raise CalExprError("wrong number of arguments for '%s' in '%s'" % (name, self.text))
+        return lambda v: func(*[a(v) for a in args])
+
+    def _binary(self, op, a, b):
+        if op == '+':
+            return lambda v: a(v) + b(v)
+        elif op == '-':
+            return lambda v: a(v) - b(v)
+        elif op == '*':
+            return lambda v: a(v) * b(v)
+        elif op == '/':
+            return lambda v: a(v) / b(v)
+        else:
+            return lambda v: numpy.power(a(v), b(v))
+
+
+
+def compileExpression(text, scale=1000, mult=179.0, ndivs=8, delta=0.5, bands=False):
+    """compile channel expression <text> into a function of <v>
+
+    The constants of TEMPLATE_PC0 are set from the arguments. With
+    <bands> set vin() quantizes values like 'vin(x) = stepv(x)'.
+    """
+    if numpy is None:
+        raise CalExprError("numpy is not available")
+    constants = {'PI': math.pi, 'EPS': 1e-7,
+                 'scale': scale, 'mult': mult, 'ndivs': ndivs, 'delta': delta}
+    functions = dict(FUNCTIONS)
+    stepv = lambda x: colormap.stepValues(x, ndivs)
+    functions['stepv'] = (1, stepv)
+    if bands:
+        functions['vin'] = (1, stepv)
+    else:
+        functions['vin'] = (1, lambda x: x)
+    f = _Parser(text, constants, functions).parse()
+
+    def evaluate(v):
+        err = numpy.seterr(all='ignore')
+        try:
+            result = numpy.nan_to_num(numpy.asarray(f(v), numpy.float64))
+        finally:
+            numpy.seterr(**err)
+        return numpy.broadcast_to(result, numpy.shape(v))
+    return evaluate
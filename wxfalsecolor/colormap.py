@@ -0,0 +1,188 @@
+##
+## colormap.py - part of wxfalsecolor
+##
+## $Id$
+## $URL$
+
+"""array implementation of the falsecolor mapping of TEMPLATE_PC0/PC1
+
+The functions in this module evaluate the same colour functions as
+the pcomb *.cal files, but as whole-array operations on a luminance
+plane. Colour schemes are compiled into dense lookup tables over the
+normalized value range 0..1 which are cached for all images.
+"""
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+## colour tables of def_redp, def_grnp and def_blup (without count)
+DEF_RED = (0.18848, 0.05468174,
+    0.00103547, 8.311144e-08, 7.449763e-06, 0.0004390987, 0.001367254,
+    0.003076, 0.01376382, 0.06170773, 0.1739422, 0.2881156, 0.3299725,
+    0.3552663, 0.372552, 0.3921184, 0.4363976, 0.6102754, 0.7757267,
+    0.9087369, 1, 1, 0.9863)
+DEF_GRN = (0.0009766, 2.35501e-05,
+    0.0008966244, 0.0264977, 0.1256843, 0.2865799, 0.4247083, 0.4739468,
+    0.4402732, 0.3671876, 0.2629843, 0.1725325, 0.1206819, 0.07316644,
+    0.03761026, 0.01612362, 0.004773749, 6.830967e-06, 0.00803605,
+    0.1008085, 0.3106831, 0.6447838, 0.9707)
+DEF_BLU = (0.2666, 0.3638662, 0.4770437,
+    0.5131397, 0.5363797, 0.5193677, 0.4085123, 0.1702815, 0.05314236,
+    0.05194055, 0.08564082, 0.09881395, 0.08324373, 0.06072902,
+    0.0391076, 0.02315354, 0.01284458, 0.005184709, 0.001691774,
+    2.432735e-05, 1.212949e-05, 0.006659406, 0.02539)
+
+## step width of the def_* tables (x/0.0454545+1)
+DEF_STEP = 0.0454545
+
+## number of entries in compiled colour lookup tables
+LUT_SIZE = 4096
+
+## compiled lookup tables by (scheme,ndivs)
+_lutCache = {}
+
+
+
+def interpTable(x, table):
+    """return interp_arr(x/0.0454545+1, table) for one def_* table"""
+    ## interp_arr() clamps to the first and last table entry
+    ## exactly like numpy.interp does
+    idx = numpy.asarray(x, numpy.float64) / DEF_STEP + 1
+    knots = numpy.arange(1, len(table)+1)
+    return numpy.interp(idx, knots, table)
+
+
+def defaultColors(x):
+    """return (r,g,b) planes of def_red, def_grn and def_blu for <x>"""
+    return [interpTable(x, table) for table in (DEF_RED,DEF_GRN,DEF_BLU)]
+
+
+def oldColors(x):
+    """return (r,g,b) planes of old_red, old_grn and old_blu for <x>"""
+    x = numpy.asarray(x, numpy.float64)
+    red = 1.6*x - .6
+    grn = numpy.where(x > .375, 1.6 - 1.6*x, 8/3.0*x)
+    blu = 1 - 8/3.0*x
+    return [red, grn, blu]
+
+
+SCHEMES = {'def':  defaultColors,
+           'spec': oldColors}
+
+
+class ColormapLUT(object):
+    """colour scheme compiled into a lookup table over values 0..1
+
+    Entry k holds the clipped colour of the centre of the interval
+    [k/size,(k+1)/size) and one extra entry holds the colour of 1.0.
+    Values below 0 or above 1 use the first or last entry, which
+    matches the clamping of interp_arr() and clip() of the built-in
+    schemes. With <ndivs> set the table holds the stepped (stepv)
+    colours and its size is a multiple of <ndivs> so that steps start
+    exactly at table entries.
+    """
+
+    def __init__(self, scheme, ndivs=0, size=LUT_SIZE):
+        self.scheme = scheme
+        self.ndivs = ndivs
+        if ndivs > 0:
+            size = ndivs * int(math.ceil(size / float(ndivs)))
+        self.size = size
+        x = numpy.append((numpy.arange(size) + 0.5) / size, 1.0)
+        if ndivs > 0:
+            x = stepValues(x, ndivs)
+        self.table = numpy.empty((3,size+1), numpy.float32)
+        for i,c in enumerate(SCHEMES[scheme](x)):
+            numpy.clip(c, 0, 1, out=self.table[i])
+
+    def apply(self, v):
+        """return planar (r,g,b) colours for values <v>"""
+        idx = numpy.asarray(v, numpy.float32) * self.size
+        numpy.clip(idx, 0, self.size, out=idx)
+        return self.table.take(idx.astype(numpy.intp), axis=1)
+
+
+def getColormap(scheme, ndivs=0):
+    """return cached lookup table for <scheme> (stepped with <ndivs>)"""
+    key = (scheme, ndivs)
+    if not _lutCache.has_key(key):
+        _lutCache[key] = ColormapLUT(scheme, ndivs)
+    return _lutCache[key]
+
+
+def mapValues(lum, scale, mult=179.0, decades=0):
+    """return luminance normalized to legend scale (with log mapping)"""
+    v = numpy.asarray(lum, numpy.float32) * numpy.float32(mult / float(scale))
+    if decades > 0:
+        ## map(x)=if(x-10^-decades,log10(x)/decades+1,0)
+        valid = v > 10**-decades
+        v = numpy.where(valid, numpy.log10(numpy.where(valid, v, 1)) / decades + 1, 0)
+        v = v.astype(numpy.float32)
+    return v
+
+
+def stepValues(v, ndivs):
+    """return values quantized to legend steps (stepv)"""
+    return numpy.floor(v * ndivs) / ndivs
+
+
+def gradientValues(xres, yres, vertical=True):
+    """return value plane of legend gradient (v=y/yres or v=x/xres)"""
+    if vertical:
+        ## pcomb counts y from the bottom of the picture
+        v = numpy.arange(yres-1, -1, -1, dtype=numpy.float32) / numpy.float32(yres)
+        return numpy.repeat(v[:,None], xres, axis=1)
+    v = numpy.arange(xres, dtype=numpy.float32) / numpy.float32(xres)
+    return numpy.repeat(v[None,:], yres, axis=0)
+
+
+def contourLines(v, ndivs, delta=0.5):
+    """return boolean plane of pixels on a contour line (isconta)"""
+    ## boundary(a,b) compares the step index of the left/right and
+    ## above/below neighbours; pixels at the border use themselves
+    steps = numpy.pad(numpy.floor(ndivs * v + delta), 1, 'edge')
+    horizontal = steps[1:-1,:-2] != steps[1:-1,2:]
+    vertical = steps[:-2,1:-1] != steps[2:,1:-1]
+    ## btwn(0,v,1) excludes v == 1
+    return (v >= 0) & (v < 1) & (horizontal | vertical)
+
+
+def colorizeValues(v, scheme='def', docont='', ndivs=8, zerooff=0.5, background=None):
+    """convert normalized values to planar float32 (r,g,b) colours
+
+    <scheme> is the name of a built-in scheme or a list of three
+    channel functions of <v> (which have to handle contour bands
+    themselves). <docont> selects contour lines ('a') or contour bands
+    ('b') like the -cl and -cb options. Pixels between contour lines
+    are set to <background> (r,g,b) planes or black.
+    """
+    if not isinstance(scheme, basestring):
+        result = numpy.empty((3,) + v.shape, numpy.float32)
+        for i,f in enumerate(scheme):
+            numpy.clip(f(v), 0, 1, out=result[i])
+    elif docont == 'b':
+        result = getColormap(scheme, ndivs).apply(v)
+    else:
+        result = getColormap(scheme).apply(v)
+    if docont == 'a':
+        outside = ~contourLines(v, ndivs, zerooff)
+        for i in range(3):
+            if background is None:
+                result[i][outside] = 0
+            else:
+                result[i][outside] = background[i][outside]
+    return result
+
+
+def falsecolorArray(lum, scale, mult=179.0, decades=0, scheme='def', **kwargs):
+    """convert luminance plane to planar float32 (r,g,b) falsecolor image
+
+    Further keyword arguments are passed on to colorizeValues().
+    """
+    v = mapValues(lum, scale, mult, decades)
+    return colorizeValues(v, scheme, **kwargs)
@@ -0,0 +1,93 @@
+##
+## compositor.py - part of wxfalsecolor
+##
+## $Id$
+## $URL$
+
+"""in-process replacement for combining pictures with pcompos
+
+Positions follow the pcompos convention: offsets are given for the
+lower left corner of each part, measured from the lower left corner
+of the result. Parts are planar float32 (r,g,b) arrays.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+
+def composeImages(parts, bgcolor=(0,0,0), xres=None, yres=None):
+    """combine list of (pixels,x,y) parts into new planar image
+
+    Without <xres> or <yres> the result is just large enough for all
+    parts. Parts are clipped at the border of the result and later
+    parts cover earlier ones.
+    """
+    if xres is None:
+        xres = max([p.shape[2] + x for p,x,y in parts] + [0])
+    if yres is None:
+        yres = max([p.shape[1] + y for p,x,y in parts] + [0])
+    result = numpy.empty((3,yres,xres), numpy.float32)
+    for i in range(3):
+        result[i] = bgcolor[i]
+    for pixels,x,y in parts:
+        placeImage(result, pixels, x, y)
+    return result
+
+
+def placeImage(target, pixels, x, y):
+    """copy <pixels> into <target> with lower left corner at (x,y)"""
+    yres, xres = target.shape[1:]
+    h, w = pixels.shape[1:]
+    top = yres - (y + h)
+    x0, y0 = max(x, 0), max(top, 0)
+    x1, y1 = min(x + w, xres), min(top + h, yres)
+    if x1 <= x0 or y1 <= y0:
+        return
+    target[:,y0:y1,x0:x1] = pixels[:,y0-top:y1-top,x0-x:x1-x]
+
+
+class StreamCompositor(object):
+    """combine a streamed picture with parts like composeImages() row by row
+
+    The streamed picture of <size> (xres,yres) is placed at (x,y)
+    below the (pixels,x,y) <parts>. Its scanlines are passed to
+    composeRows() from top to bottom, so only the static parts and
+    the current block of rows are kept in memory.
+    """
+
+    def __init__(self, size, x, y, parts, bgcolor=(0,0,0)):
+        self.width, self.height = size
+        self.x = x
+        self.parts = parts
+        self.bgcolor = bgcolor
+        self.xres = max([self.width + x] + [p.shape[2] + px for p,px,py in parts])
+        self.yres = max([self.height + y] + [p.shape[1] + py for p,px,py in parts])
+        ## first row of the streamed picture in the result
+        self.top = self.yres - (self.height + y)
+        self._row = 0
+
+    def _createRows(self, n, pixels=None):
+        """return next <n> rows of result with static parts over <pixels>"""
+        rows = numpy.empty((3,n,self.xres), numpy.float32)
+        for i in range(3):
+            rows[i] = self.bgcolor[i]
+        if pixels is not None:
+            rows[:,:,self.x:self.x+self.width] = pixels
+        ## shift lower left offsets of parts into the block of rows
+        shift = self.yres - (self._row + n)
+        for p,x,y in self.parts:
+            placeImage(rows, p, x, y - shift)
+        self._row += n
+        return rows
+
+    def composeRows(self, blocks):
+        """yield blocks of result rows for blocks (3,n,xres) of the streamed picture"""
+        if self.top > 0:
+            yield self._createRows(self.top)
+        for pixels in blocks:
+            yield self._createRows(pixels.shape[1], pixels)
+        if self._row < self.yres:
+            yield self._createRows(self.yres - self._row)
@@ -0,0 +1,143 @@
+##
+## displaycodec.py - part of wxfalsecolor
+##
+## $Id$
+## $URL$
+
+"""in-process 8-bit PPM, BMP and PNG encoders for float pictures
+
+Planar float (r,g,b) pixels are converted to RGBE first and then
+mapped to display values with a gamma lookup table indexed by
+exponent and mantissa, which is how ra_ppm and ra_bmp convert
+pictures. The encoders write blocks of scanlines to a file object
+and do not depend on wx.
+"""
+
+import cStringIO
+import struct
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import rgbecodec
+
+## display gamma of ra_ppm and ra_bmp
+DEFAULT_GAMMA = 2.2
+
+## number of scanlines converted at once
+WRITE_BLOCK = 64
+
+## zlib compression level of PNG data
+PNG_COMPRESSION = 6
+
+## lookup tables by gamma value
+_gammaCache = {}
+
+
+
+def getGammaTable(gamma=DEFAULT_GAMMA):
+    """return cached (256*256) uint8 table of display values by (exponent,mantissa)"""
+    if not _gammaCache.has_key(gamma):
+        expo = numpy.arange(256).reshape(256,1)
+        mant = numpy.arange(256).reshape(1,256)
+        values = (mant + 0.5) * numpy.ldexp(1.0, expo - (128+8))
+        table = numpy.minimum(256 * values**(1.0/gamma), 255).astype(numpy.uint8)
+        ## only a zero exponent is black (like ra_ppm)
+        table[0,:] = 0
+        _gammaCache[gamma] = table.ravel()
+    return _gammaCache[gamma]
+
+
+def toDisplayRGB(pixels, gamma=DEFAULT_GAMMA):
+    """return contiguous uint8 array (yres,xres,3) of display values"""
+    table = getGammaTable(gamma)
+    rgbe = rgbecodec.floatToRGBE(pixels)
+    base = rgbe[3].astype(numpy.intp) << 8
+    rgb = numpy.empty(pixels.shape[1:] + (3,), numpy.uint8)
+    for c in range(3):
+        rgb[:,:,c] = table.take(base + rgbe[c])
+    return rgb
+
+
+def _iterBlocks(pixels, gamma, reverse=False):
+    """yield display values of blocks of scanlines (top to bottom or reversed)"""
+    yres = pixels.shape[1]
+    starts = range(0, yres, WRITE_BLOCK)
+    if reverse:
+        starts.reverse()
+    for y0 in starts:
+        rgb = toDisplayRGB(pixels[:,y0:y0+WRITE_BLOCK], gamma)
+        if reverse:
+            rgb = rgb[::-1]
+        yield rgb
+
+
+def writePPM(fileobj, pixels, gamma=DEFAULT_GAMMA):
+    """write binary PPM (P6) image"""
+    yres, xres = pixels.shape[1:]
+    fileobj.write("P6\n%d %d\n255\n" % (xres,yres))
+    for rgb in _iterBlocks(pixels, gamma):
+        fileobj.write(rgb.tostring())
+
+
+def writeBMP(fileobj, pixels, gamma=DEFAULT_GAMMA):
+    """write uncompressed 24-bit BMP image (bottom-up scanlines)"""
+    yres, xres = pixels.shape[1:]
+    padding = (4 - (3*xres) % 4) % 4
+    size = (3*xres + padding) * yres
+    fileobj.write(struct.pack("<2sIHHI", "BM", 14+40+size, 0, 0, 14+40))
+    fileobj.write(struct.pack("<IiiHHIIiiII", 40, xres, yres, 1, 24, 0, size, 2835, 2835, 0, 0))
+    for rgb in _iterBlocks(pixels, gamma, reverse=True):
+        bgr = rgb[:,:,::-1]
+        if padding:
+            pad = numpy.zeros((rgb.shape[0], padding), numpy.uint8)
+            fileobj.write(numpy.hstack((bgr.reshape(rgb.shape[0], 3*xres), pad)).tostring())
+        else:
+            fileobj.write(numpy.ascontiguousarray(bgr).tostring())
+
+
+def _writeChunk(fileobj, kind, data):
+    """write PNG chunk with length and CRC"""
+    fileobj.write(struct.pack(">I", len(data)))
+    fileobj.write(kind)
+    fileobj.write(data)
+    fileobj.write(struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+
+def writePNG(fileobj, pixels, gamma=DEFAULT_GAMMA):
+    """write 8-bit RGB PNG image with one IDAT chunk per block of scanlines"""
+    yres, xres = pixels.shape[1:]
+    fileobj.write("\x89PNG\r\n\x1a\n")
+    _writeChunk(fileobj, "IHDR", struct.pack(">IIBBBBB", xres, yres, 8, 2, 0, 0, 0))
+    ## gAMA stores 1/gamma of the encoded values
+    _writeChunk(fileobj, "gAMA", struct.pack(">I", int(round(100000.0 / gamma))))
+    compressor = zlib.compressobj(PNG_COMPRESSION)
+    for rgb in _iterBlocks(pixels, gamma):
+        ## filter type 0 (None) for each scanline
+        rows = numpy.zeros((rgb.shape[0], 3*xres+1), numpy.uint8)
+        rows[:,1:] = rgb.reshape(rgb.shape[0], 3*xres)
+        data = compressor.compress(rows.tostring())
+        if data:
+            _writeChunk(fileobj, "IDAT", data)
+    _writeChunk(fileobj, "IDAT", compressor.flush())
+    _writeChunk(fileobj, "IEND", "")
+
+
+FORMATS = {'ppm': writePPM,
+           'bmp': writeBMP,
+           'png': writePNG}
+
+
+def writeImage(fileobj, pixels, format, gamma=DEFAULT_GAMMA):
+    """write pixels in <format> ('ppm', 'bmp' or 'png') to file object"""
+    FORMATS[format](fileobj, pixels, gamma)
+
+
+def encodeImage(pixels, format, gamma=DEFAULT_GAMMA):
+    """return image string of pixels in <format>"""
+    io = cStringIO.StringIO()
+    writeImage(io, pixels, format, gamma)
+    return io.getvalue()
@@ -7,12 +7,34 @@ import time
 import shlex
 import shutil
 import math
+import mmap
 import traceback
 import logging
+import multiprocessing
 from subprocess import Popen, PIPE
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import calexpr
+import colormap
+import compositor
+import displaycodec
+import glyphs
+import headerscan
+import imagestats
+import legendcache
+import paralleldecode
+import photometry
+import rgbecodec
+
 VERSION=0.4
 
+## number of scanlines converted at once in streaming mode (-stream)
+STREAM_BLOCK = 32
+
 TEMPLATE_PC0 = """
 PI : 3.14159265358979323846 ;
 scale : %u ;
@@ -90,6 +112,11 @@ ba = bi(nfiles);
 
 """
 
+## channel expressions with an array implementation in colormap
+COLOR_SCHEMES = {'def':  ('def_red(vin(v))', 'def_grn(vin(v))', 'def_blu(vin(v))'),
+                 'spec': ('old_red(vin(v))', 'old_grn(vin(v))', 'old_blu(vin(v))')}
+
+
 def findBinaryInPath(app, binpath=""):
     """search for app in system search path"""
     paths = os.environ["PATH"]
@@ -117,7 +144,7 @@ def showHelp():
     ("-p",  "IMG", "use IMG as background image"), 
     ("-ip", "IMG", "use IMG as input and background image"), 
 
-    ("-s", "SCALE", "set maximum legend value to SCALE"),
+    ("-s", "SCALE", "set maximum legend value to SCALE; \"auto\" uses the brightest pixel\nand \"auto:pNN\" the NNth percentile of the image luminance"),
     ("-n", "STEPS", "create legend with STEPS subdivisions"),
     ("-l", "LABEL", "use LABEL as legend title; default is \"Lux\" or \"cd/m2\""),
     ("-log", "DEC", "create logarithmic scale with DEC decades below maximum"),
@@ -125,11 +152,16 @@ def showHelp():
     ("-lh", "HEIGHT", "set legend height in pixels"),
     ("-lw", "WIDTH", "set legend width in pixels"),
     ("-lp", "[-]WS|W|WN|NW|N|NE|EN|E|ES|SE|S|SW", "set legend position to the given direction (default EN);\nif preceded by \"-\" the legend will be within the image frame"),  
+    ("-lc", "DIR", "keep legend images in DIR for reuse by further runs"),
 
     ("-cl", "", "create contour lines"),
     ("-cb", "", "create contour bands"),
 
     ("-e", "", "show values of brightest and darkest pixel"),
+    ("-flat", "", "write flat Radiance picture (faster than run length encoding)"),
+    ("-stream", "", "convert and write the picture scanline by scanline while it is read;\noptions that need all pixels (-s auto, -e, -of) read the whole picture"),
+    ("-of", "hdr|ppm|bmp|png", "set format of output image (default hdr)"),
+    ("-j", "N", "decode large input pictures with N processes (0 for all CPUs; default 1)"),
     ("-z", "", "create legend with values starting at zero"),
     ("-spec", "", "use old style color scheme"),
     ("-mask", "MINV", "mask values below MINV with background colour (black)"),
@@ -139,6 +171,8 @@ def showHelp():
     ("-g", "EXPR", "set mapping of green colour channel"),
     ("-b", "EXPR", "set mapping of blue colour channel"),
     
+    ("--info", "PATH ...", "write header information of all pictures in PATHs (files or\ndirectories) to STDOUT as JSON lines and exit; only headers are read"),
+
     ("-v", "", "write more progress messages to STDERR"),	
     ("-d", "", "write detailed progress messages to STDERR"),	
     ("-df","LOGFILE", "write detailed progress messages to LOGFILE\nLOGFILE can not start with '-'"), 
@@ -265,11 +299,10 @@ class FalsecolorBase:
         """extract resolution string from image and return (x,y) size"""
         try:
             f = open(path, 'rb')
-            data = f.read()
-            f.close()
-            header, bdata = data.split("\n\n")
-            parts = bdata.split("\n")[0].split()
-            return (int(parts[3]),int(parts[1]))
+            try:
+                return rgbecodec.readPictureHeader(f).resolution
+            finally:
+                f.close()
         except Exception, err:
             self._log.error(str(err))
             return (0,0)
@@ -321,6 +354,7 @@ class FalsecolorOptionParser(FalsecolorBase):
             '-lh'   : ('setLegendHeight',   self._validateInt,    True),
             '-z'    : ('setLegendOffset',   self._validateBool,   False),
             '-lp'   : ('setLegendPosition', self._validatePos,    True),
+            '-lc'   : ('setLegendCache',    self._validateTrue,   True),
             '-l'    : ('setLegendLabel',    self._validateTrue,   True),
             '-log'  : ('setDecades',        self._validateInt,    True),
             '-s'    : ('setScale',          self._validateScale,  True),
@@ -339,6 +373,10 @@ class FalsecolorOptionParser(FalsecolorBase):
             '-d'    : ('_DEBUG',            self._validateDebug,  False),
             '-df'   : ('_logfile',          self._validateDebug,  True),
             '-e'    : ('doextrem',          self._validateTrue,   False),
+            '-flat' : ('flat',              self._validateTrue,   False),
+            '-stream' : ('stream',          self._validateTrue,   False),
+            '-of'   : ('outputformat',      self._validateFormat, True),
+            '-j'    : ('workers',           self._validateWorkers, True),
             '-v'    : ('_VERBOSE',          self._validateDebug,  False)}
 
         if len(args) != 0:
@@ -367,9 +405,10 @@ class FalsecolorOptionParser(FalsecolorBase):
             if k == None:
                 pass
             elif k == '-spec':
-                self._settings['redv'] = 'old_red(vin(v))'
-                self._settings['grnv'] = 'old_grn(vin(v))'
-                self._settings['bluv'] = 'old_blu(vin(v))'
+                redv, grnv, bluv = COLOR_SCHEMES['spec']
+                self._settings['redv'] = redv
+                self._settings['grnv'] = grnv
+                self._settings['bluv'] = bluv
             
             elif self.validators.has_key(k):
                 setting, validator, requires_arg = self.validators[k]
@@ -426,6 +465,21 @@ class FalsecolorOptionParser(FalsecolorBase):
             return True
 
 
+    def _validateFormat(self, k, v):
+        """return output format keyword"""
+        v = v.lower()
+        if v == 'hdr':
+            return v
+        elif displaycodec.FORMATS.has_key(v) and not rgbecodec.HAVE_NUMPY:
+            self.error = "output format '%s' requires numpy" % v
+            return False
+        elif displaycodec.FORMATS.has_key(v):
+            return v
+        else:
+            self.error = "wrong value for option %s: '%s'" % (k,v)
+            return False
+
+
     def _validateFloat(self, k, v):
         """return true if v is Float"""
         try:
@@ -453,6 +507,17 @@ class FalsecolorOptionParser(FalsecolorBase):
             return i
    
 
+    def _validateWorkers(self, k, v):
+        """return number of decoding processes (0 for all CPUs)"""
+        i = self._validateInt(k, v)
+        if self.error:
+            return False
+        if i < 0:
+            self.error = "illegal value for option %s: %d" % (k,i)
+            return False
+        return i
+
+
     def _validatePath(self, k, v):
         """return true if v is existing file path"""
         if os.path.isfile(v):
@@ -476,9 +541,19 @@ class FalsecolorOptionParser(FalsecolorBase):
     
 
     def _validateScale(self, k, v):
-        """add keyword to validation of scale value"""
+        """add keywords 'auto' and 'auto:pNN' to validation of scale value"""
         if v.lower().startswith('a'):
-            return 'auto'
+            if not ":" in v:
+                return 'auto'
+            percentile = v.lower().split(":",1)[1]
+            try:
+                p = float(percentile[1:])
+            except ValueError:
+                p = -1
+            if percentile.startswith('p') and 0 < p <= 100:
+                return 'auto:p%s' % percentile[1:]
+            self.error = "wrong value for option %s: '%s'" % (k,v)
+            return False
         else:
             return self._validateFloat(k,v)
 
@@ -492,10 +567,15 @@ class FalsecolorOptionParser(FalsecolorBase):
 class FalsecolorLegend(FalsecolorBase):
     """legend for falsecolor image"""
 
+    ## attributes changed by the legend layout (restored from cache)
+    _layoutAttributes = ('height', '_textheight', '_legendOffX', '_legendOffY',
+                         '_gradientOffX', '_gradientOffY')
+
     def __init__(self, img, log=None):
         
         FalsecolorBase.__init__(self, log)
         self._image = img
+        self.cachedir = ''
         self.resetDefaults()
 
 
@@ -505,6 +585,26 @@ class FalsecolorLegend(FalsecolorBase):
             return ''
         path = self.createLegend()
         legW,legH = self.getImageSize(path) 
+        legX,legY,imgX,imgY = self.getOffsets(legW, legH)
+
+        ## build command line for final pcompos command
+        cmd = "pcompos -bg %.f %.f %.f" % self.bgcolor 
+        cmd += " - %d %d \"%s\" %d %d" % (imgX,imgY,path,legX,legY)
+        return cmd
+
+
+    def createPixels(self):
+        """create legend image and return planar (r,g,b) pixels or None"""
+        if self.width < 20 or self.height < 20:
+            return None
+        if self.scheme is not None:
+            return self.getLegendPixels()
+        path = self.createLegend()
+        return rgbecodec.decodePicture(file(path, 'rb').read(), original=False)[0]
+
+
+    def getOffsets(self, legW, legH):
+        """return offsets (legX,legY,imgX,imgY) of legend and image"""
         imgW,imgH = self._image.getImageResolution()
         
         ## offset table: ( pos,     legX,          legY, imgX, imgY)
@@ -532,33 +632,68 @@ class FalsecolorLegend(FalsecolorBase):
                    'WS':  (            0,             0, legW,    0),    
                    'EN':  (         imgW,     imgH-legH,    0,    0),
                    'WN':  (            0,     imgH-legH, legW,    0)}
-        
-        ## build command line for final pcompos command
-        legX,legY,imgX,imgY = offsets[self.position]
-        cmd = "pcompos -bg %.f %.f %.f" % self.bgcolor 
-        cmd += " - %d %d \"%s\" %d %d" % (imgX,imgY,path,legX,legY)
-        return cmd
+        return offsets[self.position]
+
+
+    def getCacheKey(self):
+        """return tuple of all settings that affect the legend pixels"""
+        img = self._image
+        layout = tuple([getattr(self, a) for a in self._layoutAttributes])
+        return (self.scale, self.steps, self.decades, self.zerooff, self.label,
+                tuple(self.fgcolor), tuple(self.bgcolor), self.width, self.position, layout,
+                img.redv, img.grnv, img.bluv, img.docont, img.ndivs, img.zerooff, img.mult)
+
+
+    def getLegendPixels(self):
+        """return cached legend image or create and cache new legend"""
+        key = self.getCacheKey()
+        entry = legendcache.legendCache.get(key, self.cachedir)
+        if entry:
+            self._log.debug("using cached legend image")
+            pixels, state = entry
+            for k,v in state.items():
+                setattr(self, k, v)
+            return pixels
+        pixels = self.createLegendPixels()
+        state = dict([(a, getattr(self, a)) for a in self._layoutAttributes])
+        legendcache.legendCache.put(key, pixels, state, self.cachedir)
+        return pixels
 
 
     def createColorScale(self):
         """create color gradient image with pcomb and return path"""
+        colwidth, colheight = self._getColorScaleSize()
         if self.is_vertical():
             args = "-e v=y/yres;vleft=v;vright=v;vbelow=(y-1)/yres;vabove=(y+1)/yres;"
+        else:
+            args = "-e v=x/xres;vleft=(x-1)/xres;vright=(x+1)/xres;vbelow=v;vabove=v;"
+        cmd = "pcomb %s %s -x %d -y %d" % (self.pc0args, args, colwidth, colheight) 
+        path = self._createTempFileFromCmd(cmd)
+        self._log.debug("gradient file='%s'" % path)
+        return path  
+
+
+    def _createColorScalePixels(self):
+        """create color gradient image in memory"""
+        colwidth, colheight = self._getColorScaleSize()
+        v = colormap.gradientValues(colwidth, colheight, self.is_vertical())
+        img = self._image
+        return colormap.colorizeValues(v, self.scheme, img.docont, img.ndivs, img.zerooff)
+
+
+    def _getColorScaleSize(self):
+        """return size of color gradient and set offsets of legend parts"""
+        if self.is_vertical():
             colheight = self.height
             colwidth = max(int(self.width*0.3), 25)
             self._legendOffX = colwidth + 3                         ## x-offset for legend
             if self.zerooff == 0:
                 self._gradientOffY = int(self._textheight / 2.0)    ## y-offset for gradient
         else:
-            args = "-e v=x/xres;vleft=(x-1)/xres;vright=(x+1)/xres;vbelow=v;vabove=v;"
             colwidth = self.width
             colheight = max(int(self.height*0.5), 25)
             self._gradientOffY = self.height - colheight
-
-        cmd = "pcomb %s %s -x %d -y %d" % (self.pc0args, args, colwidth, colheight) 
-        path = self._createTempFileFromCmd(cmd)
-        self._log.debug("gradient file='%s'" % path)
-        return path  
+        return colwidth, colheight
 
         
     def createLegend(self):
@@ -595,11 +730,56 @@ class FalsecolorLegend(FalsecolorBase):
         path = self._createTempFileFromCmd(cmd)
         self._log.info("legend file='%s'" % path)
         return path  
+
+
+    def createLegendPixels(self):
+        """create legend image in memory and return planar (r,g,b) pixels"""
+        legimg = self._createTextPixels()
+        colimg = self._createColorScalePixels()
+        
+        ## combine gradient and legend
+        legend = compositor.composeImages([(colimg, self._gradientOffX, self._gradientOffY),
+                                           (legimg, self._legendOffX,   self._legendOffY)], self.bgcolor)
+        
+        ## add label at top (vertical) or left (horizontal)
+        labimg = glyphs.renderText(self.label, self._textheight, self.fgcolor, self.bgcolor)
+        laby,labx = labimg.shape[1:]
+        legy,legx = legend.shape[1:]
+        xres, yres = None, None
+        if self.is_vertical():
+            if not self.position.startswith("-"):
+                xres = self.width
+            parts = [(labimg, int((legx-labx)/2.0), legy), (legend, 0, 0)]
+        else:
+            if not self.position.startswith("-"):
+                yres = self.height
+            parts = [(labimg, 0, int((legy-laby)/2.0)), (legend, labx, 0)]
+        legend = compositor.composeImages(parts, self.bgcolor, xres, yres)
+        self._log.info("legend size=%dx%d" % (legend.shape[2],legend.shape[1]))
+        return legend
         
 
     def createText(self):
         """create legend image with psign and return path"""
-        ## legend values
+        textlist = self.getLegendText()
+        if self.is_vertical():
+            return self._createTextV(textlist)
+        else:
+            return self._createTextH(textlist)
+
+
+    def _createTextPixels(self):
+        """create legend text image in memory"""
+        textlist = self.getLegendText()
+        if self.is_vertical():
+            self._setTextHeightV(textlist)
+            return glyphs.renderText(textlist, self._textheight, self.fgcolor, self.bgcolor)
+        else:
+            return self._createTextHPixels(textlist)
+
+
+    def getLegendText(self):
+        """return list of formated legend values from top to bottom"""
         textlist = []
         for i in range(self.steps):
             if self.decades > 0:
@@ -611,28 +791,29 @@ class FalsecolorLegend(FalsecolorBase):
         if self.zerooff == 0:
             textlist.append(self.formatNumber(0))
         self._log.info( "legend text: '%s'" % str(textlist) )
-        if self.is_vertical():
-            return self._createTextV(textlist)
-        else:
-            return self._createTextH(textlist)
+        return textlist
         
 
     def _createTextV(self, textlist):
         """create vertical legend text with psign"""
-        self._textheight = math.floor(self.height / self.steps)
+        self._setTextHeightV(textlist)
         fg = "-cf %.f %.f %.f" % self.fgcolor
-        bg = "-cb %.f %.f %.f" % (0,0,1)
         bg = "-cb %.f %.f %.f" % self.bgcolor
         cmd = "psign -s -.15 %s %s -h %d" % (fg,bg,self._textheight)
         text = "\n".join(textlist)
         path = self._createTempFileFromCmd(cmd, text+"\n")
         self._log.debug("legtxt file='%s'" % path)
+        return path
+
+
+    def _setTextHeightV(self, textlist):
+        """set text height and adjust legend height to full text lines"""
+        self._textheight = math.floor(self.height / self.steps)
         if self.zerooff == 0:
             self.height = self._textheight * (len(textlist) - 1)
         else:
             self.height = self._textheight * len(textlist)
         self._log.debug("new legend height='%d'" % self.height)
-        return path
 
 
     def _createTextH(self, textlist):
@@ -671,6 +852,30 @@ class FalsecolorLegend(FalsecolorBase):
         path = self._createTempFileFromCmd(" ".join(parts))
         return path
 
+
+    def _createTextHPixels(self, textlist):
+        """create horizontal legend text in memory"""
+        textlist.reverse()
+        if self.zerooff > 0:
+            incr = self.width/len(textlist)
+        else:
+            incr = self.width/(len(textlist)-1)
+            self._gradientOffX = int(incr/2)
+
+        ## adjust textheight if numbers are wider than steps
+        textheight = self._textheight
+        max_x = max([glyphs.textSize([n], textheight)[0] for n in textlist])
+        if incr < max_x:
+            textheight = int(self._textheight * (incr / float(max_x)))
+            self._log.debug("adjusting text height for legend: %d" % textheight)
+            self._legendOffY = int((self._textheight-textheight)/float(2))
+
+        parts = []
+        for i,n in enumerate(textlist):
+            img = glyphs.renderText(n, textheight, self.fgcolor, self.bgcolor)
+            parts.append((img, int((i+0.5)*incr - img.shape[2]*0.5), 0))
+        return compositor.composeImages(parts, self.bgcolor)
+
     
     def _createTextHNumbers(self, textlist, textheight):
         """return list of legend numbers and max width in pixels"""
@@ -722,6 +927,7 @@ class FalsecolorLegend(FalsecolorBase):
     def resetDefaults(self):
         """restore default values for legend"""
         self.label = "cd/m2"
+        self.scheme = None
         self.border = 0
         self.height = 200
         self.width = 100
@@ -801,9 +1007,14 @@ class FalsecolorImage(FalsecolorBase):
         self.resetDefaults()
 
         self.data = None
+        self._pixels = None
+        self._luminance = None
+        self._fcpixels = None
+        self._stats = None
         self.vertical = True    # future flag for horizontal legend
         self.tmpdir = ''
         self._irridiance = False
+        self._coefficients = photometry.RGB_COEFFICIENTS
         self._resolution = (0,0)
 
         if len(args) > 0:
@@ -812,6 +1023,9 @@ class FalsecolorImage(FalsecolorBase):
     
     def applyMask(self):
         """mask values below self.mask with black"""
+        if rgbecodec.HAVE_NUMPY:
+            self._applyMaskNative()
+            return
         if self.picture == "-":
             fd,maskImg = tempfile.mkstemp(suffix=".hdr",dir=self.tmpdir)
             f = open(maskImg, 'wb')
@@ -826,6 +1040,15 @@ class FalsecolorImage(FalsecolorBase):
         self.data = self._popenPipeCmd(cmd, self.data)
 
 
+    def _applyMaskNative(self):
+        """set falsecolor pixels below self.mask to black in place"""
+        pixels = self._getFalsecolorPixels()
+        below = self.getLuminance() * self.mult <= self.mask
+        self._log.debug("applyMask: %d pixels below mask value %s" % (below.sum(), self.mask))
+        pixels[:,below] = 0
+        self.data = None
+
+
     def cleanup(self):
         """delete self.tmpdir - throws error on Windows (files still in use)"""
         try:
@@ -867,15 +1090,32 @@ class FalsecolorImage(FalsecolorBase):
             self.cpict = ''
     
     
+    def _composeImage(self):
+        """place image, legend and extremes labels in one new buffer"""
+        pixels = self._getFalsecolorPixels()
+        parts = [(pixels, 0, 0)]
+        legend = self.legend.createPixels()
+        if legend is not None:
+            legH,legW = legend.shape[1:]
+            legX,legY,imgX,imgY = self.legend.getOffsets(legW, legH)
+            self._log.debug("legend offset=(%d,%d) image offset=(%d,%d)" % (legX,legY,imgX,imgY))
+            parts = [(pixels, imgX, imgY), (legend, legX, legY)]
+        if self.doextrem is True:
+            parts += self._getExtremesLabels()
+        self._fcpixels = compositor.composeImages(parts, self.legend.bgcolor)
+        self.data = None
+
+
     def _createLegend(self):
         """create legend images and combine with image"""
         combinecmd = self.legend.create()
         if combinecmd != '':
             self.data = self._popenPipeCmd(combinecmd, self.data)
+            self._fcpixels = None
 
 
     def doFalsecolor(self):
-        """create part images, combine and store image data in self.data"""
+        """create part images and combine them (see getData() and writeData())"""
         if self.error != "":
             self._log.error(self.error)
             return False 
@@ -885,15 +1125,17 @@ class FalsecolorImage(FalsecolorBase):
                 self.readImageData()
             if self._input:
                 self.falsecolor()
-            if self.data and self.mask > 0:
+            if self.mask > 0 and self._hasData():
                 self.applyMask()
-            if self.data:
+            if self._hasData() and rgbecodec.HAVE_NUMPY:
+                self._composeImage()
+            elif self.data:
                 self._createLegend()
-            if self.data and self.doextrem is True:
-                self.showExtremes()
+                if self.data and self.doextrem is True:
+                    self.showExtremes()
             self.cleanup()
 
-            if self.data and self.error == "":
+            if self._hasData() and self.error == "":
                 return True
             else:
                 self._log.error("no data in falsecolor image")
@@ -911,18 +1153,93 @@ class FalsecolorImage(FalsecolorBase):
         """convert image data to falsecolor image data"""
         if data == "":
             data = self._input
-        self._createCalFiles()
-        cmd = "pcomb %s %s - %s" % (self.pc0args, self.pc1args, self.cpict)
-        self.data = self._popenPipeCmd(cmd, data)
+        scheme = self._getColorScheme()
+        self.legend.scheme = scheme
+        if scheme and data is self._input:
+            background = self._getBackground()
+            self._createCalFiles()
+            self._falsecolorNative(scheme, background)
+        else:
+            self._createCalFiles()
+            cmd = "pcomb %s %s - %s" % (self.pc0args, self.pc1args, self.cpict)
+            self.data = self._popenPipeCmd(cmd, data)
+            self._fcpixels = None
+
+
+    def _falsecolorNative(self, scheme, background=None):
+        """convert luminance of input image with colormap arrays"""
+        if isinstance(scheme, basestring):
+            self._log.debug("falsecolor: native conversion (scheme='%s' docont='%s')" % (scheme,self.docont))
+        else:
+            self._log.debug("falsecolor: native conversion of channel expressions (docont='%s')" % self.docont)
+        lum = self.getLuminance()
+        self._fcpixels = colormap.falsecolorArray(lum, self.scale, self.mult, self.decades, scheme,
+                docont=self.docont, ndivs=self.ndivs, zerooff=self.zerooff, background=background)
+        self.data = None
+
+
+    def _flushPixels(self):
+        """encode modified falsecolor pixels as Radiance picture in self.data"""
+        if self.data is None and self._fcpixels is not None:
+            self.data = rgbecodec.encodePicture(self._fcpixels, self._getHeaderLines())
+
+
+    def _getFalsecolorPixels(self):
+        """return falsecolor pixels (decoded from self.data if necessary)"""
+        if self._fcpixels is None:
+            self._fcpixels = rgbecodec.decodePicture(self.data, original=False)[0]
+        return self._fcpixels
+
+
+    def _getBackground(self):
+        """return raw pixels of background picture for contour lines"""
+        if self.cpict == '' or self.docont != 'a':
+            return None
+        if self.cpict == self.picture:
+            data = self._input
+        else:
+            data = file(self.cpict, "rb").read()
+        pixels, resolution = rgbecodec.decodePicture(data, original=False)
+        if resolution != self._resolution:
+            raise ValueError("background image size does not match (%dx%d)" % resolution)
+        return pixels
+
+
+    def _getColorScheme(self):
+        """return colormap scheme for native conversion or None for pcomb"""
+        if not rgbecodec.HAVE_NUMPY:
+            return None
+        channels = (self.redv, self.grnv, self.bluv)
+        for scheme,expressions in COLOR_SCHEMES.items():
+            if channels == expressions:
+                return scheme
+        try:
+            return [calexpr.compileExpression(expr, self.scale, self.mult, self.ndivs,
+                        self.zerooff, self.docont == 'b') for expr in channels]
+        except calexpr.CalExprError, err:
+            self._log.info("using pcomb for channel expressions: %s" % str(err))
+            return None
+
+
+    def _getHeaderLines(self, lines=None):
+        """return header lines of input (indented like pcomb) and history"""
+        if lines is None:
+            lines, resstring, offset = rgbecodec.parseHeader(self._input)
+        ## falsecolor pixels are RGB with default primaries
+        lines = ["\t" + l for l in lines[1:] if l and not l.startswith(("FORMAT=","PRIMARIES="))]
+        history = "falsecolor2 -s %s -n %d -m %s" % (self.formatNumber(self.scale), self.ndivs, self.mult)
+        if self.decades > 0:
+            history += " -log %d" % self.decades
+        if self.docont:
+            history += {'a': " -cl", 'b': " -cb"}[self.docont]
+        lines.append(history)
+        return lines
 
     
-    def findAutoScale(self):
+    def findAutoScale(self, keyword="auto"):
         """quick'n'dirty version for auto scale"""
-        self._log.debug("findAutoScale()") 
-        cmd = "pextrem -o"
-        extreme = self._popenPipeCmd(cmd, self._input+"\n")
-        minx,miny,minr,ming,minb, maxx,maxy,maxr,maxg,maxb = extreme.split()
-        maxv = (float(maxr)*0.265+float(maxg)*0.67+float(maxb)*0.065)*self.mult
+        self._log.debug("findAutoScale(%s)" % keyword) 
+        maxv = self._getAutoScaleLuminance(keyword) * self.mult
         for d in [0.001,0.01,0.1,1,10,100,1000,10000,100000,1000000]:
             for s in range(1,10):
                 for ss in range(1,10):
@@ -938,14 +1255,239 @@ class FalsecolorImage(FalsecolorBase):
         self.legend.scale = 1000
 
 
+    def _getAutoScaleLuminance(self, keyword):
+        """return luminance of brightest pixel or percentile of 'auto:pNN'"""
+        if keyword.startswith("auto:p"):
+            percentile = float(keyword[6:])
+            if rgbecodec.HAVE_NUMPY:
+                lum = self.getStatistics().getPercentile(percentile)
+                self._log.debug("    percentile %s=%g" % (keyword[5:],lum))
+                return lum
+            self._log.warning("percentile scale needs numpy; using brightest pixel")
+        minx,miny,minr,ming,minb, maxx,maxy,maxr,maxg,maxb = self.getExtremes()
+        return self.getPixelLuminance(maxr, maxg, maxb)
+
+
     def formatNumber(self,n):
         return self.legend.formatNumber(n)
 
 
+    def getData(self):
+        """return falsecolor image as Radiance picture string"""
+        self._flushPixels()
+        return self.data
+
+
+    def writeData(self, fileobj, rle=None):
+        """write falsecolor image to file object
+
+        Pixels are encoded while they are written in the format of the
+        -of option. Without <rle> the encoding of Radiance pictures
+        follows the -flat option.
+        """
+        if rle is None:
+            rle = not self.flat
+        if self.outputformat != 'hdr':
+            displaycodec.writeImage(fileobj, self._getDisplayPixels(), self.outputformat)
+        elif self._fcpixels is not None:
+            rgbecodec.writePicture(fileobj, self._fcpixels, self._getHeaderLines(), rle)
+        else:
+            fileobj.write(self.data)
+
+
+    def doFalsecolorStream(self, fileobj):
+        """convert input picture scanline by scanline and write it to <fileobj>
+
+        Only a few blocks of scanlines and the legend are kept in
+        memory. Options that need all pixels of the picture fall back
+        to doFalsecolor() and writeData().
+        """
+        if self.error != "":
+            self._log.error(self.error)
+            return False
+        limitation = self._getStreamLimitation()
+        if limitation:
+            self._log.info("streaming mode not possible: %s" % limitation)
+            return self._writeBuffered(fileobj)
+        try:
+            if self.picture == "-":
+                infile = sys.stdin
+            else:
+                infile = open(self.picture, 'rb')
+            try:
+                stream = rgbecodec.ScanlineStream(infile)
+                if stream.orientation != ('-Y','+X'):
+                    self._log.info("streaming mode not possible: orientation '%s'" % stream.header.resstring)
+                    self._input = stream.readAll()
+                    self.data = self._input
+                    self._analyzeImage()
+                    return self._writeBuffered(fileobj)
+                self._writeStream(stream, fileobj)
+            finally:
+                if infile is not sys.stdin:
+                    infile.close()
+            return True
+
+        except Exception, e:
+            self._log.exception(e)
+            self._log.error(traceback.format_exc())
+            self.error = str(e)
+            return False
+
+
+    def _getStreamLimitation(self):
+        """return reason why the input can not be converted as stream or ''"""
+        if not rgbecodec.HAVE_NUMPY:
+            return "numpy is not available"
+        if str(self.scale).startswith("auto"):
+            return "auto scale needs all pixels"
+        if self.doextrem is True:
+            return "extreme values need all pixels"
+        if self.outputformat != 'hdr':
+            return "output format '%s' needs all pixels" % self.outputformat
+        if self.docont == 'a' and self.cpict not in ('', self.picture):
+            return "contour lines on separate picture"
+        if self._getColorScheme() is None:
+            return "channel expressions need pcomb"
+        return ""
+
+
+    def _writeBuffered(self, fileobj):
+        """convert whole input picture and write it to <fileobj>"""
+        if self.doFalsecolor():
+            self.writeData(fileobj)
+            return True
+        return False
+
+
+    def _writeStream(self, stream, fileobj):
+        """write falsecolor image of rgbecodec.ScanlineStream with legend to <fileobj>"""
+        header = stream.header
+        self._irridiance = header.isIrradiance()
+        self._coefficients = photometry.getCoefficients(header)
+        self._resolution = header.resolution
+        self._log.debug("streaming image resolution=(%d,%d)" % self._resolution)
+        scheme = self._getColorScheme()
+        self.legend.scheme = scheme
+        parts = []
+        imgX, imgY = 0, 0
+        legend = self.legend.createPixels()
+        if legend is not None:
+            legH,legW = legend.shape[1:]
+            legX,legY,imgX,imgY = self.legend.getOffsets(legW, legH)
+            parts = [(legend, legX, legY)]
+        composer = compositor.StreamCompositor(self._resolution, imgX, imgY, parts, self.legend.bgcolor)
+        writer = rgbecodec.RGBEWriter(fileobj, composer.xres, composer.yres,
+                                      self._getHeaderLines(header.lines), not self.flat)
+        for rows in composer.composeRows(self._iterStreamPixels(stream, scheme)):
+            writer.writeScanlines(rows)
+
+
+    def _iterStreamPixels(self, stream, scheme):
+        """yield falsecolor pixels of blocks of STREAM_BLOCK scanlines of <stream>"""
+        exposure = stream.header.getChannelExposure()
+        withbg = self.docont == 'a' and self.cpict != ''
+        previous = None
+        current = self._readStreamBlock(stream, exposure, withbg)
+        while current is not None:
+            following = self._readStreamBlock(stream, exposure, withbg)
+            lum, background = current
+            first = 0
+            if self.docont == 'a':
+                ## contour lines depend on the neighbouring scanlines
+                lum, background, first = self._addStreamContext(previous, current, following)
+            pixels = colormap.falsecolorArray(lum, self.scale, self.mult, self.decades, scheme,
+                    docont=self.docont, ndivs=self.ndivs, zerooff=self.zerooff, background=background)
+            pixels = pixels[:,first:first+current[0].shape[0]]
+            if self.mask > 0:
+                pixels[:,current[0] * self.mult <= self.mask] = 0
+            yield pixels
+            previous, current = current, following
+
+
+    def _readStreamBlock(self, stream, exposure, withbg=False):
+        """return luminance and raw pixels (or None) of next scanlines of <stream>"""
+        if stream.position >= stream.nscans:
+            return None
+        pixels = rgbecodec.rgbeToFloat(stream.readScanlines(STREAM_BLOCK))
+        background = None
+        if withbg:
+            background = pixels.copy()
+        for i,e in enumerate(exposure):
+            if e != 1.0:
+                pixels[i] /= e
+        return photometry.computeLuminance(pixels, self._coefficients), background
+
+
+    def _addStreamContext(self, previous, current, following):
+        """return luminance, background and first row of block with neighbouring scanlines"""
+        blocks = [(current, slice(None))]
+        first = 0
+        if previous is not None:
+            blocks.insert(0, (previous, slice(-1,None)))
+            first = 1
+        if following is not None:
+            blocks.append((following, slice(0,1)))
+        lum = numpy.concatenate([b[0][s] for b,s in blocks])
+        background = None
+        if current[1] is not None:
+            background = numpy.concatenate([b[1][:,s] for b,s in blocks], axis=1)
+        return lum, background, first
+
+
+    def getExtremes(self):
+        """return position and (r,g,b) of darkest and brightest pixel like 'pextrem -o'"""
+        if rgbecodec.HAVE_NUMPY:
+            stats = self.getStatistics()
+            return stats.minpos + stats.minrgb + stats.maxpos + stats.maxrgb
+        cmd = "pextrem -o"
+        extreme = self._popenPipeCmd(cmd, self._input+"\n")
+        return extreme.split()
+
+
     def getImageResolution(self):
         """return image size"""
         return self._resolution
 
+
+    def getLuminance(self):
+        """return cached luminance plane of input image (without efficacy)"""
+        if self._luminance is None:
+            self._luminance = photometry.computeLuminance(self.getPixels(), self._coefficients)
+        return self._luminance
+
+
+    def getPixelLuminance(self, r, g, b):
+        """return luminance (without efficacy) of one pixel of the input image"""
+        return photometry.luminance(float(r), float(g), float(b), self._coefficients)
+
+
+    def getStatistics(self):
+        """return cached luminance statistics of input image"""
+        if self._stats is None:
+            self._stats = imagestats.computeStatistics(self.getPixels(), self.getLuminance())
+            self._log.debug("    luminance min=%g max=%g mean=%g" % (self._stats.minlum,
+                            self._stats.maxlum, self._stats.mean))
+        return self._stats
+
+
+    def getPixels(self):
+        """decode input image once and return planar float32 (r,g,b) array"""
+        if self._pixels is None:
+            self._log.debug("decoding image data ...")
+            path = None
+            if isinstance(self._input, mmap.mmap):
+                path = self.picture
+            self._pixels, resolution = paralleldecode.decodePicture(self._input,
+                    workers=self.workers, path=path)
+            self._log.debug("    decoded pixels=%dx%d" % resolution)
+        return self._pixels
+
+    
+    def _hasData(self):
+        """return True if falsecolor image data or pixels are available"""
+        return bool(self.data) or self._fcpixels is not None
+
     
     def isIrridiance(self):
         """return True if image has irridiance data"""
@@ -959,45 +1501,46 @@ class FalsecolorImage(FalsecolorBase):
                 self.picture = picture
             if self.picture == "-":
                 self._input = sys.stdin.read()
+            elif rgbecodec.HAVE_NUMPY:
+                ## pixels are decoded in-process from the mapped file
+                self._input = rgbecodec.mapPicture(self.picture)
             else:
                 self._input = file(self.picture, "rb").read()
             self.data = self._input
+            self._pixels = None
+            self._luminance = None
+            self._fcpixels = None
+            self._stats = None
             self._analyzeImage()
-            if self.scale == "auto":
-                self.findAutoScale()
+            if str(self.scale).startswith("auto"):
+                self.findAutoScale(self.scale)
         except Exception, err:
             self.error = traceback.format_exc()
 
 
+    def _detachInput(self):
+        """replace memory map of input file with a copy of its contents"""
+        if isinstance(self._input, mmap.mmap):
+            data = self._input[:]
+            if self.data is self._input:
+                self.data = data
+            self._input = data
+
+
     def _analyzeImage(self):
         """
         get picture information from header lines
         """
         self._log.debug("analyzeImage()")
-        parts = self._input.split("\n\n")
-        self._log.debug("    image parts=%d" % len(parts))
-        header = parts[0]
-        self._log.debug("    image header=%d bytes" % len(header))
-        
-        ## read image header
-        for line in header.split("\n"):
-            line = line.rstrip()
-            if line.startswith("pcond"):
-                ## pvalue can not be used directly
-                self._irridiance = False
-                break
-            elif line.startswith("rpict") and "-i" in line.split():
-                self._irridiance = True
-            elif line.startswith("rtrace") and "-i" in line.split():
-                self._irridiance = True
+        header = rgbecodec.parsePictureHeader(self._input)
+        self._log.debug("    image header=%d bytes" % header.offset)
+        self._irridiance = header.isIrradiance()
+        self._coefficients = photometry.getCoefficients(header)
+        self._log.debug("    image format='%s' luminance weights=%s" % (header.format, str(self._coefficients)))
         self._log.debug("    image _irridiance=%s" % self._irridiance)
-
-        ## get resolution string
-        data = parts[1]
-        self._log.debug("    image data=%d bytes" % len(data))
-        y,YRES,x,XRES = data.split("\n")[0].split()
-        self._resolution = (int(XRES),int(YRES))
-        self._log.debug("    image resolution=(%s,%s)" % (XRES,YRES))
+        self._log.debug("    image data=%d bytes" % (len(self._input)-header.offset))
+        self._resolution = header.resolution
+        self._log.debug("    image resolution=(%d,%d)" % self._resolution)
     
 
     def resetDefaults(self):
@@ -1007,12 +1550,14 @@ class FalsecolorImage(FalsecolorBase):
         self.scale = 1000
         self.decades = 0
         self.mask = 0
-        self.redv = 'def_red(vin(v))'
-        self.grnv = 'def_grn(vin(v))'
-        self.bluv = 'def_blu(vin(v))'
+        self.redv, self.grnv, self.bluv = COLOR_SCHEMES['def']
         self.ndivs = 8
         self.docont = ''
         self.doextrem = False
+        self.flat = False
+        self.stream = False
+        self.outputformat = 'hdr'
+        self.workers = 1
         self.error = ''
         self.zerooff = 0.5      # half step legend offset from zero
         self.legend.resetDefaults()
@@ -1022,11 +1567,12 @@ class FalsecolorImage(FalsecolorBase):
         self.legend.decades = n
 
     def setScale(self, n):
-        if n == "auto":
+        if str(n).startswith("auto"):
             if self._input != '':
-                self.findAutoScale()
+                self.findAutoScale(n)
             else:
-                self.scale = 1000
+                ## keep keyword for readImageData()
+                self.scale = n
                 self.legend.scale = 1000
         else:
             self.scale = n
@@ -1037,6 +1583,10 @@ class FalsecolorImage(FalsecolorBase):
         self.picture = path
         self.cpict = path
     
+    def setLegendCache(self, path):
+        """set directory for cached legend images"""
+        self.legend.cachedir = path
+
     def setLegendHeight(self, n):
         self.legend.setHeight(n)
 
@@ -1093,18 +1643,15 @@ class FalsecolorImage(FalsecolorBase):
 
     def showExtremes(self):
         """create labels for min and max and combine with fc image"""
-        cmd = "pextrem -o"
-        extreme = self._popenPipeCmd(cmd, self._input+"\n")
-
         # output from pextrem -o:
         # 193 207 3.070068e-02 3.118896e-02 1.995850e-02
         # 211 202 1.292969e+00 1.308594e+00 1.300781e+00
-        minx,miny,minr,ming,minb, maxx,maxy,maxr,maxg,maxb = extreme.split()
+        minx,miny,minr,ming,minb, maxx,maxy,maxr,maxg,maxb = self.getExtremes()
 
         minpos = "%d %d" % (int(minx)+self.legend.width, int(miny))
         maxpos = "%d %d" % (int(maxx)+self.legend.width, int(maxy))
-        minval = (float(minr)*.265 + float(ming)*.67 + float(minb)*.065) * self.mult
-        maxval = (float(maxr)*.265 + float(maxg)*.67 + float(maxb)*.065) * self.mult
+        minval = self.getPixelLuminance(minr, ming, minb) * self.mult
+        maxval = self.getPixelLuminance(maxr, maxg, maxb) * self.mult
 
         cmd = "psign -s -.15 -a 2 -h 16 %.3f" % minval 
         minvpic = self._createTempFileFromCmd(cmd)
@@ -1113,10 +1660,24 @@ class FalsecolorImage(FalsecolorBase):
 
         cmd = "pcompos - 0 0 \"%s\" %s \"%s\" %s" % (minvpic, minpos, maxvpic, maxpos)
         self.data = self._popenPipeCmd(cmd, self.data)
+        self._fcpixels = None
+
+
+    def _getExtremesLabels(self):
+        """return labels for min and max as (pixels,x,y) parts for compositor"""
+        minx,miny,minr,ming,minb, maxx,maxy,maxr,maxg,maxb = self.getExtremes()
+        parts = []
+        for x,y,r,g,b in ((minx,miny,minr,ming,minb), (maxx,maxy,maxr,maxg,maxb)):
+            value = self.getPixelLuminance(r, g, b) * self.mult
+            label = glyphs.renderText("%.3f" % value, 16, aspect=2)
+            parts.append((label, int(x)+self.legend.width, int(y)))
+        return parts
 
 
     def toBMP(self, data=''):
         """convert image data to BMP image format"""
+        if rgbecodec.HAVE_NUMPY:
+            return displaycodec.encodeImage(self._getDisplayPixels(data), 'bmp')
         if data == '':
             data = self.data
         cmd = "ra_bmp" 
@@ -1125,12 +1686,28 @@ class FalsecolorImage(FalsecolorBase):
 
     def toPPM(self, data=''):
         """convert image data to PPM image format"""
+        if rgbecodec.HAVE_NUMPY:
+            return displaycodec.encodeImage(self._getDisplayPixels(data), 'ppm')
         if data == '':
             data = self.data
         cmd = "ra_ppm" 
         return self._popenPipeCmd(cmd, self.data)
 
 
+    def toRGB(self, data=''):
+        """return contiguous uint8 array (yres,xres,3) of display values"""
+        return displaycodec.toDisplayRGB(self._getDisplayPixels(data))
+
+
+    def _getDisplayPixels(self, data=''):
+        """return pixels of falsecolor image or of Radiance picture <data>"""
+        if data == '' and self._fcpixels is not None:
+            return self._fcpixels
+        if data == '':
+            data = self.data
+        return rgbecodec.decodePicture(data, original=False)[0]
+
+
 
 
 class InterfaceBase(object):
@@ -1202,18 +1779,49 @@ class ConsoleInterface(InterfaceBase):
         if "-h" in sys.argv[1:]:
             showHelp()
             self.exit()
+        if "--info" in sys.argv[1:]:
+            self.showInfo(sys.argv[1:])
         
         ## create falsecolor image
         fc_img = FalsecolorImage(self._log)
-        if fc_img.setOptions(sys.argv[1:]) == True:
+        if fc_img.setOptions(sys.argv[1:]) == True and fc_img.stream:
+            ## scanlines are written while the picture is read
+            self._setBinaryOutput()
+            fc_img.doFalsecolorStream(sys.stdout)
+            self.exit(fc_img.error)
+        elif fc_img.error == "":
             fc_img.doFalsecolor()
         if fc_img.error:
             self.exit(fc_img.error)
         else:
-            if os.name == 'nt':
-                import msvcrt
-                msvcrt.setmode(1,os.O_BINARY)
-            sys.stdout.write(fc_img.data)
+            self._setBinaryOutput()
+            fc_img.writeData(sys.stdout)
+        self.exit()
+
+    def _setBinaryOutput(self):
+        """switch STDOUT to binary mode on Windows"""
+        if os.name == 'nt':
+            import msvcrt
+            msvcrt.setmode(1,os.O_BINARY)
+
+    def showInfo(self, args):
+        """write header information of pictures in paths of <args> and exit"""
+        paths = []
+        args = args[:]
+        while args:
+            arg = args.pop(0)
+            if arg == "-df":
+                args.pop(0)
+            elif arg.startswith("-"):
+                if arg not in ("--info", "-v", "-d"):
+                    self.exit("unknown option for --info: '%s'" % arg)
+            else:
+                paths.append(arg)
+        if not paths:
+            paths = [os.curdir]
+        errors = headerscan.writeInfo(sys.stdout, paths, log=self._log)
+        if errors:
+            self._log.warning("%d pictures could not be read" % errors)
         self.exit()
 
     def exit(self, error=None):
@@ -1229,6 +1837,8 @@ class ConsoleInterface(InterfaceBase):
 
 
 if __name__ == "__main__":
+    ## worker processes of frozen executables start here
+    multiprocessing.freeze_support()
     ci = ConsoleInterface(sys.argv[0])
     ci.main()
 
@@ -0,0 +1,209 @@
+##
+## glyphs.py - part of wxfalsecolor
+##
+## $Id$
+## $URL$
+
+"""built-in bitmap font and text rasterizer for legend images
+
+The 5x7 pixel font covers printable ASCII. For each text height the
+glyphs are resampled once into an anti-aliased coverage atlas which
+is cached for all further text of that height. Text is returned as
+planar float32 (r,g,b) arrays like the other in-process stages.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+## glyph rows from top to bottom; bit 4 is the leftmost column
+FONT_5X7 = {
+    ' ': (0x00,0x00,0x00,0x00,0x00,0x00,0x00),
+    '!': (0x04,0x04,0x04,0x04,0x04,0x00,0x04),
+    '"': (0x0a,0x0a,0x0a,0x00,0x00,0x00,0x00),
+    '#': (0x0a,0x0a,0x1f,0x0a,0x1f,0x0a,0x0a),
+    '$': (0x04,0x0f,0x14,0x0e,0x05,0x1e,0x04),
+    '%': (0x18,0x19,0x02,0x04,0x08,0x13,0x03),
+    '&': (0x0c,0x12,0x14,0x08,0x15,0x12,0x0d),
+    "'": (0x04,0x04,0x08,0x00,0x00,0x00,0x00),
+    '(': (0x02,0x04,0x08,0x08,0x08,0x04,0x02),
+    ')': (0x08,0x04,0x02,0x02,0x02,0x04,0x08),
+    '*': (0x00,0x04,0x15,0x0e,0x15,0x04,0x00),
+    '+': (0x00,0x04,0x04,0x1f,0x04,0x04,0x00),
+    ',': (0x00,0x00,0x00,0x00,0x0c,0x04,0x08),
+    '-': (0x00,0x00,0x00,0x1f,0x00,0x00,0x00),
+    '.': (0x00,0x00,0x00,0x00,0x00,0x0c,0x0c),
+    '/': (0x00,0x01,0x02,0x04,0x08,0x10,0x00),
+    '0': (0x0e,0x11,0x13,0x15,0x19,0x11,0x0e),
+    '1': (0x04,0x0c,0x04,0x04,0x04,0x04,0x0e),
+    '2': (0x0e,0x11,0x01,0x02,0x04,0x08,0x1f),
+    '3': (0x1f,0x02,0x04,0x02,0x01,0x11,0x0e),
+    '4': (0x02,0x06,0x0a,0x12,0x1f,0x02,0x02),
+    '5': (0x1f,0x10,0x1e,0x01,0x01,0x11,0x0e),
+    '6': (0x06,0x08,0x10,0x1e,0x11,0x11,0x0e),
+    '7': (0x1f,0x01,0x02,0x04,0x08,0x08,0x08),
+    '8': (0x0e,0x11,0x11,0x0e,0x11,0x11,0x0e),
+    '9': (0x0e,0x11,0x11,0x0f,0x01,0x02,0x0c),
+    ':': (0x00,0x0c,0x0c,0x00,0x0c,0x0c,0x00),
+    ';': (0x00,0x0c,0x0c,0x00,0x0c,0x04,0x08),
+    '<': (0x02,0x04,0x08,0x10,0x08,0x04,0x02),
+    '=': (0x00,0x00,0x1f,0x00,0x1f,0x00,0x00),
+    '>': (0x08,0x04,0x02,0x01,0x02,0x04,0x08),
+    '?': (0x0e,0x11,0x01,0x02,0x04,0x00,0x04),
+    '@': (0x0e,0x11,0x01,0x0d,0x15,0x15,0x0e),
+    'A': (0x0e,0x11,0x11,0x1f,0x11,0x11,0x11),
+    'B': (0x1e,0x11,0x11,0x1e,0x11,0x11,0x1e),
+    'C': (0x0e,0x11,0x10,0x10,0x10,0x11,0x0e),
+    'D': (0x1c,0x12,0x11,0x11,0x11,0x12,0x1c),
+    'E': (0x1f,0x10,0x10,0x1e,0x10,0x10,0x1f),
+    'F': (0x1f,0x10,0x10,0x1e,0x10,0x10,0x10),
+    'G': (0x0e,0x11,0x10,0x17,0x11,0x11,0x0f),
+    'H': (0x11,0x11,0x11,0x1f,0x11,0x11,0x11),
+    'I': (0x0e,0x04,0x04,0x04,0x04,0x04,0x0e),
+    'J': (0x07,0x02,0x02,0x02,0x02,0x12,0x0c),
+    'K': (0x11,0x12,0x14,0x18,0x14,0x12,0x11),
+    'L': (0x10,0x10,0x10,0x10,0x10,0x10,0x1f),
+    'M': (0x11,0x1b,0x15,0x15,0x11,0x11,0x11),
+    'N': (0x11,0x11,0x19,0x15,0x13,0x11,0x11),
+    'O': (0x0e,0x11,0x11,0x11,0x11,0x11,0x0e),
+    'P': (0x1e,0x11,0x11,0x1e,0x10,0x10,0x10),
+    'Q': (0x0e,0x11,0x11,0x11,0x15,0x12,0x0d),
+    'R': (0x1e,0x11,0x11,0x1e,0x14,0x12,0x11),
+    'S': (0x0f,0x10,0x10,0x0e,0x01,0x01,0x1e),
+    'T': (0x1f,0x04,0x04,0x04,0x04,0x04,0x04),
+    'U': (0x11,0x11,0x11,0x11,0x11,0x11,0x0e),
+    'V': (0x11,0x11,0x11,0x11,0x11,0x0a,0x04),
+    'W': (0x11,0x11,0x11,0x15,0x15,0x15,0x0a),
+    'X': (0x11,0x11,0x0a,0x04,0x0a,0x11,0x11),
+    'Y': (0x11,0x11,0x11,0x0a,0x04,0x04,0x04),
+    'Z': (0x1f,0x01,0x02,0x04,0x08,0x10,0x1f),
+    '[': (0x0e,0x08,0x08,0x08,0x08,0x08,0x0e),
+    '\\': (0x00,0x10,0x08,0x04,0x02,0x01,0x00),
+    ']': (0x0e,0x02,0x02,0x02,0x02,0x02,0x0e),
+    '^': (0x04,0x0a,0x11,0x00,0x00,0x00,0x00),
+    '_': (0x00,0x00,0x00,0x00,0x00,0x00,0x1f),
+    '`': (0x08,0x04,0x02,0x00,0x00,0x00,0x00),
+    'a': (0x00,0x00,0x0e,0x01,0x0f,0x11,0x0f),
+    'b': (0x10,0x10,0x16,0x19,0x11,0x11,0x1e),
+    'c': (0x00,0x00,0x0e,0x10,0x10,0x11,0x0e),
+    'd': (0x01,0x01,0x0d,0x13,0x11,0x11,0x0f),
+    'e': (0x00,0x00,0x0e,0x11,0x1f,0x10,0x0e),
+    'f': (0x06,0x09,0x08,0x1c,0x08,0x08,0x08),
+    'g': (0x00,0x0f,0x11,0x11,0x0f,0x01,0x0e),
+    'h': (0x10,0x10,0x16,0x19,0x11,0x11,0x11),
+    'i': (0x04,0x00,0x0c,0x04,0x04,0x04,0x0e),
+    'j': (0x02,0x00,0x06,0x02,0x02,0x12,0x0c),
+    'k': (0x10,0x10,0x12,0x14,0x18,0x14,0x12),
+    'l': (0x0c,0x04,0x04,0x04,0x04,0x04,0x0e),
+    'm': (0x00,0x00,0x1a,0x15,0x15,0x11,0x11),
+    'n': (0x00,0x00,0x16,0x19,0x11,0x11,0x11),
+    'o': (0x00,0x00,0x0e,0x11,0x11,0x11,0x0e),
+    'p': (0x00,0x00,0x1e,0x11,0x1e,0x10,0x10),
+    'q': (0x00,0x00,0x0d,0x13,0x0f,0x01,0x01),
+    'r': (0x00,0x00,0x16,0x19,0x10,0x10,0x10),
+    's': (0x00,0x00,0x0e,0x10,0x0e,0x01,0x1e),
+    't': (0x08,0x08,0x1c,0x08,0x08,0x09,0x06),
+    'u': (0x00,0x00,0x11,0x11,0x11,0x13,0x0d),
+    'v': (0x00,0x00,0x11,0x11,0x11,0x0a,0x04),
+    'w': (0x00,0x00,0x11,0x11,0x15,0x15,0x0a),
+    'x': (0x00,0x00,0x11,0x0a,0x04,0x0a,0x11),
+    'y': (0x00,0x00,0x11,0x11,0x0f,0x01,0x0e),
+    'z': (0x00,0x00,0x1f,0x02,0x04,0x08,0x1f),
+    '{': (0x02,0x04,0x04,0x08,0x04,0x04,0x02),
+    '|': (0x04,0x04,0x04,0x04,0x04,0x04,0x04),
+    '}': (0x08,0x04,0x04,0x02,0x04,0x04,0x08),
+    '~': (0x00,0x00,0x08,0x15,0x02,0x00,0x00),
+}
+
+## glyph cell: one blank row above and below, one blank column right
+CELL_WIDTH = 6
+CELL_HEIGHT = 9
+
+## height/width ratio of characters (default of psign)
+ASPECT = 1.67
+
+## character used for text outside of FONT_5X7
+MISSING = '?'
+
+## glyph atlases by (height,spacing,aspect)
+_atlasCache = {}
+
+
+
+def _boxWeights(nsrc, ndst):
+    """return (ndst,nsrc) matrix of area weights to resample nsrc to ndst pixels"""
+    scale = nsrc / float(ndst)
+    edges = numpy.arange(ndst+1) * scale
+    src = numpy.arange(nsrc)
+    overlap = numpy.minimum(edges[1:,None], src+1) - numpy.maximum(edges[:-1,None], src)
+    return numpy.clip(overlap, 0, None) / scale
+
+
+class GlyphAtlas(object):
+    """coverage of all glyphs rendered for one text height
+
+    Glyphs are monospaced. The cell width follows the <aspect> ratio
+    (height/width) and <spacing> as fraction of the width like the
+    -a and -s options of psign.
+    """
+
+    def __init__(self, height, spacing=-0.15, aspect=ASPECT):
+        self.height = height
+        self.width = max(1, int(round(height / float(aspect) * (1+spacing))))
+        self.chars = "".join([chr(c) for c in range(32,127)])
+        bitmaps = numpy.zeros((len(self.chars),CELL_HEIGHT,CELL_WIDTH), numpy.float64)
+        for i,c in enumerate(self.chars):
+            for y,row in enumerate(FONT_5X7[c]):
+                for x in range(5):
+                    if row & (16 >> x):
+                        bitmaps[i,y+1,x] = 1.0
+        wy = _boxWeights(CELL_HEIGHT, height)
+        wx = _boxWeights(CELL_WIDTH, self.width)
+        self.glyphs = numpy.einsum('ij,cjk,lk->cil', wy, bitmaps, wx).astype(numpy.float32)
+        self._missing = self.chars.index(MISSING)
+
+    def getIndices(self, text):
+        """return atlas indices of characters in <text>"""
+        return [self.chars.find(c) if c in self.chars else self._missing for c in text]
+
+    def renderCoverage(self, text):
+        """return coverage plane (height, len(text)*width) of one line"""
+        glyphs = self.glyphs.take(self.getIndices(text), axis=0)
+        return glyphs.transpose(1,0,2).reshape(self.height, len(text)*self.width)
+
+
+def getAtlas(height, spacing=-0.15, aspect=ASPECT):
+    """return cached glyph atlas for text <height>"""
+    key = (max(1, int(height)), spacing, aspect)
+    if not _atlasCache.has_key(key):
+        _atlasCache[key] = GlyphAtlas(*key)
+    return _atlasCache[key]
+
+
+def textSize(lines, height, spacing=-0.15, aspect=ASPECT):
+    """return (width,height) of text image for <lines>"""
+    atlas = getAtlas(height, spacing, aspect)
+    width = max([len(l) for l in lines] or [0]) * atlas.width
+    return width, len(lines) * atlas.height
+
+
+def renderText(lines, height, fgcolor=(1,1,1), bgcolor=(0,0,0), spacing=-0.15, aspect=ASPECT):
+    """return planar float32 (r,g,b) image of left aligned text lines
+
+    Each line is <height> pixels high like the output of psign.
+    """
+    if isinstance(lines, basestring):
+        lines = [lines]
+    atlas = getAtlas(height, spacing, aspect)
+    width, total = textSize(lines, height, spacing, aspect)
+    coverage = numpy.zeros((total, width), numpy.float32)
+    for i,line in enumerate(lines):
+        if line:
+            cov = atlas.renderCoverage(line)
+            coverage[i*atlas.height:(i+1)*atlas.height,:cov.shape[1]] = cov
+    image = numpy.empty((3,total,width), numpy.float32)
+    for i in range(3):
+        image[i] = bgcolor[i] + coverage * (fgcolor[i] - bgcolor[i])
+    return image
@@ -0,0 +1,93 @@
+##
+## headerscan.py - part of wxfalsecolor
+##
+## $Id$
+## $URL$
+
+"""scan directories of Radiance pictures and report header information
+
+Only the headers of the pictures are read (see
+rgbecodec.readPictureHeader). Large trees are scanned with a pool of
+worker processes and the information of each picture is written as
+one JSON object per line.
+"""
+
+import os
+import json
+import multiprocessing
+
+import rgbecodec
+
+## file extensions of pictures found in directories
+PICTURE_EXTENSIONS = ('.hdr', '.pic')
+
+## smallest number of files scanned with a process pool
+POOL_MIN_FILES = 256
+
+## number of files passed to a worker process at once
+CHUNKSIZE = 64
+
+
+
+def findPictures(paths):
+    """yield picture files in <paths> (files or directories)"""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if os.path.splitext(name)[1].lower() in PICTURE_EXTENSIONS:
+                    yield os.path.join(dirpath, name)
+
+
+def getPictureInfo(path):
+    """return dict of header information of picture <path>"""
+    try:
+        f = open(path, 'rb')
+        try:
+            header = rgbecodec.readPictureHeader(f)
+        finally:
+            f.close()
+    except (IOError, ValueError), err:
+        return {'path': path, 'error': str(err)}
+    return {'path': path,
+            'format': header.format,
+            'resolution': list(header.resolution),
+            'irradiance': header.isIrradiance(),
+            'exposure': header.exposure,
+            'view': header.view}
+
+
+def scanPictures(paths, processes=None):
+    """yield header information of all pictures in <paths> in file order"""
+    files = list(findPictures(paths))
+    if len(files) < POOL_MIN_FILES or processes == 1:
+        for path in files:
+            yield getPictureInfo(path)
+        return
+    pool = multiprocessing.Pool(processes)
+    try:
+        for info in pool.imap(getPictureInfo, files, CHUNKSIZE):
+            yield info
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def writeInfo(fileobj, paths, processes=None, log=None):
+    """write header information of pictures in <paths> as JSON lines
+
+    Pictures that can not be read are reported as warnings to the
+    logger <log>. Returns the number of these pictures.
+    """
+    errors = 0
+    for info in scanPictures(paths, processes):
+        if info.has_key('error'):
+            errors += 1
+            if log:
+                log.warning("can't read picture '%s': %s" % (info['path'], info['error']))
+        fileobj.write(json.dumps(info, sort_keys=True) + "\n")
+    return errors
@@ -5,10 +5,10 @@
 ## $URL$
 
 import os
-import cStringIO
 import traceback
 import wx
-from rgbeimage import RGBEImage, WX_IMAGE_FORMATS, WX_IMAGE_WILDCARD
+import rgbecodec
+from rgbeimage import WX_IMAGE_FORMATS, WX_IMAGE_WILDCARD
 
 import wx.lib.scrolledpanel as scrolled
 
@@ -23,15 +23,20 @@ class FileDropTarget(wx.FileDropTarget):
     def OnDropFiles(self, x, y, filenames):
         """validate image before passing it on to self.app.loadImage()"""
         path = filenames[0]
-	## create RGBEImage to check file type and data
-        rgbeImg = RGBEImage(self, self.wxapp._log, ["-i", path])
-        rgbeImg.readImageData(path)
-        if rgbeImg.error:
-            msg = "Error loading image.\nFile: %s\nError: %s" % (path,rgbeImg.error)
+        ## read header only to check file type
+        try:
+            f = open(path, 'rb')
+            try:
+                header = rgbecodec.readPictureHeader(f)
+            finally:
+                f.close()
+            if header.format and header.format not in rgbecodec.PICTURE_FORMATS:
+                raise ValueError("unsupported picture format '%s'" % header.format)
+        except (IOError, ValueError), err:
+            msg = "Error loading image.\nFile: %s\nError: %s" % (path,str(err))
             self.wxapp.showError(msg)
-        else:
-            ## now load for real
-            self.wxapp.loadImage(path)
+            return
+        self.wxapp.loadImage(path)
     
 
 
@@ -91,12 +96,9 @@ class ImagePanel(wx.Panel):
         if r <= 0:
             return
 
-        ## format label text
-        if self.rgbeImg.isIrridiance():
-            label = "%s" % self.parent.formatNumber(v)
-        else:
-            lum = (r*0.265+g*0.67+b*0.065)*179
-            label = "%s" % self.parent.formatNumber(lum)
+        ## format label text; v is the luminance or illuminance
+        ## of the picture (see photometry)
+        label = "%s" % self.parent.formatNumber(v)
         
         self._log.info("new label: '%s' at (x=%d,y=%d) (dx=%d, dy=%d)" % (label,x,y,dx,dy))
         self._labels.append((x,y, dx,dy, label))
@@ -468,9 +470,7 @@ class ImagePanel(wx.Panel):
         if rgbeImg:
             self.rgbeImg = rgbeImg
         try:
-            ppm = self.rgbeImg.toPPM()
-            io = cStringIO.StringIO(ppm)
-            img = wx.ImageFromStream(io)
+            img = self.rgbeImg.toWxImage()
         except:
             self._log.error("conversion to wx.Image failed")
             return False
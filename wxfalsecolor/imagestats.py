@@ -0,0 +1,174 @@
+##
+## imagestats.py - part of wxfalsecolor
+##
+## $Id$
+## $URL$
+
+"""single pass statistics of the luminance of a picture
+
+ImageStatistics collects the darkest and brightest pixel (like
+pextrem), the mean luminance, a histogram of log10(luminance) and a
+quantile sketch block by block, so each pixel is read once. The
+luminance plane is passed in (see photometry.computeLuminance) and
+has no luminous efficacy applied.
+"""
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+## histogram of log10(luminance) over [HIST_MIN,HIST_MAX) decades
+HIST_MIN = -8
+HIST_MAX = 8
+HIST_BINS_PER_DECADE = 32
+
+## number of scanlines processed per block
+BLOCK_SIZE = 256
+
+## relative accuracy and maximum number of buckets of quantile sketches
+SKETCH_ALPHA = 0.01
+SKETCH_BINS = 2048
+
+
+
+class QuantileSketch(object):
+    """streaming quantile estimate with bounded memory (like DDSketch)
+
+    Positive values are counted in logarithmic buckets of width
+    gamma=(1+alpha)/(1-alpha), so every quantile is returned with a
+    relative error of at most <alpha>. If more than <maxbins> buckets
+    are used the lowest buckets are merged, which only affects the
+    accuracy of the lowest quantiles.
+    """
+
+    def __init__(self, alpha=SKETCH_ALPHA, maxbins=SKETCH_BINS):
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.maxbins = maxbins
+        self._lngamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, values):
+        """add array of values (values <= 0 are counted as zero)"""
+        values = numpy.asarray(values).ravel()
+        positive = values[values > 0]
+        self.count += values.size
+        self.zeros += values.size - positive.size
+        if positive.size == 0:
+            return
+        keys = numpy.ceil(numpy.log(positive) / self._lngamma).astype(numpy.int64)
+        kmin = int(keys.min())
+        counts = numpy.bincount(keys - kmin)
+        for i in counts.nonzero()[0]:
+            key = kmin + int(i)
+            self.buckets[key] = self.buckets.get(key, 0) + int(counts[i])
+        if len(self.buckets) > self.maxbins:
+            self._collapse()
+
+    def _collapse(self):
+        """merge lowest buckets until <maxbins> buckets are left"""
+        keys = sorted(self.buckets.keys())
+        n = len(keys) - self.maxbins
+        merged = sum([self.buckets.pop(k) for k in keys[:n]])
+        self.buckets[keys[n]] = self.buckets.get(keys[n], 0) + merged
+
+    def quantile(self, q):
+        """return estimate of quantile <q> (0..1)"""
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        total = self.zeros
+        if total > rank:
+            return 0.0
+        for key in sorted(self.buckets.keys()):
+            total += self.buckets[key]
+            if total > rank:
+                return 2 * self.gamma**key / (self.gamma + 1)
+        return 2 * self.gamma**key / (self.gamma + 1)
+
+
+class ImageStatistics(object):
+    """min, max, mean and histogram of luminance collected in one pass
+
+    Positions of the extreme pixels are (x,y) with y counted from the
+    bottom scanline like the output of 'pextrem'. For pixels with equal
+    luminance the first one in scanline order is reported.
+    """
+
+    def __init__(self, xres, yres):
+        self.xres = xres
+        self.yres = yres
+        self.count = 0
+        self.sum = 0.0
+        self.minlum = None
+        self.maxlum = None
+        self.minpos = (0,0)
+        self.maxpos = (0,0)
+        self.minrgb = (0.0,0.0,0.0)
+        self.maxrgb = (0.0,0.0,0.0)
+        nbins = (HIST_MAX - HIST_MIN) * HIST_BINS_PER_DECADE
+        self.edges = numpy.linspace(HIST_MIN, HIST_MAX, nbins+1)
+        self.histogram = numpy.zeros(nbins, numpy.int64)
+        self.zeros = 0
+        self.sketch = QuantileSketch()
+
+    def getMean(self):
+        """return mean luminance"""
+        if self.count == 0:
+            return 0.0
+        return self.sum / self.count
+
+    mean = property(getMean)
+
+    def getPercentile(self, p):
+        """return estimated luminance of percentile <p> (0..100)"""
+        return self.sketch.quantile(p / 100.0)
+
+    def update(self, pixels, lum, y0):
+        """add block of scanlines starting at scanline <y0> (from the top)"""
+        nrows, xres = lum.shape
+        if lum.size == 0:
+            return
+        self.count += lum.size
+        self.sum += float(lum.sum(dtype=numpy.float64))
+
+        ## extremes of this block replace extremes of previous blocks
+        ## only if they are strictly darker or brighter
+        imin = int(lum.argmin())
+        imax = int(lum.argmax())
+        vmin = float(lum.flat[imin])
+        vmax = float(lum.flat[imax])
+        if self.minlum is None or vmin < self.minlum:
+            self.minlum = vmin
+            self.minpos, self.minrgb = self._getPixel(pixels, imin, xres, y0)
+        if self.maxlum is None or vmax > self.maxlum:
+            self.maxlum = vmax
+            self.maxpos, self.maxrgb = self._getPixel(pixels, imax, xres, y0)
+
+        ## histogram of positive values
+        positive = lum[lum > 0]
+        self.zeros += lum.size - positive.size
+        logv = numpy.clip(numpy.log10(positive), HIST_MIN, HIST_MAX - 1e-9)
+        idx = ((logv - HIST_MIN) * HIST_BINS_PER_DECADE).astype(numpy.intp)
+        self.histogram += numpy.bincount(idx, minlength=len(self.histogram))
+        self.sketch.add(lum)
+
+    def _getPixel(self, pixels, idx, xres, y0):
+        """return position from the bottom and (r,g,b) of pixel at flat index"""
+        row, x = divmod(idx, xres)
+        rgb = tuple([float(c) for c in pixels[:,row,x]])
+        return (x, self.yres - 1 - (y0 + row)), rgb
+
+
+
+def computeStatistics(pixels, lum):
+    """return ImageStatistics for planar (r,g,b) pixels and luminance plane"""
+    yres, xres = lum.shape
+    stats = ImageStatistics(xres, yres)
+    for y0 in range(0, yres, BLOCK_SIZE):
+        stats.update(pixels[:,y0:y0+BLOCK_SIZE], lum[y0:y0+BLOCK_SIZE], y0)
+    return stats
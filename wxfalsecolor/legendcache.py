@@ -0,0 +1,130 @@
+##
+## legendcache.py - part of wxfalsecolor
+##
+## $Id$
+## $URL$
+
+"""cache for legend images of FalsecolorLegend
+
+Legends are cached by a key of all settings that affect the legend
+pixels. The in-memory tier keeps the most recently used legends of
+this process. With a cache directory the legends are also stored as
+Radiance pictures that other (concurrent) runs can reuse. Files are
+written to a temporary name and renamed, so readers never see a
+partially written legend.
+"""
+
+import os
+import tempfile
+
+from collections import OrderedDict
+from hashlib import sha1
+
+import rgbecodec
+
+## changes of the legend layout or font have to update the version
+CACHE_VERSION = 1
+
+## number of legends in the in-memory tier
+CACHE_SIZE = 16
+
+## header line with legend attributes in cached pictures
+STATE_PREFIX = "LEGENDSTATE="
+
+
+
+class LegendCache(object):
+    """least recently used legend images with optional on-disk tier"""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+
+    def clear(self):
+        """remove all legends from the in-memory tier"""
+        self._items.clear()
+
+    def get(self, key, cachedir=''):
+        """return (pixels,state) for <key> or None"""
+        if self._items.has_key(key):
+            entry = self._items.pop(key)
+            self._items[key] = entry
+            return entry
+        if cachedir:
+            entry = self._readFile(self.getPath(key, cachedir))
+            if entry:
+                self._store(key, entry)
+                return entry
+        return None
+
+    def put(self, key, pixels, state, cachedir=''):
+        """add legend <pixels> with attributes <state> to cache"""
+        self._store(key, (pixels,state))
+        if cachedir:
+            self._writeFile(self.getPath(key, cachedir), pixels, state)
+
+    def getPath(self, key, cachedir):
+        """return path of cache file for <key>"""
+        digest = sha1(repr((CACHE_VERSION,key))).hexdigest()
+        return os.path.join(cachedir, "legend_%s.hdr" % digest)
+
+    def _store(self, key, entry):
+        """add entry to in-memory tier and drop least recently used"""
+        if self._items.has_key(key):
+            del self._items[key]
+        self._items[key] = entry
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def _readFile(self, path):
+        """return (pixels,state) of cached legend picture or None"""
+        if not os.path.isfile(path):
+            return None
+        try:
+            f = open(path, 'rb')
+            data = f.read()
+            f.close()
+            lines, resstring, offset = rgbecodec.parseHeader(data)
+            state = {}
+            for line in lines:
+                if line.startswith(STATE_PREFIX):
+                    for item in line[len(STATE_PREFIX):].split():
+                        k,v = item.split("=")
+                        state[k] = _parseNumber(v)
+            pixels, resolution = rgbecodec.decodePicture(data, original=False)
+            return pixels, state
+        except (IOError, ValueError):
+            return None
+
+    def _writeFile(self, path, pixels, state):
+        """write legend picture to temporary file and rename to <path>"""
+        items = ["%s=%r" % (k,state[k]) for k in sorted(state.keys())]
+        data = rgbecodec.encodePicture(pixels, [STATE_PREFIX + " ".join(items)])
+        cachedir = os.path.dirname(path)
+        try:
+            if not os.path.isdir(cachedir):
+                os.makedirs(cachedir)
+            fd,tmppath = tempfile.mkstemp(suffix=".tmp", dir=cachedir)
+            f = os.fdopen(fd, 'wb')
+            f.write(data)
+            f.close()
+            if os.name == 'nt' and os.path.exists(path):
+                ## rename does not replace files on Windows
+                os.remove(tmppath)
+            else:
+                os.rename(tmppath, path)
+        except (IOError, OSError):
+            pass
+
+
+
+def _parseNumber(s):
+    """return int or float value of string <s>"""
+    try:
+        return int(s)
+    except ValueError:
+        return float(s)
+
+
+## cache shared by all legends of this process
+legendCache = LegendCache()
@@ -0,0 +1,129 @@
+##
+## paralleldecode.py - part of wxfalsecolor
+##
+## $Id$
+## $URL$
+
+"""decode large Radiance pictures with a pool of worker processes
+
+The offsets of all scanlines are found first in one pass over the
+data (see rgbecodec.indexScanlines). The scanlines are then split
+into ranges that are decoded by the workers directly into a float32
+array in shared memory, so the decoded pixels are not copied back to
+the main process. Workers get only the byte offsets of their ranges;
+the picture data is inherited by forked workers or mapped from the
+file. Small pictures and pictures without run length encoding are
+decoded by rgbecodec.decodePicture.
+"""
+
+import os
+import multiprocessing
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import rgbecodec
+
+## smallest number of pixels decoded with a process pool
+PARALLEL_MIN_PIXELS = 4*1024*1024
+
+## number of scanline ranges per worker process
+RANGES_PER_WORKER = 4
+
+## picture data, shared pixel array and exposure of the worker process
+_worker = {}
+
+
+
+def getScanlineRanges(nscans, parts):
+    """return list of up to <parts> (start,end) ranges of similar size"""
+    parts = max(1, min(parts, nscans))
+    bounds = [nscans*i / parts for i in range(parts+1)]
+    return [(bounds[i], bounds[i+1]) for i in range(parts)]
+
+
+def _initWorker(buf, shape, exposure, data=None, path=None):
+    """keep picture data and view of shared pixel array in worker process
+
+    Without <data> the picture file <path> is mapped into memory.
+    """
+    if data is None:
+        data = rgbecodec.mapPicture(path)
+    _worker['data'] = data
+    _worker['pixels'] = numpy.frombuffer(buf, numpy.float32).reshape(shape)
+    _worker['exposure'] = exposure
+
+
+def _decodeRange(task):
+    """decode scanlines <start> to <end> at bytes <begin> to <stop> into shared array"""
+    start, end, begin, stop = task
+    scanlen = _worker['pixels'].shape[2]
+    rgbe = rgbecodec.decodeScanlines(_worker['data'][begin:stop], 0, scanlen, end-start)
+    pixels = _worker['pixels'][:,start:end]
+    pixels[...] = rgbecodec.rgbeToFloat(rgbe)
+    for i,e in enumerate(_worker['exposure']):
+        if e != 1.0:
+            pixels[i] /= e
+    return end - start
+
+
+def decodeScanlinesParallel(data, index, scanlen, exposure=(1.0,1.0,1.0), workers=None, path=None):
+    """decode indexed scanlines with <workers> processes into planar float32 array
+
+    <index> is the list of scanline offsets of indexScanlines and the
+    pixel values are divided by <exposure>. Where workers are not
+    forked they map the file <path> of <data> or get a copy of
+    <data>. The returned array of shape (3,nscans,scanlen) is kept
+    in shared memory.
+    """
+    nscans = len(index) - 1
+    if not workers:
+        workers = multiprocessing.cpu_count()
+    shape = (3, nscans, scanlen)
+    buf = multiprocessing.RawArray('f', 3*nscans*scanlen)
+    if os.name == 'posix':
+        ## forked workers share the data of the main process
+        initargs = (buf, shape, list(exposure), data)
+    elif path:
+        initargs = (buf, shape, list(exposure), None, path)
+    else:
+        initargs = (buf, shape, list(exposure), data[:])
+    tasks = [(start, end, index[start], index[end]) for start,end in
+             getScanlineRanges(nscans, workers*RANGES_PER_WORKER)]
+    pool = multiprocessing.Pool(workers, _initWorker, initargs)
+    try:
+        for n in pool.imap_unordered(_decodeRange, tasks):
+            pass
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return numpy.frombuffer(buf, numpy.float32).reshape(shape)
+
+
+def decodePicture(data, original=True, workers=None, path=None):
+    """decode Radiance picture <data> and return (pixels, (xres,yres))
+
+    Works like rgbecodec.decodePicture but decodes run length encoded
+    pictures of at least PARALLEL_MIN_PIXELS pixels with <workers>
+    processes (None or 0 for the number of CPUs). <path> is the file
+    of <data> if it is known.
+    """
+    if workers == 1:
+        return rgbecodec.decodePicture(data, original)
+    header = rgbecodec.parsePictureHeader(data)
+    (xres, yres), orientation = header.resolution, header.orientation
+    nscans, scanlen = rgbecodec.getScanlineShape((xres,yres), orientation)
+    if xres*yres < PARALLEL_MIN_PIXELS:
+        return rgbecodec.decodePicture(data, original)
+    index = rgbecodec.indexScanlines(data, header.offset, scanlen, nscans, rleonly=True)
+    if index is None:
+        ## flat pictures are mapped without copy, old-style runs are rare
+        return rgbecodec.decodePicture(data, original)
+    exposure = [1.0, 1.0, 1.0]
+    if original:
+        exposure = header.getChannelExposure()
+    pixels = decodeScanlinesParallel(data, index, scanlen, exposure, workers, path)
+    return rgbecodec.orientPixels(pixels, orientation), (xres,yres)
@@ -0,0 +1,84 @@
+##
+## photometry.py - part of wxfalsecolor
+##
+## $Id$
+## $URL$
+
+"""luminance of Radiance pixel values
+
+All luminance values of wxfalsecolor are weighted sums of the three
+channels of a picture. The weights depend on the picture format:
+RGBE pictures use the weights of the Radiance RGB primaries (or of
+the PRIMARIES header line) and XYZE pictures use the Y channel.
+Luminance is returned without luminous efficacy (WHITE_EFFICACY).
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+## luminous efficacy of white light in lm/W
+WHITE_EFFICACY = 179.0
+
+## luminance weights of the default Radiance RGB primaries
+RGB_COEFFICIENTS = (0.265, 0.67, 0.065)
+
+## luminance weights of XYZ values
+XYZ_COEFFICIENTS = (0.0, 1.0, 0.0)
+
+## FORMAT header value of XYZE pictures
+XYZE_FORMAT = "32-bit_rle_xyze"
+
+
+
+def _determinant(m):
+    """return determinant of 3x3 matrix (list of rows)"""
+    return (m[0][0] * (m[1][1]*m[2][2] - m[1][2]*m[2][1]) -
+            m[0][1] * (m[1][0]*m[2][2] - m[1][2]*m[2][0]) +
+            m[0][2] * (m[1][0]*m[2][1] - m[1][1]*m[2][0]))
+
+
+def primariesToCoefficients(primaries):
+    """return luminance weights of RGB for PRIMARIES (rx ry gx gy bx by wx wy)
+
+    The weights are the Y row of the RGB to XYZ matrix for which
+    equal RGB values have the chromaticity of the white point and
+    Y = 1 for r = g = b = 1.
+    """
+    rx,ry, gx,gy, bx,by, wx,wy = primaries
+    ## columns of XYZ of the primaries with Y = 1
+    columns = [(x/y, 1.0, (1-x-y)/y) for x,y in ((rx,ry),(gx,gy),(bx,by))]
+    white = (wx/wy, 1.0, (1-wx-wy)/wy)
+    matrix = [[c[i] for c in columns] for i in range(3)]
+    det = _determinant(matrix)
+    if det == 0:
+        raise ValueError("primaries do not span a colour space")
+    ## Cramer's rule for the scale factors of the columns
+    coefficients = []
+    for j in range(3):
+        m = [[(white[i] if k == j else matrix[i][k]) for k in range(3)] for i in range(3)]
+        coefficients.append(_determinant(m) / det)
+    return tuple(coefficients)
+
+
+def getCoefficients(header):
+    """return luminance weights of channels of picture with rgbecodec.PictureHeader"""
+    if header.format == XYZE_FORMAT:
+        return XYZ_COEFFICIENTS
+    if header.primaries:
+        return primariesToCoefficients(header.primaries)
+    return RGB_COEFFICIENTS
+
+
+def luminance(r, g, b, coefficients=RGB_COEFFICIENTS):
+    """return luminance of channel values (numbers or arrays)"""
+    cr, cg, cb = coefficients
+    return r*cr + g*cg + b*cb
+
+
+def computeLuminance(pixels, coefficients=RGB_COEFFICIENTS):
+    """return float32 luminance plane of planar (3,yres,xres) pixels"""
+    weights = numpy.asarray(coefficients, numpy.float32)
+    return numpy.tensordot(weights, pixels, 1).astype(numpy.float32, copy=False)
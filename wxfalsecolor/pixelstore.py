@@ -0,0 +1,182 @@
+##
+## pixelstore.py - part of wxfalsecolor
+##
+## $Id$
+## $URL$
+
+"""compact store of the pixel values shown by the image labels
+
+The store keeps the r,g,b channels of a picture as planar float32
+data: a numpy array of shape (3,yres,xres) or, without numpy, three
+array.array('f') objects of xres*yres values each. That needs 12 bytes
+per pixel instead of a list of (r,g,b,v) tuples per scanline. Values
+(v) are calculated from r,g,b on request. Coordinates count from the
+top left corner of the picture.
+"""
+
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import photometry
+
+## value returned for positions outside the picture
+NO_VALUE = (-1,-1,-1,-1)
+
+## largest picture (in pixels) with summed-area tables; the four
+## float64 tables need 32 bytes per pixel (64 MB for 2M pixels)
+SUMMED_AREA_MAX_PIXELS = 2*1024*1024
+
+
+
+def rgbToValue(r, g, b, coefficients=photometry.RGB_COEFFICIENTS):
+    """return luminance or illuminance value of radiance r,g,b"""
+    return photometry.luminance(r, g, b, coefficients) * photometry.WHITE_EFFICACY
+
+
+class PixelStore(object):
+    """planar float32 r,g,b channels of a picture"""
+
+    def __init__(self, xres, yres, channels, coefficients=photometry.RGB_COEFFICIENTS):
+        self.xres = xres
+        self.yres = yres
+        self.coefficients = coefficients
+        self._channels = channels
+        self._tables = None
+
+    def getRGBV(self, x, y):
+        """return (r,g,b,v) of pixel x,y or NO_VALUE"""
+        if x < 0 or y < 0 or x >= self.xres or y >= self.yres:
+            return NO_VALUE
+        if numpy is not None and isinstance(self._channels, numpy.ndarray):
+            r,g,b = [float(c) for c in self._channels[:,y,x]]
+        else:
+            idx = y*self.xres + x
+            r,g,b = [c[idx] for c in self._channels]
+        return (r, g, b, rgbToValue(r,g,b,self.coefficients))
+
+    def getAverage(self, x0, y0, x1, y1):
+        """return average (r,g,b,v) of pixels with r > 0 in rectangle
+
+        The rectangle includes the pixels x1 and y1 and is clipped to
+        the picture. NO_VALUE is returned if no pixel has a red value
+        above zero. For pictures up to SUMMED_AREA_MAX_PIXELS the sums
+        are looked up in summed-area tables (32 bytes per pixel), so
+        the cost does not depend on the size of the rectangle. Larger
+        pictures are summed over the rectangle on each call.
+        """
+        x0, y0 = max(x0,0), max(y0,0)
+        x1, y1 = min(x1,self.xres-1), min(y1,self.yres-1)
+        if x1 < x0 or y1 < y0:
+            return NO_VALUE
+        if self.xres*self.yres > SUMMED_AREA_MAX_PIXELS:
+            sums = self._sumRectangle(x0, y0, x1, y1)
+        else:
+            sums = self._lookupSums(x0, y0, x1, y1)
+        count = int(round(sums[3]))
+        if count == 0:
+            return NO_VALUE
+        r, g, b = [c/count for c in sums[:3]]
+        ## v is linear in r,g,b, so the average of v is the
+        ## value of the average r,g,b
+        return (r, g, b, rgbToValue(r,g,b,self.coefficients))
+
+    def _lookupSums(self, x0, y0, x1, y1):
+        """return sums of r,g,b and count of pixels with r > 0 from summed-area tables"""
+        tables = self.getTables()
+        w = self.xres + 1
+        corners = ((y1+1)*w + x1+1, y0*w + x1+1, (y1+1)*w + x0, y0*w + x0)
+        sums = []
+        for t in tables:
+            if numpy is not None and isinstance(t, numpy.ndarray):
+                t = t.ravel()
+            sums.append(float(t[corners[0]] - t[corners[1]] - t[corners[2]] + t[corners[3]]))
+        return sums
+
+    def _sumRectangle(self, x0, y0, x1, y1):
+        """return sums of r,g,b and count of pixels with r > 0 in rectangle"""
+        if numpy is not None and isinstance(self._channels, numpy.ndarray):
+            block = self._channels[:,y0:y1+1,x0:x1+1]
+            valid = block[0] > 0
+            sums = [float(c[valid].sum(dtype=numpy.float64)) for c in block]
+            return sums + [float(valid.sum())]
+        reds, greens, blues = self._channels
+        r = g = b = n = 0.0
+        for y in range(y0, y1+1):
+            for idx in range(y*self.xres + x0, y*self.xres + x1+1):
+                if reds[idx] > 0:
+                    r += reds[idx]
+                    g += greens[idx]
+                    b += blues[idx]
+                    n += 1
+        return [r, g, b, n]
+
+    def getTables(self):
+        """return (cached) summed-area tables of r,g,b and count of pixels with r > 0
+
+        Each table has (yres+1)*(xres+1) float64 entries and entry
+        (y,x) holds the sum over all pixels above and left of x,y. The
+        tables need 32 bytes per pixel (about 400 MB for 12M pixels);
+        getAverage() uses them only up to SUMMED_AREA_MAX_PIXELS.
+        """
+        if self._tables is None:
+            if numpy is not None and isinstance(self._channels, numpy.ndarray):
+                self._tables = self._buildTablesArray()
+            else:
+                self._tables = self._buildTablesList()
+        return self._tables
+
+    def _buildTablesArray(self):
+        """return summed-area tables as float64 array (4,yres+1,xres+1)"""
+        valid = self._channels[0] > 0
+        tables = numpy.zeros((4, self.yres+1, self.xres+1), numpy.float64)
+        for i, t in enumerate(tables):
+            if i < 3:
+                plane = numpy.where(valid, self._channels[i], 0)
+            else:
+                plane = valid
+            numpy.cumsum(plane, axis=0, dtype=numpy.float64, out=t[1:,1:])
+            numpy.cumsum(t[1:,1:], axis=1, out=t[1:,1:])
+        return tables
+
+    def _buildTablesList(self):
+        """return summed-area tables as four array.array('d')"""
+        reds, greens, blues = self._channels
+        w = self.xres + 1
+        tables = [array.array('d', [0.0]) * (w*(self.yres+1)) for i in range(4)]
+        rt, gt, bt, nt = tables
+        for y in range(self.yres):
+            r = g = b = n = 0.0
+            above = y*w
+            for x in range(self.xres):
+                idx = y*self.xres + x
+                if reds[idx] > 0:
+                    r += reds[idx]
+                    g += greens[idx]
+                    b += blues[idx]
+                    n += 1
+                t = above + w + x+1
+                rt[t] = rt[t-w] + r
+                gt[t] = gt[t-w] + g
+                bt[t] = bt[t-w] + b
+                nt[t] = nt[t-w] + n
+        return tables
+
+
+
+def fromPixels(pixels, coefficients=photometry.RGB_COEFFICIENTS):
+    """return store of planar float32 numpy array (without copy)"""
+    yres, xres = pixels.shape[1:]
+    return PixelStore(xres, yres, numpy.asarray(pixels, numpy.float32), coefficients)
+
+
+def fromChannels(xres, yres, reds, greens, blues, coefficients=photometry.RGB_COEFFICIENTS):
+    """return store of three sequences of xres*yres values"""
+    channels = [array.array('f', c) for c in (reds,greens,blues)]
+    for c in channels:
+        if len(c) != xres*yres:
+            raise ValueError("wrong number of values (x,y=%d,%d arr=%d)" % (xres,yres,len(c)))
+    return PixelStore(xres, yres, channels, coefficients)
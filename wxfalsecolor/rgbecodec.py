@@ -0,0 +1,727 @@
+##
+## rgbecodec.py - part of wxfalsecolor
+##
+## $Id$
+## $URL$
+
+"""in-process reader and writer for Radiance RGBE pictures
+
+The decoder handles new-style run length encoded scanlines as well
+as flat (and old-style run length encoded) scanlines. Pixel values
+are returned as planar float32 arrays with shape (3,yres,xres). The
+writer streams new-style run length encoded or flat scanlines to a
+file object.
+"""
+
+import cStringIO
+import mmap
+import os
+
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+HAVE_NUMPY = numpy is not None
+
+## smallest and largest scanline length for new-style RLE
+MINELEN = 8
+MAXELEN = 0x7fff
+
+## shortest run written as run length code
+MINRUN = 4
+
+## number of scanlines converted at once by RGBEWriter
+WRITE_BLOCK = 64
+
+## FORMAT values of supported pictures
+PICTURE_FORMATS = ("32-bit_rle_rgbe", "32-bit_rle_xyze")
+
+## size of blocks read while looking for the end of the header
+HEADER_CHUNK = 1024
+
+## number of decoded scanlines kept by ScanlineReader
+SCANLINE_CACHE = 256
+
+## size of blocks read by ScanlineStream
+STREAM_CHUNK = 65536
+
+
+
+def parseHeader(data):
+    """return header lines, resolution string and offset of pixel data"""
+    end = data.find("\n\n")
+    if end < 0:
+        raise ValueError("no end of header found")
+    header = data[:end]
+    start = end + 2
+    eol = data.find("\n", start)
+    if eol < 0:
+        raise ValueError("no resolution string found")
+    resstring = data[start:eol].strip()
+    return header.split("\n"), resstring, eol + 1
+
+
+def readPictureHeader(fileobj):
+    """read header of picture from <fileobj> and return PictureHeader
+
+    The file object is read in blocks starting with HEADER_CHUNK bytes
+    and reading stops with the block that holds the resolution string.
+    """
+    data = ""
+    size = HEADER_CHUNK
+    while True:
+        chunk = fileobj.read(size)
+        data += chunk
+        if not data.startswith("#?"):
+            raise ValueError("not a Radiance picture")
+        try:
+            return PictureHeader(*parseHeader(data))
+        except ValueError:
+            if not chunk:
+                raise
+        size *= 2
+
+
+def parsePictureHeader(data):
+    """return PictureHeader of picture <data>"""
+    return PictureHeader(*parseHeader(data))
+
+
+class PictureHeader(object):
+    """information of the header lines and resolution string of a picture
+
+    Settings that Radiance combines over several header lines are
+    combined the same way: EXPOSURE, COLORCORR and PIXASPECT are
+    multiplied and VIEW options are concatenated. Lines that are not
+    variables or comments are kept as command <history>, with the
+    indentation that marks lines of earlier processing steps. Like
+    Radiance only variables that start at the beginning of a line are
+    settings of the picture; indented variables belong to the history.
+    """
+
+    def __init__(self, lines, resstring, offset):
+        self.lines = lines
+        self.resstring = resstring
+        self.offset = offset
+        self.format = ""
+        self.exposure = 1.0
+        self.colorcorr = [1.0, 1.0, 1.0]
+        self.pixaspect = 1.0
+        self.primaries = None
+        self.view = ""
+        self.history = []
+        for line in lines[1:]:
+            self._parseLine(line.rstrip())
+        ## orientation as ('-Y','+X') for standard pictures
+        self.resolution, self.orientation = parseResolution(resstring)
+
+    def _parseLine(self, line):
+        """add information of one header line"""
+        if not line.strip() or line.lstrip().startswith("#"):
+            return
+        name, sep, value = line.partition("=")
+        if not sep or not name.replace("_","").isalnum():
+            self.history.append(line)
+        elif name == "FORMAT":
+            self.format = value.strip()
+        elif name == "EXPOSURE":
+            self.exposure *= float(value.split()[0])
+        elif name == "COLORCORR":
+            cc = [float(v) for v in value.split()[:3]]
+            self.colorcorr = [x*c for x,c in zip(self.colorcorr,cc)]
+        elif name == "PIXASPECT":
+            self.pixaspect *= float(value.split()[0])
+        elif name == "PRIMARIES":
+            self.primaries = [float(v) for v in value.split()[:8]]
+        elif name == "VIEW":
+            self.view = " ".join([self.view, value.strip()]).strip()
+
+    def getChannelExposure(self):
+        """return combined EXPOSURE and COLORCORR values of r,g,b"""
+        return [self.exposure*c for c in self.colorcorr]
+
+    def isIrradiance(self):
+        """return True if the picture was rendered with irradiance (-i) values"""
+        irradiance = False
+        for line in self.history:
+            if line.startswith("pcond"):
+                ## pvalue can not be used directly
+                return False
+            elif line.startswith("rpict") and "-i" in line.split():
+                irradiance = True
+            elif line.startswith("rtrace") and "-i" in line.split():
+                irradiance = True
+        return irradiance
+
+
+def mapPicture(path):
+    """return read-only memory map of file <path> (or contents of empty file)
+
+    The map supports len(), find() and slicing like a string and can
+    be passed to numpy.frombuffer() without copying the pixel data.
+    The file must not be truncated or replaced while it is mapped.
+    """
+    f = open(path, 'rb')
+    try:
+        if os.fstat(f.fileno()).st_size == 0:
+            return f.read()
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+
+
+def parseResolution(resstring):
+    """return (xres,yres) and orientation of resolution string
+
+    The orientation is the pair of axis tokens in file order, for
+    example ('-Y','+X') for standard pictures. All eight orders of
+    the Radiance picture format are accepted.
+    """
+    try:
+        first, n1, second, n2 = resstring.split()
+        sizes = {first[1:]: int(n1), second[1:]: int(n2)}
+        valid = first[:1] in "+-" and second[:1] in "+-" and sorted(sizes.keys()) == ['X','Y']
+    except ValueError:
+        valid = False
+    if not valid:
+        raise ValueError("bad resolution string: '%s'" % resstring)
+    return (sizes['X'], sizes['Y']), (first, second)
+
+
+def getScanlineShape(resolution, orientation):
+    """return (nscans,scanlen) of picture with <resolution> in file order"""
+    xres, yres = resolution
+    if orientation[0][1] == 'Y':
+        return yres, xres
+    return xres, yres
+
+
+def orientPixels(pixels, orientation):
+    """return view of planar pixels in file order as standard (top left first) picture
+
+    The last two axes of <pixels> are scanlines and pixels of the
+    scanlines. The view is transposed and flipped without a copy.
+    """
+    first, second = orientation
+    if first[1] == 'X':
+        ## scanlines are columns
+        pixels = pixels.swapaxes(-1,-2)
+        xflip = first[0] == '-'
+        yflip = second[0] == '+'
+    else:
+        xflip = second[0] == '-'
+        yflip = first[0] == '+'
+    if yflip:
+        pixels = pixels[...,::-1,:]
+    if xflip:
+        pixels = pixels[...,::-1]
+    return pixels
+
+
+def getStoredPosition(x, y, resolution, orientation):
+    """return (scanline,index) in file order of pixel x,y (counted from top left)"""
+    xres, yres = resolution
+    first, second = orientation
+    if first[1] == 'Y':
+        scan, pos = y, x
+        if first[0] == '+':
+            scan = yres-1-y
+        if second[0] == '-':
+            pos = xres-1-x
+    else:
+        scan, pos = x, y
+        if first[0] == '-':
+            scan = xres-1-x
+        if second[0] == '+':
+            pos = yres-1-y
+    return scan, pos
+
+
+def getFlatView(data, offset, scanlen, nscans):
+    """return planar uint8 view (4,nscans,scanlen) of flat pixel data or None
+
+    The view shares the memory of <data>. None is returned if the data
+    is too short, contains old-style runs or scanlines that start like
+    new-style run length encoded scanlines.
+    """
+    size = 4 * scanlen * nscans
+    if len(data) - offset < size:
+        return None
+    pixels = numpy.frombuffer(data, numpy.uint8, size, offset).reshape(nscans,scanlen,4)
+    if MINELEN <= scanlen <= MAXELEN:
+        first = pixels[:,0]
+        if ((first[:,0] == 2) & (first[:,1] == 2) & (first[:,2] < 128)).any():
+            return None
+    runs = pixels[:,:,0] == 1
+    runs &= pixels[:,:,1] == 1
+    runs &= pixels[:,:,2] == 1
+    if runs.any():
+        return None
+    return pixels.transpose(2,0,1)
+
+
+def decodeScanlines(data, offset, scanlen, nscans):
+    """decode <nscans> scanlines starting at <offset> into planar uint8 array"""
+    buf = bytearray(data)
+    rgbe = numpy.zeros((4,nscans,scanlen), numpy.uint8)
+    pos = offset
+    for y in xrange(nscans):
+        if (scanlen < MINELEN or scanlen > MAXELEN or len(buf) < pos+4 or
+                buf[pos] != 2 or buf[pos+1] != 2 or buf[pos+2] & 0x80):
+            pos = _decodeFlatScanline(buf, pos, rgbe, y, scanlen)
+            continue
+        if (buf[pos+2] << 8 | buf[pos+3]) != scanlen:
+            raise ValueError("scanline length mismatch in scanline %d" % y)
+        pos = _decodeRLEScanline(buf, pos+4, rgbe, y, scanlen)
+    return rgbe
+
+
+def _decodeRLEScanline(buf, pos, rgbe, y, scanlen):
+    """decode new-style run length encoded scanline and return new position"""
+    line = bytearray()
+    end = len(buf)
+    for c in range(4):
+        stop = (c+1) * scanlen
+        while len(line) < stop:
+            if pos >= end:
+                raise ValueError("premature end of data in scanline %d" % y)
+            code = buf[pos]
+            if code > 128:
+                line.extend(buf[pos+1:pos+2] * (code & 127))
+                pos += 2
+            else:
+                ## a zero count is an empty literal (like freadscan)
+                line.extend(buf[pos+1:pos+1+code])
+                pos += code + 1
+        if len(line) != stop:
+            raise ValueError("run overflow in scanline %d" % y)
+    rgbe[:,y,:] = numpy.frombuffer(line, numpy.uint8).reshape(4,scanlen)
+    return pos
+
+
+def _decodeFlatScanline(buf, pos, rgbe, y, scanlen):
+    """decode flat scanline and return new position"""
+    end = pos + 4*scanlen
+    if end > len(buf):
+        ## runs may still make up for the missing bytes
+        return _decodeOldScanline(buf, pos, rgbe, y, scanlen)
+    pixels = numpy.frombuffer(buffer(buf, pos, 4*scanlen), numpy.uint8).reshape(scanlen,4)
+    runs = (pixels[:,0] == 1) & (pixels[:,1] == 1) & (pixels[:,2] == 1)
+    if not runs.any():
+        rgbe[:,y,:] = pixels.T
+        return end
+    return _decodeOldScanline(buf, pos, rgbe, y, scanlen)
+
+
+def _decodeOldScanline(buf, pos, rgbe, y, scanlen):
+    """decode old-style run length encoded scanline and return new position"""
+    x = 0
+    rshift = 0
+    while x < scanlen:
+        if pos + 4 > len(buf):
+            raise ValueError("premature end of data in scanline %d" % y)
+        r,g,b,e = buf[pos:pos+4]
+        pos += 4
+        if r == 1 and g == 1 and b == 1:
+            if x == 0:
+                raise ValueError("run without previous pixel in scanline %d" % y)
+            n = e << rshift
+            if x + n > scanlen:
+                raise ValueError("run overflow in scanline %d" % y)
+            rgbe[:,y,x:x+n] = rgbe[:,y,x-1:x]
+            x += n
+            rshift += 8
+        else:
+            rgbe[:,y,x] = (r,g,b,e)
+            x += 1
+            rshift = 0
+    return pos
+
+
+def indexScanlines(data, offset, scanlen, nscans, rleonly=False):
+    """return list of <nscans>+1 offsets of scanlines starting at <offset>
+
+    The run length codes are only counted, not expanded, so this is
+    much faster than decoding the scanlines. The last entry is the
+    end of the pixel data. With <rleonly> set None is returned as
+    soon as a scanline is flat or uses old-style runs.
+    """
+    ## upper limit of the size of one encoded scanline
+    maxlen = 8*scanlen + 4
+    offsets = [offset]
+    pos = offset
+    for y in xrange(nscans):
+        buf = bytearray(data[pos:pos+maxlen])
+        if rleonly and not _isRLEScanline(buf, scanlen):
+            return None
+        pos += _skipScanline(buf, y, scanlen)
+        offsets.append(pos)
+    return offsets
+
+
+def _isRLEScanline(buf, scanlen):
+    """return True if <buf> starts with a new-style run length encoded scanline"""
+    return (MINELEN <= scanlen <= MAXELEN and len(buf) >= 4 and
+            buf[0] == 2 and buf[1] == 2 and not buf[2] & 0x80)
+
+
+def _skipScanline(buf, y, scanlen):
+    """return length of encoded scanline <y> at start of <buf>"""
+    if not _isRLEScanline(buf, scanlen):
+        return _skipFlatScanline(buf, y, scanlen)
+    if (buf[2] << 8 | buf[3]) != scanlen:
+        raise ValueError("scanline length mismatch in scanline %d" % y)
+    return _skipRLEScanline(buf, y, scanlen)
+
+
+def _skipRLEScanline(buf, y, scanlen):
+    """return length of new-style run length encoded scanline in <buf>"""
+    pos = 4
+    end = len(buf)
+    for c in range(4):
+        n = 0
+        while n < scanlen:
+            if pos >= end:
+                raise ValueError("premature end of data in scanline %d" % y)
+            code = buf[pos]
+            if code > 128:
+                n += code & 127
+                pos += 2
+            else:
+                n += code
+                pos += code + 1
+        if n != scanlen:
+            raise ValueError("run overflow in scanline %d" % y)
+    if pos > end:
+        raise ValueError("premature end of data in scanline %d" % y)
+    return pos
+
+
+def _skipFlatScanline(buf, y, scanlen):
+    """return length of flat or old-style run length encoded scanline in <buf>"""
+    x = 0
+    pos = 0
+    rshift = 0
+    while x < scanlen:
+        if pos + 4 > len(buf):
+            raise ValueError("premature end of data in scanline %d" % y)
+        if buf[pos] == 1 and buf[pos+1] == 1 and buf[pos+2] == 1:
+            x += buf[pos+3] << rshift
+            rshift += 8
+        else:
+            x += 1
+            rshift = 0
+        pos += 4
+    if x > scanlen:
+        raise ValueError("run overflow in scanline %d" % y)
+    return pos
+
+
+class ScanlineReader(object):
+    """decode single scanlines of picture <data> on demand
+
+    The offsets of all scanlines are indexed on first use and the
+    most recently decoded scanlines are kept in a cache of
+    <cachesize> scanlines. Scanlines are numbered in file order and
+    pixel positions count from the top left of the (oriented) picture.
+    """
+
+    def __init__(self, data, cachesize=SCANLINE_CACHE, original=True):
+        self.data = data
+        self.cachesize = cachesize
+        header = parsePictureHeader(data)
+        self._offset = header.offset
+        self.resolution, self.orientation = header.resolution, header.orientation
+        self.xres, self.yres = self.resolution
+        self.nscans, self.scanlen = getScanlineShape(self.resolution, self.orientation)
+        self._exposure = [1.0, 1.0, 1.0]
+        if original:
+            self._exposure = header.getChannelExposure()
+        self._index = None
+        self._cache = OrderedDict()
+
+    def getIndex(self):
+        """return (cached) list of scanline offsets"""
+        if self._index is None:
+            self._index = indexScanlines(self.data, self._offset, self.scanlen, self.nscans)
+        return self._index
+
+    def getScanline(self, y):
+        """return planar float32 (r,g,b) values of scanline <y>"""
+        if self._cache.has_key(y):
+            line = self._cache.pop(y)
+            self._cache[y] = line
+            return line
+        index = self.getIndex()
+        rgbe = decodeScanlines(self.data[index[y]:index[y+1]], 0, self.scanlen, 1)
+        line = rgbeToFloat(rgbe)[:,0,:]
+        for i,e in enumerate(self._exposure):
+            if e != 1.0:
+                line[i] /= e
+        self._cache[y] = line
+        while len(self._cache) > self.cachesize:
+            self._cache.popitem(last=False)
+        return line
+
+    def getPixel(self, x, y):
+        """return (r,g,b) of pixel x,y or None outside of picture"""
+        if x < 0 or y < 0 or x >= self.xres or y >= self.yres:
+            return None
+        scan, pos = getStoredPosition(x, y, self.resolution, self.orientation)
+        return tuple([float(c) for c in self.getScanline(scan)[:,pos]])
+
+
+class ScanlineStream(object):
+    """decode scanlines of a picture read from file object <fileobj> in file order
+
+    Only the header and the encoded data of the next scanlines are
+    kept in memory, so a picture can be converted while it is still
+    written to a pipe. The header is read on creation.
+    """
+
+    def __init__(self, fileobj, chunksize=STREAM_CHUNK):
+        self.fileobj = fileobj
+        self.chunksize = chunksize
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self.header = self._readHeader()
+        self.resolution = self.header.resolution
+        self.orientation = self.header.orientation
+        self.nscans, self.scanlen = getScanlineShape(self.resolution, self.orientation)
+        self.position = 0
+
+    def _fill(self, size):
+        """read from file object until <size> bytes after position are buffered"""
+        if len(self._buf) - self._pos >= size or self._eof:
+            return
+        chunks = [self._buf[self._pos:]]
+        n = len(chunks[0])
+        while n < size:
+            chunk = self.fileobj.read(max(self.chunksize, size-n))
+            if not chunk:
+                self._eof = True
+                break
+            chunks.append(chunk)
+            n += len(chunk)
+        self._buf = "".join(chunks)
+        self._pos = 0
+
+    def _readHeader(self):
+        """read and return PictureHeader and keep following data in buffer"""
+        size = HEADER_CHUNK
+        while True:
+            self._fill(size)
+            if not self._buf.startswith("#?"):
+                raise ValueError("not a Radiance picture")
+            try:
+                header = PictureHeader(*parseHeader(self._buf))
+            except ValueError:
+                if self._eof:
+                    raise
+                size *= 2
+                continue
+            self._headerdata = self._buf[:header.offset]
+            self._pos = header.offset
+            return header
+
+    def readAll(self):
+        """return header and all data not decoded yet as picture string"""
+        if self.position > 0:
+            raise ValueError("scanlines of stream were decoded already")
+        data = self._headerdata + self._buf[self._pos:] + self.fileobj.read()
+        self._buf = ""
+        self._pos = 0
+        self._eof = True
+        return data
+
+    def readScanlines(self, n):
+        """return planar uint8 RGBE array (4,n,scanlen) of the next <n> scanlines
+
+        Fewer scanlines are returned at the end of the picture.
+        """
+        n = min(n, self.nscans - self.position)
+        ## upper limit of the size of one encoded scanline
+        maxlen = 8*self.scanlen + 4
+        size = 0
+        for y in xrange(self.position, self.position+n):
+            self._fill(size + maxlen)
+            start = self._pos + size
+            size += _skipScanline(bytearray(self._buf[start:start+maxlen]), y, self.scanlen)
+        rgbe = decodeScanlines(self._buf[self._pos:self._pos+size], 0, self.scanlen, n)
+        self._pos += size
+        self.position += n
+        return rgbe
+
+    def readPixels(self, n, original=True):
+        """return planar float32 (r,g,b) array (3,n,scanlen) of the next <n> scanlines
+
+        With <original> set the values are divided by the EXPOSURE and
+        COLORCORR settings of the header like decodePicture() does.
+        """
+        pixels = rgbeToFloat(self.readScanlines(n))
+        if original:
+            for i,e in enumerate(self.header.getChannelExposure()):
+                if e != 1.0:
+                    pixels[i] /= e
+        return pixels
+
+
+
+def rgbeToFloat(rgbe):
+    """convert planar RGBE bytes to planar float32 (r,g,b) values"""
+    expo = rgbe[3].astype(numpy.int32)
+    factor = numpy.ldexp(numpy.float32(1.0), expo - (128+8)).astype(numpy.float32)
+    factor[expo == 0] = 0
+    pixels = rgbe[:3].astype(numpy.float32)
+    pixels += 0.5
+    pixels *= factor
+    return pixels
+
+
+def decodePicture(data, original=True):
+    """decode Radiance picture <data> and return (pixels, (xres,yres))
+
+    With <original> set the pixel values are divided by the EXPOSURE
+    and COLORCORR settings of the header like 'pvalue -o' does.
+    Pictures in other orientations than '-Y N +X M' are returned as
+    transposed or flipped views of the decoded scanlines.
+    """
+    header = parsePictureHeader(data)
+    (xres, yres), orientation = header.resolution, header.orientation
+    nscans, scanlen = getScanlineShape((xres,yres), orientation)
+    rgbe = getFlatView(data, header.offset, scanlen, nscans)
+    if rgbe is None:
+        rgbe = decodeScanlines(data, header.offset, scanlen, nscans)
+    pixels = rgbeToFloat(orientPixels(rgbe, orientation))
+    del rgbe
+    if original:
+        for i,e in enumerate(header.getChannelExposure()):
+            if e != 1.0:
+                pixels[i] /= e
+    return pixels, (xres,yres)
+
+
+def iterPixelBlocks(data, rows, original=True):
+    """yield planar float32 (r,g,b) blocks of <rows> scanlines of picture <data>
+
+    Standard pictures are decoded block by block with ScanlineStream,
+    other orientations are decoded completely first.
+    """
+    if isinstance(data, mmap.mmap):
+        data.seek(0)
+        stream = ScanlineStream(data)
+    else:
+        stream = ScanlineStream(cStringIO.StringIO(data))
+    if stream.orientation != ('-Y','+X'):
+        pixels = decodePicture(data, original)[0]
+        for y0 in xrange(0, pixels.shape[1], rows):
+            yield pixels[:,y0:y0+rows]
+        return
+    while stream.position < stream.nscans:
+        yield stream.readPixels(rows, original)
+
+
+def floatToRGBE(pixels):
+    """convert planar float (r,g,b) values to planar RGBE bytes"""
+    pixels = numpy.maximum(pixels, 0)
+    d = pixels.max(axis=0).astype(numpy.float64)
+    valid = d > 1e-32
+    mant, expo = numpy.frexp(d)
+    factor = numpy.where(valid, mant * 256.0 / numpy.where(valid, d, 1), 0)
+    rgbe = numpy.empty((4,) + d.shape, numpy.uint8)
+    rgbe[:3] = numpy.minimum(pixels * factor, 255)
+    rgbe[3] = numpy.where(valid, expo + 128, 0)
+    return rgbe
+
+
+def encodeScanlineRLE(rgbe):
+    """return new-style run length encoding of one (4,xres) RGBE scanline"""
+    xres = rgbe.shape[1]
+    out = bytearray([2, 2, xres >> 8, xres & 255])
+    for c in range(4):
+        _encodeChannelRLE(rgbe[c], out)
+    return out
+
+
+def _encodeChannelRLE(values, out):
+    """append runs and literal chunks of one channel to bytearray <out>"""
+    n = len(values)
+    data = values.tostring()
+    bounds = numpy.flatnonzero(values[1:] != values[:-1]) + 1
+    starts = numpy.concatenate(([0], bounds))
+    ends = numpy.concatenate((bounds, [n]))
+    pos = 0
+    for i in numpy.flatnonzero(ends - starts >= MINRUN):
+        start, end = int(starts[i]), int(ends[i])
+        _appendLiteral(out, data, pos, start)
+        code = ord(data[start])
+        while end - start >= MINRUN:
+            count = min(end - start, 127)
+            out.append(128 + count)
+            out.append(code)
+            start += count
+        ## rest of a split run is written as literal
+        pos = start
+    _appendLiteral(out, data, pos, n)
+
+
+def _appendLiteral(out, data, start, end):
+    """append literal chunks of up to 128 bytes"""
+    while start < end:
+        count = min(end - start, 128)
+        out.append(count)
+        out.extend(data[start:start+count])
+        start += count
+
+
+class RGBEWriter(object):
+    """write Radiance picture scanline by scanline to a file object
+
+    With <rle> set scanlines are written with new-style run length
+    encoding (like Radiance tools do), otherwise as flat RGBE data
+    which is faster to write and can be memory mapped by readers.
+    Scanlines that are too short or too long for run length encoding
+    are always written flat.
+    """
+
+    def __init__(self, fileobj, xres, yres, header=[], rle=True):
+        self.fileobj = fileobj
+        self.xres = xres
+        self.yres = yres
+        self.rle = rle and MINELEN <= xres <= MAXELEN
+        self.written = 0
+        lines = ["#?RADIANCE"] + list(header) + ["FORMAT=32-bit_rle_rgbe", ""]
+        lines.append("-Y %d +X %d" % (yres,xres))
+        fileobj.write("\n".join(lines) + "\n")
+
+    def writeScanlines(self, pixels):
+        """convert and write planar (r,g,b) scanlines (3,n,xres) in blocks"""
+        nscans = pixels.shape[1]
+        if pixels.shape[2] != self.xres or self.written + nscans > self.yres:
+            raise ValueError("scanlines do not fit picture size")
+        for y0 in xrange(0, nscans, WRITE_BLOCK):
+            rgbe = floatToRGBE(pixels[:,y0:y0+WRITE_BLOCK])
+            if self.rle:
+                for y in range(rgbe.shape[1]):
+                    self.fileobj.write(str(encodeScanlineRLE(rgbe[:,y])))
+            else:
+                self.fileobj.write(rgbe.transpose(1,2,0).tostring())
+        self.written += nscans
+
+
+def writePicture(fileobj, pixels, header=[], rle=True):
+    """write planar (r,g,b) array as Radiance picture to file object"""
+    yres, xres = pixels.shape[1:]
+    writer = RGBEWriter(fileobj, xres, yres, header, rle)
+    writer.writeScanlines(pixels)
+
+
+def encodePicture(pixels, header=[], rle=False):
+    """return Radiance picture string for planar (r,g,b) array (flat by default)"""
+    io = cStringIO.StringIO()
+    writePicture(io, pixels, header, rle)
+    return io.getvalue()
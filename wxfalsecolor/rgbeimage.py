@@ -9,9 +9,17 @@ import array
 import cStringIO
 import traceback
 import wx
+import displaycodec
+import pixelstore
+import rgbecodec
+import tiffcodec
 from falsecolor2 import FalsecolorImage
 
 WX_IMAGE_WILDCARD = "BMP file|*.bmp|JPEG file|*.jpg|PNG file|*.png|TIFF file|*.tif|PNM file|*.pnm" 
+## file dialog entries for 32-bit float TIFF files
+TIFF_FLOAT_WILDCARD = "TIFF file (32 bit float)|*.tif"
+TIFF_FLOAT_RAW_WILDCARD = "TIFF file (32 bit float, uncompressed)|*.tif"
+
 WX_IMAGE_FORMATS = {".bmp":  wx.BITMAP_TYPE_BMP,
                     ".jpg":  wx.BITMAP_TYPE_JPEG,
                     ".jpeg": wx.BITMAP_TYPE_JPEG,
@@ -28,8 +36,8 @@ class RGBEImage(FalsecolorImage):
 
     def __init__(self, wxparent, log, *args):
         self.wxparent = wxparent
-        self._array = []
-        self._hasArray = False
+        self._store = None
+        self._scanlines = None
         self.legendoffset = (0,0)
         self.legendpos = "SW"
         FalsecolorImage.__init__(self, log, *args)
@@ -40,7 +48,7 @@ class RGBEImage(FalsecolorImage):
         dlg.Destroy()
         self._log.info("loading of data canceled")
         wxparent.loadingCanceled = True
-        self._array = []
+        self._store = None
         return
 
 
@@ -72,6 +80,7 @@ class RGBEImage(FalsecolorImage):
             data = self._popenPipeCmd(cmd, None)
             if data:
                 self.data = data
+                self._fcpixels = None
                 self.legendoffset = (0,0)
                 return True
         except Exception, err:
@@ -81,7 +90,8 @@ class RGBEImage(FalsecolorImage):
 
 
     def getDataHeader(self):
-        return self.getHeader(self.data)
+        """return header of falsecolor image (encodes pixels if necessary)"""
+        return self.getHeader(self.getData())
 
 
     def getHeader(self, data=None):
@@ -89,43 +99,49 @@ class RGBEImage(FalsecolorImage):
         if not data:
             data = self._input
         try:
-            header = data.split("\n\n")[0]
-            return header
+            return "\n".join(rgbecodec.parsePictureHeader(data).lines)
         except:
             return False
 
 
     def getRGBVAt(self, pos):
         """Return r,g,b values at <pos> or -1 if no values are available"""
-        if self._array == []:
-            return (-1,-1,-1,-1)
         x,y = pos
-
         x -= self.legendoffset[0]
         y -= self.legendoffset[1]
-        if x < 0 or y < 0:
-            return (-1,-1,-1,-1)
-        if x < self._resolution[0] and y < self._resolution[1]:
-            return self._array[y][x]
-        return (-1,-1,-1,-1)
+        if self._store:
+            return self._store.getRGBV(x,y)
+        reader = self._getScanlineReader()
+        if not reader:
+            return pixelstore.NO_VALUE
+        rgb = reader.getPixel(x,y)
+        if rgb is None:
+            return pixelstore.NO_VALUE
+        r,g,b = rgb
+        return (r, g, b, pixelstore.rgbToValue(r,g,b,self._coefficients))
         
     
     def getRGBVAverage(self, start, end):
         """calculate and return average (r,g,b,v) for rectangle"""
-        rgbv = []
-        for y in range(start[1],end[1]+1):
-            for x in range(start[0],end[0]+1):
-                r,g,b,v = self.getRGBVAt((x,y))
-                if r > 0:
-                    rgbv.append((r,g,b,v))
-        if len(rgbv) > 0:
-            r_avg = sum([t[0] for t in rgbv]) / len(rgbv)
-            g_avg = sum([t[1] for t in rgbv]) / len(rgbv)
-            b_avg = sum([t[2] for t in rgbv]) / len(rgbv)
-            v_avg = sum([t[3] for t in rgbv]) / len(rgbv)
-            return (r_avg,g_avg,b_avg,v_avg)
-        else:
-            return (-1,-1,-1,-1)
+        if not self._store:
+            return pixelstore.NO_VALUE
+        dx,dy = self.legendoffset
+        return self._store.getAverage(start[0]-dx, start[1]-dy, end[0]-dx, end[1]-dy)
+
+
+    def _getScanlineReader(self):
+        """return reader of single scanlines of input picture or None"""
+        if not rgbecodec.HAVE_NUMPY or not self._input:
+            return None
+        if self._scanlines is None or self._scanlines.data is not self._input:
+            try:
+                self._scanlines = rgbecodec.ScanlineReader(self._input)
+                self._scanlines.getIndex()
+            except ValueError, err:
+                self._log.error("can't index scanlines: %s" % str(err))
+                self._scanlines = None
+                return None
+        return self._scanlines
 
 
     def getValueAt(self, pos):
@@ -138,27 +154,53 @@ class RGBEImage(FalsecolorImage):
 
 
     def hasArrayData(self, wxparent):
-        """read pixel data into array of (r,g,b,v) values"""
-        if self._hasArray == True:
+        """read pixel data into planar (r,g,b) store"""
+        if self._store:
             return True
-        elif self._array == False:
+        elif self._store == False:
             return False
         else:
-            self._hasArray = self.readArrayDataBIN(wxparent)
-            return self._hasArray
+            return self.readArrayDataBIN(wxparent)
 
 
     def readArrayDataBIN(self, wxparent):
-        """read binary pixel data into array of (r,g,b,v) values"""
+        """read binary pixel data into planar (r,g,b) store"""
         self._log.debug("readArrayDataBIN()")
-        xres,yres = self.getImageResolution()
-        keepGoing = True
+        if rgbecodec.HAVE_NUMPY:
+            ## decode image once in-process and keep
+            ## the decoded array as store without copy
+            try:
+                self._store = pixelstore.fromPixels(self.getPixels(), self._coefficients)
+            except Exception, err:
+                self.showError("Error reading pixel values:\n%s" % str(err))
+                self._store = False
+                return False
+            wxparent.loadingCanceled = False
+            return True
+
         dlg = wx.ProgressDialog("reading pixel values ...",
                                 "reading raw data ...",
-                                maximum = 7,
+                                maximum = 4,
                                 parent = wxparent,
                                 style = wx.PD_APP_MODAL|wx.PD_CAN_ABORT|wx.PD_ELAPSED_TIME)
+        channels = self._readChannelsPvalue(dlg, wxparent)
+        if not channels:
+            return channels
+        xres,yres = self.getImageResolution()
+        try:
+            self._store = pixelstore.fromChannels(xres, yres, *channels, coefficients=self._coefficients)
+        except ValueError, err:
+            self._readArrayError(dlg, "Error: %s" % str(err))
+            return False
+
+        ## finaly close dialog
+        dlg.Destroy()
+        wxparent.loadingCanceled = False
+        return True
+
 
+    def _readChannelsPvalue(self, dlg, wxparent):
+        """read r,g,b channels with pvalue and return (r,g,b) arrays"""
         arr_red   = array.array('d')
         arr_green = array.array('d')
         arr_blue  = array.array('d')
@@ -179,86 +221,48 @@ class RGBEImage(FalsecolorImage):
                 return False
             else:
                 arr.fromstring(data)
-                if len(arr) != xres*yres:
-                    self._readArrayError(dlg, "Error: wrong number of values (x,y=%d,%d arr=%d)" % (xres,yres,len(arr)))
-                    return False
-        
-        ## calculate v from r,g,b 
-        (keepGoing, foo) = dlg.Update(4, "calculating values ...")
-        if keepGoing == False:
-            return self.cancelLoading(dlg, wxparent)
-        
-        arr_val = [(arr_red[i]*0.265+arr_green[i]*0.67+arr_blue[i]*0.065)*179 for i in range(len(arr_red))]
-       
-        ## convert to array of lines
-        if len(arr_red) < 500000:
-            ## less feedback for small images
-            dlg.Update(5, "merging channels ...")
-            pixels = zip(arr_red,arr_green,arr_blue,arr_val)
-            dlg.Update(6, "building scanlines ...")
-            self._array = [pixels[y*xres:(y+1)*xres] for y in range(yres)]
-        
-        else:
-            ## create new dialog for large images
-            dlg.Destroy()
-            dlg = wx.ProgressDialog("merging channels ...",
-                                    "merging 0 % ...",
-                                    maximum = yres,
-                                    parent = wxparent,
-                                    style = wx.PD_APP_MODAL|wx.PD_CAN_ABORT|wx.PD_ELAPSED_TIME)
-            self._array = []
-            for y in range(yres):
-                ## update progress bar every ten lines
-                if y % 10 == 0:
-                    keepGoing, skip = dlg.Update(y, "merging line %d ..." % y)
-                    if keepGoing == False:
-                        return self.cancelLoading(dlg, wxparent)
-
-                ## handle data line by line
-                start  =     y * xres
-                end    = (y+1) * xres
-                reds   = arr_red[start:end] 
-                greens = arr_green[start:end] 
-                blues  = arr_blue[start:end]
-                vals   = arr_val[start:end]
-                pixels = zip(reds,greens,blues,vals)
-                self._array.append(pixels)
-
-        ## finaly close dialog
-        dlg.Destroy()
-        wxparent.loadingCanceled = False
-        return True
+        return arr_red, arr_green, arr_blue
 
 
     def _readArrayError(self, dlg, msg):
-        """show error message and set self._array to False"""
+        """show error message and set self._store to False"""
         dlg.Destroy()
         self.showError(msg)
-        self._array = False
+        self._store = False
 
 
     def saveToAny(self, path):
         """convert self.data to image format supported by wx"""
         ext = os.path.splitext(path)[1]
         ext = ext.lower()
+        if rgbecodec.HAVE_NUMPY and displaycodec.FORMATS.has_key(ext[1:]):
+            f = open(path, 'wb')
+            displaycodec.writeImage(f, self._getDisplayPixels(), ext[1:])
+            f.close()
+            return
         format = WX_IMAGE_FORMATS.get(ext, wx.BITMAP_TYPE_BMP)
-        ppm = self.toPPM()
-        io = cStringIO.StringIO(ppm)
-        img = wx.ImageFromStream(io)
+        img = self.toWxImage()
         img.SaveFile(path, format)
 
 
-    def saveToFile(self, path):
+    def saveToFile(self, path, tifbits=8, tifcompress=True):
         """convert image and save to file <path>"""
         self._log.info("saveToFile(path='%s')" % path)
         pathext = os.path.splitext(path)[1]
         pathext = pathext.lower()
+        if os.path.abspath(path) == os.path.abspath(self.picture):
+            ## the input file is mapped and must not be truncated
+            self._detachInput()
         try:
             data = None
             if pathext == ".hdr" or pathext == ".pic":
-                data = self.data
+                f = open(path, 'wb')
+                self.writeData(f, rle=True)
+                f.close()
             elif pathext == ".ppm":
                 data = self.toPPM()
+            elif pathext in (".tif", ".tiff") and rgbecodec.HAVE_NUMPY:
+                self.saveToTif(path, tifbits, tifcompress)
             else:
                 self.saveToAny(path)
             
@@ -274,12 +278,27 @@ class RGBEImage(FalsecolorImage):
             return False
 
         
-    def saveToTif(self, path, data=''):
-        """convert data to TIF file"""
-        if data == '':
-            data = self.data
-        cmd = str("ra_tiff -z - \"%s\"" % path) 
-        self._popenPipeCmd(cmd, self.data)
+    def saveToTif(self, path, bits=8, compress=True):
+        """convert data to 8-bit or 32-bit float TIF file
+
+        8-bit files show the displayed image. 32-bit float files hold
+        the original values of the input picture (like 'pvalue -o').
+        """
+        if not rgbecodec.HAVE_NUMPY:
+            cmd = str("ra_tiff -z - \"%s\"" % path) 
+            self._popenPipeCmd(cmd, self.getData())
+            return
+        f = open(path, 'wb')
+        try:
+            if bits == 32:
+                xres, yres = self.getImageResolution()
+                rows = tiffcodec.getRowsPerStrip(xres, bits)
+                blocks = rgbecodec.iterPixelBlocks(self._input, rows)
+                tiffcodec.writeTIFFBlocks(f, xres, yres, blocks, bits, compress)
+            else:
+                tiffcodec.writeTIFF(f, self._getDisplayPixels(), bits, compress)
+        finally:
+            f.close()
 
 
     def setOptions(self, args):
@@ -310,3 +329,15 @@ class RGBEImage(FalsecolorImage):
         else:
             return False
 
+
+    def toWxImage(self):
+        """return wx.Image of display values"""
+        if not rgbecodec.HAVE_NUMPY:
+            io = cStringIO.StringIO(self.toPPM())
+            return wx.ImageFromStream(io)
+        rgb = self.toRGB()
+        yres, xres = rgb.shape[:2]
+        img = wx.ImageFromBuffer(xres, yres, rgb)
+        ## the image uses the buffer without a copy
+        img._rgbbuffer = rgb
+        return img
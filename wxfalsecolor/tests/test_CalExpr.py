@@ -0,0 +1,58 @@
+import numpy
+import colormap
+from calexpr import compileExpression, CalExprError
+
+
+class TestCompileExpression(object):
+
+    def setUp(self):
+        self.v = numpy.linspace(-0.2, 1.2, 57)
+
+    def _eval(self, text, **kwargs):
+        return compileExpression(text, **kwargs)(self.v)
+
+    def test_arithmetic(self):
+        result = self._eval("2*v^2 - -v/4 + 1e-1")
+        assert numpy.allclose(result, 2*self.v**2 + self.v/4 + 0.1)
+
+    def test_power_right_associative(self):
+        assert numpy.allclose(self._eval("2^3^2"), 512)
+
+    def test_constant_expression_shape(self):
+        assert self._eval("0.5").shape == self.v.shape
+
+    def test_if(self):
+        result = self._eval("if(v-.5, 1, 0)")
+        assert (result == (self.v > .5)).all()
+
+    def test_select(self):
+        result = self._eval("select(floor(v*2)+1, 0.1, 0.2, 0.3)")
+        expected = numpy.choose(numpy.clip(numpy.floor(self.v*2),0,2).astype(int), [0.1,0.2,0.3])
+        valid = (self.v >= 0)
+        assert numpy.allclose(result[valid], expected[valid])
+        assert numpy.allclose(self._eval("select(0, 4, 5, 6)"), 3)
+
+    def test_template_functions(self):
+        red = self._eval("def_red(vin(v))")
+        assert numpy.allclose(red, colormap.defaultColors(self.v)[0])
+        grn = self._eval("old_grn(v)")
+        assert numpy.allclose(grn, colormap.oldColors(self.v)[1])
+
+    def test_bands(self):
+        result = self._eval("vin(v)", ndivs=4, bands=True)
+        assert numpy.allclose(result, numpy.floor(self.v*4)/4)
+
+    def test_log10_of_negative_values(self):
+        result = self._eval("clip(log10(v))")
+        assert numpy.isfinite(result).all()
+
+    def test_constants(self):
+        assert numpy.allclose(self._eval("scale/mult", scale=358), 2)
+
+    def test_unsupported_function(self):
+        for text in ["li(1)", "v + ri(2)", "interp_arr(v, def_redp)", "v;", "if(v,1)", "(v"]:
+            try:
+                compileExpression(text)
+            except CalExprError:
+                continue
+            assert False, "no CalExprError for '%s'" % text
@@ -0,0 +1,121 @@
+import math
+import numpy
+import colormap
+
+
+## scalar versions of the *.cal functions in TEMPLATE_PC0
+
+def _select(i, table):
+    return table[int(i+0.5)-1]
+
+def _interp_arr(x, table):
+    if x - 1 > 0:
+        if len(table) - x > 0:
+            i = math.floor(x)
+            return (i+1-x)*_select(i, table) + (x-i)*_select(i+1, table)
+        return table[-1]
+    return table[0]
+
+def _clip(x):
+    return min(1, max(0, x))
+
+def _def_colors(x):
+    return [_clip(_interp_arr(x/0.0454545+1, t)) for t in
+            (colormap.DEF_RED, colormap.DEF_GRN, colormap.DEF_BLU)]
+
+def _old_colors(x):
+    grn = 1.6-1.6*x if x > .375 else 8/3.0*x
+    return [_clip(1.6*x-.6), _clip(grn), _clip(1-8/3.0*x)]
+
+def _map(x, decades):
+    if decades > 0:
+        return math.log10(x)/decades+1 if x > 10**-decades else 0
+    return x
+
+
+## colours come from lookup tables with 4096 entries
+LUT_TOLERANCE = 1e-3
+
+
+class TestFalsecolorArray(object):
+
+    def setUp(self):
+        self.lum = numpy.linspace(0, 8, 161).reshape(7,23).astype(numpy.float32)
+
+    def _compare(self, scheme, func, scale, mult, decades):
+        colors = colormap.falsecolorArray(self.lum, scale, mult, decades, scheme)
+        assert colors.shape == (3,7,23)
+        for (y,x),lum in numpy.ndenumerate(self.lum):
+            expected = func(_map(lum*mult/scale, decades))
+            assert numpy.allclose(colors[:,y,x], expected, atol=LUT_TOLERANCE), (lum, colors[:,y,x], expected)
+
+    def test_default_scheme(self):
+        self._compare('def', _def_colors, 1000, 179.0, 0)
+
+    def test_spec_scheme(self):
+        self._compare('spec', _old_colors, 1000, 179.0, 0)
+
+    def test_log_decades(self):
+        self._compare('def', _def_colors, 1000, 179.0, 3)
+
+    def test_multiplier(self):
+        self._compare('spec', _old_colors, 20, 1.0, 0)
+
+
+class TestContours(object):
+
+    def setUp(self):
+        x = numpy.linspace(0, 1.2, 40)
+        self.v = numpy.add.outer(x*0.2, x)
+
+    def test_contour_bands(self):
+        colors = colormap.colorizeValues(self.v, 'def', docont='b', ndivs=4)
+        for (y,x),v in numpy.ndenumerate(self.v):
+            expected = _def_colors(math.floor(v*4)/4.0)
+            assert numpy.allclose(colors[:,y,x], expected, atol=LUT_TOLERANCE)
+
+    def test_contour_lines(self):
+        ndivs, delta = 5, 0.5
+        colors = colormap.colorizeValues(self.v, 'def', docont='a', ndivs=ndivs)
+        step = lambda y,x: math.floor(ndivs*self.v[min(max(y,0),39),min(max(x,0),39)]+delta)
+        for (y,x),v in numpy.ndenumerate(self.v):
+            isconta = (0 <= v < 1) and (step(y,x-1) != step(y,x+1) or step(y-1,x) != step(y+1,x))
+            if isconta:
+                assert numpy.allclose(colors[:,y,x], _def_colors(v), atol=LUT_TOLERANCE)
+            else:
+                assert (colors[:,y,x] == 0).all()
+
+    def test_contour_background(self):
+        background = numpy.ones((3,40,40), numpy.float32) * 7
+        lines = colormap.contourLines(self.v, 5)
+        colors = colormap.colorizeValues(self.v, 'spec', docont='a', ndivs=5, background=background)
+        assert lines.any() and not lines.all()
+        assert (colors[:,~lines] == 7).all()
+        assert (colors[:,lines] <= 1).all()
+
+
+class TestColormapLUT(object):
+
+    def test_cached_tables(self):
+        assert colormap.getColormap('def') is colormap.getColormap('def')
+        assert colormap.getColormap('def', 8) is not colormap.getColormap('def')
+        assert colormap.getColormap('spec', 8) is colormap.getColormap('spec', 8)
+
+    def test_stepped_table_size(self):
+        lut = colormap.ColormapLUT('def', 5)
+        assert lut.size % 5 == 0
+        assert lut.size >= colormap.LUT_SIZE
+
+    def test_step_boundaries(self):
+        lut = colormap.getColormap('spec', 5)
+        v = numpy.array([0.1999, 0.2, 0.3999, 0.4])
+        colors = lut.apply(v)
+        for i,x in enumerate([0.0, 0.2, 0.2, 0.4]):
+            assert numpy.allclose(colors[:,i], _old_colors(x), atol=1e-6)
+
+    def test_clamped_values(self):
+        lut = colormap.getColormap('def')
+        colors = lut.apply(numpy.array([-5.0, 0.0, 1.0, 20.0]))
+        assert numpy.allclose(colors[:,0], colors[:,1])
+        assert numpy.allclose(colors[:,2], colors[:,3])
+        assert numpy.allclose(colors[:,3], _def_colors(1.0), atol=LUT_TOLERANCE)
@@ -0,0 +1,36 @@
+import numpy
+import compositor
+
+
+def _plane(value, w, h):
+    return numpy.ones((3,h,w), numpy.float32) * value
+
+
+class TestComposeImages(object):
+
+    def test_size_and_origin(self):
+        ## offsets are relative to the lower left corner like pcompos
+        result = compositor.composeImages([(_plane(1,4,2), 0, 0), (_plane(2,3,3), 2, 2)], (0.5,0.5,0.5))
+        assert result.shape == (3,5,5)
+        assert (result[:,3:,:4] == 1).all()
+        assert (result[:,:3,2:] == 2).all()
+        assert (result[:,:3,:2] == 0.5).all()
+
+    def test_clipping(self):
+        result = compositor.composeImages([(_plane(1,4,4), -2, 1)], xres=3, yres=3)
+        assert (result[:,:2,:2] == 1).all()
+        assert (result[:,2,:] == 0).all()
+        assert (result[:,:,2] == 0).all()
+
+
+class TestStreamCompositor(object):
+
+    def test_same_result_as_composeImages(self):
+        image = numpy.random.RandomState(3).rand(3,10,6).astype(numpy.float32)
+        legend = _plane(2,3,14)
+        for x,y,lx,ly in [(3,0,0,0), (0,0,6,-2), (0,4,1,0), (0,0,4,3)]:
+            expected = compositor.composeImages([(image,x,y), (legend,lx,ly)], (0.5,0,0))
+            composer = compositor.StreamCompositor((6,10), x, y, [(legend,lx,ly)], (0.5,0,0))
+            blocks = [image[:,0:4], image[:,4:8], image[:,8:]]
+            rows = list(composer.composeRows(blocks))
+            assert numpy.array_equal(numpy.concatenate(rows, axis=1), expected)
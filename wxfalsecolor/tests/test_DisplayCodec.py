@@ -0,0 +1,77 @@
+import struct
+import zlib
+import numpy
+import displaycodec
+
+
+def _testPixels(xres=5, yres=3):
+    pixels = numpy.zeros((3,yres,xres), numpy.float32)
+    pixels[0] = 1.0
+    pixels[1,:,1:] = 0.5
+    pixels[2,1:,:] = 2.0
+    return pixels
+
+
+class TestDisplayCodec(object):
+
+    def setUp(self):
+        self.pixels = _testPixels()
+        self.rgb = displaycodec.toDisplayRGB(self.pixels)
+
+    def test_gamma_table(self):
+        assert self.rgb.shape == (3,5,3)
+        assert self.rgb.flags['C_CONTIGUOUS']
+        ## mantissa centre 64.5/128 gives 256 * 0.504^(1/2.2) = 187.9;
+        ## values above 1 are clipped
+        ## a zero mantissa is the centre 0.5 of the lowest step like
+        ## ra_ppm: 256 * (0.5/128)^(1/2.2) = 20.6
+        assert (self.rgb[0,0] == [255,20,20]).all()
+        assert (self.rgb[0,1] == [255,187,20]).all()
+        assert (self.rgb[2,1,[0,2]] == 255).all()
+        ## green shares the exponent of red: 256 * 64.5/128 = 129
+        linear = displaycodec.toDisplayRGB(self.pixels, gamma=1.0)
+        assert linear[0,1,1] == 129
+
+    def test_black(self):
+        ## only a zero exponent is black
+        rgb = displaycodec.toDisplayRGB(numpy.zeros((3,1,2), numpy.float32))
+        assert (rgb == 0).all()
+
+    def test_ppm(self):
+        data = displaycodec.encodeImage(self.pixels, 'ppm')
+        assert data.startswith("P6\n5 3\n255\n")
+        assert data[11:] == self.rgb.tostring()
+
+    def test_bmp(self):
+        data = displaycodec.encodeImage(self.pixels, 'bmp')
+        magic, size, r1, r2, offset = struct.unpack("<2sIHHI", data[:14])
+        assert magic == "BM" and size == len(data) and offset == 54
+        width, height = struct.unpack("<ii", data[18:26])
+        assert (width, height) == (5,3)
+        ## bottom-up BGR scanlines padded to 4 bytes
+        rowsize = 16
+        bottom = numpy.fromstring(data[54:54+15], numpy.uint8).reshape(5,3)
+        assert (bottom == self.rgb[2,:,::-1]).all()
+        assert data[54+15] == "\x00"
+        assert len(data) == 54 + 3*rowsize
+
+    def test_png(self):
+        data = displaycodec.encodeImage(self.pixels, 'png')
+        assert data.startswith("\x89PNG\r\n\x1a\n")
+        pos = 8
+        idat = ""
+        while pos < len(data):
+            length, = struct.unpack(">I", data[pos:pos+4])
+            kind = data[pos+4:pos+8]
+            chunk = data[pos+8:pos+8+length]
+            crc, = struct.unpack(">I", data[pos+8+length:pos+12+length])
+            assert crc == zlib.crc32(kind + chunk) & 0xffffffff
+            if kind == "IHDR":
+                assert struct.unpack(">II", chunk[:8]) == (5,3)
+            elif kind == "IDAT":
+                idat += chunk
+            pos += 12 + length
+        assert kind == "IEND"
+        rows = numpy.fromstring(zlib.decompress(idat), numpy.uint8).reshape(3, 16)
+        assert (rows[:,0] == 0).all()
+        assert (rows[:,1:] == self.rgb.reshape(3,15)).all()
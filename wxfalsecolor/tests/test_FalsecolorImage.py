@@ -0,0 +1,362 @@
+import cStringIO
+import math
+import mmap
+import os
+import tempfile
+import numpy
+import colormap
+import displaycodec
+import rgbecodec
+from falsecolor2 import FalsecolorImage
+from test_Colormap import _def_colors, _old_colors, _map
+
+
+def _makeImage(args=[], xres=24, yres=16):
+    """return FalsecolorImage with gradient picture as input"""
+    lum = numpy.linspace(0, 6, xres*yres).reshape(yres,xres)
+    pixels = numpy.array([lum, lum, lum], numpy.float32)
+    img = FalsecolorImage(args=args)
+    img._input = rgbecodec.encodePicture(pixels, ["EXPOSURE=1"])
+    img.data = img._input
+    img._analyzeImage()
+    return img
+
+
+class TestNativeFalsecolor(object):
+
+    def tearDown(self):
+        self.img.cleanup()
+
+    def _compare(self, args, func, scale, mult=179.0, decades=0):
+        """compare falsecolor image with scalar version of the *.cal functions"""
+        self.img = _makeImage(args)
+        self.img.falsecolor()
+        pixels, res = rgbecodec.decodePicture(self.img.getData())
+        assert res == (24,16)
+        raw, res = rgbecodec.decodePicture(self.img._input)
+        for (y,x),r in numpy.ndenumerate(raw[0]):
+            lum = 0.265*r + 0.67*raw[1,y,x] + 0.065*raw[2,y,x]
+            expected = func(_map(lum*mult/scale, decades))
+            assert numpy.allclose(pixels[:,y,x], expected, atol=0.01), (lum, pixels[:,y,x], expected)
+        return pixels
+
+    def test_default_mapping(self):
+        self._compare(["-s", "500"], _def_colors, 500)
+
+    def test_spec_mapping(self):
+        self._compare(["-spec", "-s", "500"], _old_colors, 500)
+
+    def test_log_mapping(self):
+        self._compare(["-log", "2", "-s", "1000"], _def_colors, 1000, decades=2)
+        self._compare(["-spec", "-log", "3", "-s", "1000"], _old_colors, 1000, decades=3)
+
+    def test_multiplier(self):
+        self._compare(["-m", "100", "-s", "400"], _def_colors, 400, mult=100.0)
+
+    def test_zero_offset(self):
+        ## -z shifts only legend and contour lines, not the colours
+        pixels = self._compare(["-z", "-s", "500"], _def_colors, 500)
+        self.img.cleanup()
+        assert numpy.allclose(self._compare(["-s", "500"], _def_colors, 500), pixels)
+
+    def _compareContourLines(self, args, ndivs, delta):
+        """compare contour lines with scalar version of isconta"""
+        self.img = _makeImage(args + ["-s", "800", "-n", str(ndivs)])
+        self.img.falsecolor()
+        pixels, res = rgbecodec.decodePicture(self.img.getData())
+        raw, res = rgbecodec.decodePicture(self.img._input)
+        v = (0.265*raw[0] + 0.67*raw[1] + 0.065*raw[2]) * 179.0 / 800
+        step = lambda y,x: math.floor(ndivs*v[min(max(y,0),15),min(max(x,0),23)]+delta)
+        for (y,x),vx in numpy.ndenumerate(v):
+            isconta = (0 <= vx < 1) and (step(y,x-1) != step(y,x+1) or step(y-1,x) != step(y+1,x))
+            if isconta:
+                assert numpy.allclose(pixels[:,y,x], _def_colors(vx), atol=0.01), (args, y, x)
+            else:
+                assert (pixels[:,y,x] == 0).all(), (args, y, x)
+
+    def test_zero_offset_contour_lines(self):
+        self._compareContourLines(["-cl"], 4, 0.5)
+        self.img.cleanup()
+        self._compareContourLines(["-cl", "-z"], 4, 0.0)
+
+    def test_header_history(self):
+        self.img = _makeImage(["-s", "500", "-n", "5"])
+        self.img.falsecolor()
+        lines, resstring, offset = rgbecodec.parseHeader(self.img.getData())
+        assert "\tEXPOSURE=1" in lines
+        assert "falsecolor2 -s 500 -n 5 -m 179.0" in lines
+
+    def test_switch_contour_modes(self):
+        self.img = _makeImage(["-s", "500"])
+        self.img.falsecolor()
+        lum = self.img.getLuminance()
+        for docont in ['a', 'b', '']:
+            self.img.docont = docont
+            self.img.falsecolor()
+            assert self.img.getLuminance() is lum
+            pixels, res = rgbecodec.decodePicture(self.img.getData())
+            expected = colormap.falsecolorArray(lum, 500, docont=docont)
+            assert numpy.allclose(pixels, expected, atol=0.01)
+
+    def test_contour_lines_on_picture(self):
+        self.img = _makeImage(["-s", "500", "-cl"])
+        self.img.cpict = self.img.picture
+        self.img.falsecolor()
+        pixels, res = rgbecodec.decodePicture(self.img.getData())
+        raw, res = rgbecodec.decodePicture(self.img._input)
+        outside = ~colormap.contourLines(colormap.mapValues(self.img.getLuminance(), 500), 8)
+        assert numpy.allclose(pixels[:,outside], raw[:,outside], rtol=0.01)
+
+    def test_custom_channel_expressions(self):
+        self.img = _makeImage(["-s", "500", "-r", "v", "-g", "if(v-.5,1,0)", "-b", "0"])
+        self.img.falsecolor()
+        pixels, res = rgbecodec.decodePicture(self.img.getData())
+        v = colormap.mapValues(self.img.getLuminance(), 500)
+        assert numpy.allclose(pixels[0], numpy.clip(v,0,1), atol=0.01)
+        assert numpy.allclose(pixels[1], v > .5, atol=0.01)
+        assert numpy.allclose(pixels[2], 0, atol=0.01)
+
+    def test_mask(self):
+        self.img = _makeImage(["-s", "500", "-mask", "400"])
+        self.img.falsecolor()
+        self.img.applyMask()
+        pixels, res = rgbecodec.decodePicture(self.img.getData())
+        below = self.img.getLuminance() * 179 <= 400
+        assert below.any() and not below.all()
+        assert (pixels[:,below] == 0).all()
+        assert (pixels[:,~below].max(axis=0) > 0).all()
+
+
+
+class TestStatistics(object):
+
+    def test_auto_scale(self):
+        img = _makeImage()
+        img.setScale("auto")
+        ## brightest pixel 6 * 179 = 1074 cd/m2
+        assert img.scale == 1100
+        assert img.getStatistics().maxpos == (23,0)
+
+    def test_percentile_scale(self):
+        ## set before image data is available
+        img = _makeImage(["-s", "auto:p50"])
+        img.readImageData = lambda: None
+        assert img.scale == "auto:p50"
+        img.setScale(img.scale)
+        ## median luminance 3 * 179 = 537 cd/m2
+        assert img.scale == 540
+        assert img.legend.scale == 540
+
+    def test_scale_options(self):
+        for value in ["auto:p0", "auto:p101", "auto:99", "auto:px"]:
+            img = FalsecolorImage(args=["-s", value])
+            assert img.error != ""
+        img = FalsecolorImage(args=["-s", "AUTO:p99.5"])
+        assert img.scale == "auto:p99.5"
+
+
+class TestNativeLegend(object):
+
+    def tearDown(self):
+        self.img.cleanup()
+
+    def _createLegend(self, args):
+        self.img = _makeImage(args, xres=300, yres=250)
+        self.img.falsecolor()
+        return self.img.legend.createLegendPixels()
+
+    def test_vertical_legend(self):
+        legend = self._createLegend(["-s", "500", "-lp", "WS"])
+        ## text height 25 for 8 steps; label adds one line at the top
+        assert self.img.legend.height == 200
+        assert legend.shape == (3, 225, 100)
+        ## gradient starts at the bottom left with the colour of v=0
+        expected = colormap.colorizeValues(numpy.zeros((1,1)))
+        assert numpy.allclose(legend[:,-1,0], expected[:,0,0])
+
+    def test_horizontal_legend_within_image(self):
+        legend = self._createLegend(["-lp", "-S", "-lw", "300"])
+        labx = legend.shape[2] - 300
+        assert labx > 0
+        assert legend.shape[1] == 50
+        ## gradient fills upper half of the legend right of the label
+        expected = colormap.colorizeValues(colormap.gradientValues(300, 25, False))
+        assert numpy.allclose(legend[:,:25,labx:], expected)
+
+    def test_cached_legend(self):
+        args = ["-s", "750", "-lp", "W", "-n", "7"]
+        self.img = _makeImage(list(args))
+        self.img.falsecolor()
+        first = self.img.legend.getLegendPixels()
+        state = (self.img.legend.height, self.img.legend._legendOffX)
+        for i in range(2):
+            self.img.resetDefaults()
+            self.img.setOptions(list(args))
+            self.img.falsecolor()
+        assert self.img.legend.getLegendPixels() is first
+        assert (self.img.legend.height, self.img.legend._legendOffX) == state
+        self.img.resetDefaults()
+        self.img.setOptions(list(args))
+        self.img.falsecolor()
+        assert numpy.array_equal(self.img.legend.createLegendPixels(), first)
+
+    def test_custom_expressions_in_gradient(self):
+        legend = self._createLegend(["-r", "1", "-g", "0", "-b", "0", "-lp", "E"])
+        assert numpy.allclose(legend[:,30:200,5], [[1],[0],[0]])
+
+
+class TestNativeComposition(object):
+
+    def test_legend_beside_image(self):
+        self.img = _makeImage(["-s", "500", "-lp", "WS"], xres=300, yres=250)
+        assert self.img.doFalsecolor()
+        pixels, res = rgbecodec.decodePicture(self.img.getData())
+        assert res == (400,250)
+        expected = colormap.falsecolorArray(self.img.getLuminance(), 500)
+        assert numpy.allclose(pixels[:,:,100:], expected, atol=0.01)
+        ## legend (with label) is aligned with the bottom of the image
+        legend = self.img.legend.getLegendPixels()
+        assert numpy.allclose(pixels[:,25:,:100], legend, atol=0.01)
+        assert (pixels[:,:25,:100] == 0).all()
+
+    def test_legend_within_image(self):
+        self.img = _makeImage(["-s", "500", "-lp", "-EN"], xres=300, yres=250)
+        assert self.img.doFalsecolor()
+        pixels, res = rgbecodec.decodePicture(self.img.getData())
+        assert res == (300,250)
+        legend = self.img.legend.getLegendPixels()
+        legH,legW = legend.shape[1:]
+        assert numpy.allclose(pixels[:,:legH,-legW:], legend, atol=0.01)
+
+    def test_extremes_labels(self):
+        self.img = _makeImage(["-s", "500", "-e"], xres=300, yres=250)
+        assert self.img.doFalsecolor()
+        pixels, res = rgbecodec.decodePicture(self.img.getData())
+        ## label of darkest pixel at top left extends the picture
+        assert res[1] == 249 + 16
+        x = self.img.legend.width
+        label = pixels[:,:16,x:x+35]
+        assert label.max() > 0.9 and label.min() == 0
+
+    def test_write_data(self):
+        self.img = _makeImage(["-s", "500", "-lp", "-WS"], xres=300, yres=250)
+        assert self.img.doFalsecolor()
+        assert self.img.data is None
+        rle = cStringIO.StringIO()
+        self.img.writeData(rle)
+        self.img.flat = True
+        flat = cStringIO.StringIO()
+        self.img.writeData(flat)
+        assert len(rle.getvalue()) < len(flat.getvalue())
+        assert flat.getvalue() == self.img.getData()
+        pixels, res = rgbecodec.decodePicture(rle.getvalue())
+        assert numpy.allclose(pixels, self.img._fcpixels, atol=0.01)
+
+    def test_write_png(self):
+        self.img = _makeImage(["-s", "500", "-of", "png"], xres=30, yres=20)
+        assert self.img.outputformat == 'png'
+        assert self.img.doFalsecolor()
+        io = cStringIO.StringIO()
+        self.img.writeData(io)
+        assert io.getvalue() == displaycodec.encodeImage(self.img._fcpixels, 'png')
+        assert self.img.toPPM().startswith("P6\n")
+        rgb = self.img.toRGB()
+        assert rgb.shape == self.img._fcpixels.shape[1:] + (3,)
+        assert rgb.flags['C_CONTIGUOUS']
+
+
+class TestMappedInput(object):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".hdr")
+        f = os.fdopen(fd, 'wb')
+        f.write(_makeImage()._input)
+        f.close()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_read_mapped_picture(self):
+        img = FalsecolorImage(args=["-i", self.path, "-s", "500"])
+        img.readImageData()
+        assert isinstance(img._input, mmap.mmap)
+        assert img._resolution == (24,16)
+        assert img.getImageSize(self.path) == (24,16)
+        assert img.doFalsecolor()
+        img._detachInput()
+        assert isinstance(img._input, str) and img._input.startswith("#?RADIANCE")
+
+
+class TestXYZEInput(object):
+
+    def test_luminance_from_y(self):
+        pixels = numpy.random.RandomState(4).rand(3,16,24).astype(numpy.float32)
+        img = FalsecolorImage(args=["-s", "100"])
+        img._input = rgbecodec.encodePicture(pixels, ["FORMAT=32-bit_rle_xyze"])
+        img._input = img._input.replace("FORMAT=32-bit_rle_rgbe\n", "")
+        img.data = img._input
+        img._analyzeImage()
+        raw, res = rgbecodec.decodePicture(img._input)
+        assert numpy.array_equal(img.getLuminance(), raw[1])
+        img.falsecolor()
+        assert not [l for l in img._getHeaderLines() if "FORMAT=" in l]
+
+
+class TestWorkersOption(object):
+
+    def test_workers(self):
+        assert FalsecolorImage(args=["-s", "100"]).workers == 1
+        assert FalsecolorImage(args=["-j", "0"]).workers == 0
+        img = _makeImage(["-j", "2", "-s", "100"])
+        assert img.workers == 2
+        assert img.getPixels().shape == (3,16,24)
+        for value in ["-1", "x"]:
+            assert FalsecolorImage(args=["-j", value]).error != ""
+
+
+class TestStreamingMode(object):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".hdr")
+        f = os.fdopen(fd, 'wb')
+        lum = numpy.linspace(0, 6, 300*250).reshape(250,300)
+        pixels = numpy.array([lum, lum*0.9, lum*1.1], numpy.float32)
+        pixels *= numpy.random.RandomState(5).uniform(0.8, 1.2, (250,300)).astype(numpy.float32)
+        rgbecodec.writePicture(f, pixels, ["EXPOSURE=0.5"])
+        f.close()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def _convert(self, args, stream):
+        img = FalsecolorImage(args=args + ["-i", self.path])
+        io = cStringIO.StringIO()
+        if stream:
+            assert img.doFalsecolorStream(io)
+        else:
+            assert img.doFalsecolor()
+            img.writeData(io)
+        return io.getvalue()
+
+    def test_same_output_as_buffered_mode(self):
+        for args in (["-s", "500"],
+                     ["-s", "500", "-lp", "WS", "-cl", "-mask", "200"],
+                     ["-lp", "-EN", "-cb", "-log", "2", "-flat"],
+                     ["-lp", "S", "-spec"],
+                     ["-lp", "NE", "-cl", "-p", self.path],
+                     ["-r", "v", "-g", "0", "-b", "1-v"]):
+            assert self._convert(args, True) == self._convert(args, False), args
+
+    def test_fallback_to_buffered_mode(self):
+        for args in (["-e"], ["-s", "auto"], ["-of", "ppm"]):
+            img = FalsecolorImage(args=args)
+            assert img._getStreamLimitation() != ""
+            assert self._convert(args, True) == self._convert(args, False)
+        assert FalsecolorImage(args=["-s", "500"])._getStreamLimitation() == ""
+
+    def test_orientation_fallback(self):
+        data = file(self.path, 'rb').read().replace("-Y 250 +X 300", "+Y 250 +X 300")
+        f = open(self.path, 'wb')
+        f.write(data)
+        f.close()
+        assert self._convert(["-s", "500"], True) == self._convert(["-s", "500"], False)
@@ -0,0 +1,39 @@
+import numpy
+import glyphs
+
+
+class TestGlyphs(object):
+
+    def test_font_covers_ascii(self):
+        for c in range(32,127):
+            rows = glyphs.FONT_5X7[chr(c)]
+            assert len(rows) == 7
+            assert max(rows) < 32
+
+    def test_atlas_is_cached(self):
+        atlas = glyphs.getAtlas(18)
+        assert glyphs.getAtlas(18.0) is atlas
+        assert atlas.glyphs.shape == (95, 18, atlas.width)
+
+    def test_atlas_coverage(self):
+        ## at the native cell size glyph pixels are fully covered
+        spacing = glyphs.CELL_WIDTH * glyphs.ASPECT / glyphs.CELL_HEIGHT - 1
+        atlas = glyphs.getAtlas(glyphs.CELL_HEIGHT, spacing)
+        assert atlas.width == glyphs.CELL_WIDTH
+        cov = atlas.renderCoverage(" |")
+        assert cov.shape == (glyphs.CELL_HEIGHT, 2*atlas.width)
+        assert cov[:,:atlas.width].max() == 0
+        assert numpy.allclose(cov.max(), 1.0)
+
+    def test_render_text(self):
+        img = glyphs.renderText(["1.5", "10"], 20, (1,0,0), (0,0,1))
+        width = glyphs.getAtlas(20).width
+        assert img.shape == (3, 40, 3*width)
+        ## background after short second line
+        assert (img[:,20:,2*width:] == numpy.array([0,0,1]).reshape(3,1,1)).all()
+        assert numpy.allclose(img[0] + img[2], 1)
+        assert img[0].max() > 0.99
+
+    def test_unknown_characters(self):
+        atlas = glyphs.getAtlas(12)
+        assert numpy.array_equal(atlas.renderCoverage(u"\xb2"), atlas.renderCoverage("?"))
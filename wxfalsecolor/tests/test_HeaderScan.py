@@ -0,0 +1,82 @@
+import os
+import json
+import shutil
+import tempfile
+import cStringIO
+import numpy
+import rgbecodec
+import headerscan
+
+
+class _WarningLog(object):
+    """collect warnings like a logger"""
+
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, msg):
+        self.warnings.append(msg)
+
+
+class TestHeaderScan(object):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmpdir, "sub"))
+        pixels = numpy.ones((3,4,6), numpy.float32)
+        for i in range(6):
+            header = ["rpict -vf view.vf -x 6 -y 4 scene.oct", "VIEW= -vta", "EXPOSURE=0.5"]
+            if i % 2:
+                header[0] += " -i"
+            name = os.path.join(self.tmpdir, ["", "sub"][i%3 == 0], "img%d.hdr" % i)
+            f = open(name, 'wb')
+            f.write(rgbecodec.encodePicture(pixels, header))
+            f.close()
+        for name, data in (("bad.pic", "P6\n"), ("notes.txt", "text")):
+            f = open(os.path.join(self.tmpdir, name), 'w')
+            f.write(data)
+            f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_find_pictures(self):
+        files = [os.path.relpath(p, self.tmpdir) for p in headerscan.findPictures([self.tmpdir])]
+        assert len(files) == 7
+        assert "notes.txt" not in files and files[0] == "bad.pic"
+
+    def test_picture_info(self):
+        info = headerscan.getPictureInfo(os.path.join(self.tmpdir, "img1.hdr"))
+        assert info['resolution'] == [6,4]
+        assert info['irradiance'] is True
+        assert info['exposure'] == 0.5 and info['view'] == "-vta"
+        info = headerscan.getPictureInfo(os.path.join(self.tmpdir, "bad.pic"))
+        assert info.has_key('error')
+
+    def test_processed_picture(self):
+        ## settings of earlier processing steps are indented
+        header = ["\trpict -vf view.vf -x 6 -y 4 scene.oct", "\tVIEW= -vtv", "\tEXPOSURE=2",
+                  "pcomb -s 2 -", "VIEW= -vta"]
+        name = os.path.join(self.tmpdir, "pcomb.hdr")
+        f = open(name, 'wb')
+        f.write(rgbecodec.encodePicture(numpy.ones((3,4,6), numpy.float32), header))
+        f.close()
+        info = headerscan.getPictureInfo(name)
+        assert info['exposure'] == 1.0 and info['view'] == "-vta"
+
+    def test_write_info_with_pool(self):
+        serial = cStringIO.StringIO()
+        log = _WarningLog()
+        assert headerscan.writeInfo(serial, [self.tmpdir], processes=1, log=log) == 1
+        assert len(log.warnings) == 1 and "can't read picture" in log.warnings[0]
+        minfiles = headerscan.POOL_MIN_FILES
+        headerscan.POOL_MIN_FILES = 0
+        try:
+            pooled = cStringIO.StringIO()
+            headerscan.writeInfo(pooled, [self.tmpdir], processes=2)
+        finally:
+            headerscan.POOL_MIN_FILES = minfiles
+        assert pooled.getvalue() == serial.getvalue()
+        infos = [json.loads(line) for line in serial.getvalue().splitlines()]
+        assert len(infos) == 7
+        assert sum([i.get('irradiance', False) for i in infos]) == 3
@@ -0,0 +1,74 @@
+import numpy
+import imagestats
+
+
+def _makePixels(xres=40, yres=30):
+    numpy.random.seed(3)
+    pixels = numpy.random.uniform(0, 2, (3,yres,xres)).astype(numpy.float32)
+    pixels[:,5:8,:] = 0
+    lum = pixels[0]*0.265 + pixels[1]*0.67 + pixels[2]*0.065
+    return pixels, lum
+
+
+class TestImageStatistics(object):
+
+    def test_extremes(self):
+        pixels, lum = _makePixels()
+        stats = imagestats.computeStatistics(pixels, lum)
+        row, x = numpy.unravel_index(lum.argmax(), lum.shape)
+        assert stats.maxpos == (x, 29-row)
+        assert numpy.allclose(stats.maxrgb, pixels[:,row,x])
+        assert stats.maxlum == lum.max()
+        ## first black pixel in scanline order (top row 5)
+        assert stats.minpos == (0, 29-5)
+        assert stats.minrgb == (0.0,0.0,0.0)
+
+    def test_blocks(self):
+        pixels, lum = _makePixels()
+        whole = imagestats.computeStatistics(pixels, lum)
+        stats = imagestats.ImageStatistics(40, 30)
+        for y0 in range(0, 30, 7):
+            stats.update(pixels[:,y0:y0+7], lum[y0:y0+7], y0)
+        assert (stats.minpos, stats.maxpos) == (whole.minpos, whole.maxpos)
+        assert numpy.allclose(stats.mean, lum.mean())
+        assert (stats.histogram == whole.histogram).all()
+
+    def test_histogram(self):
+        pixels, lum = _makePixels()
+        stats = imagestats.computeStatistics(pixels, lum)
+        assert stats.zeros == 3*40
+        assert stats.histogram.sum() + stats.zeros == lum.size
+        ## all values are below 10^0.5 (2*0.265+2*0.67+2*0.065=2)
+        top = (0.5 - imagestats.HIST_MIN) * imagestats.HIST_BINS_PER_DECADE
+        assert stats.histogram[int(top):].sum() == 0
+
+
+class TestQuantileSketch(object):
+
+    def setUp(self):
+        numpy.random.seed(7)
+        self.values = numpy.random.lognormal(0, 3, 100000)
+
+    def test_relative_accuracy(self):
+        sketch = imagestats.QuantileSketch()
+        for i in range(0, len(self.values), 1000):
+            sketch.add(self.values[i:i+1000])
+        for q in [0.01, 0.5, 0.9, 0.99, 0.999]:
+            exact = numpy.percentile(self.values, q*100, interpolation='lower')
+            assert abs(sketch.quantile(q) - exact) <= 0.011 * exact
+
+    def test_zeros(self):
+        sketch = imagestats.QuantileSketch()
+        sketch.add(numpy.zeros(60))
+        sketch.add(numpy.ones(40))
+        assert sketch.quantile(0.5) == 0
+        assert abs(sketch.quantile(0.7) - 1) < 0.01
+
+    def test_bounded_buckets(self):
+        ## merging the lowest buckets keeps the high quantiles
+        values = numpy.log(self.values + 1)
+        sketch = imagestats.QuantileSketch(maxbins=200)
+        sketch.add(values)
+        assert len(sketch.buckets) == 200
+        exact = numpy.percentile(values, 99, interpolation='lower')
+        assert abs(sketch.quantile(0.99) - exact) <= 0.011 * exact
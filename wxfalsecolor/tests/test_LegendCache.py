@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import numpy
+import legendcache
+
+
+class TestLegendCache(object):
+
+    def setUp(self):
+        self.cache = legendcache.LegendCache(size=2)
+        self.pixels = numpy.ones((3,4,5), numpy.float32) * 0.5
+        self.state = {'height': 200.0, '_legendOffX': 33}
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_memory_tier(self):
+        self.cache.put(('a',), self.pixels, self.state)
+        pixels, state = self.cache.get(('a',))
+        assert pixels is self.pixels
+        assert state == self.state
+        assert self.cache.get(('b',)) is None
+
+    def test_least_recently_used(self):
+        for key in ['a', 'b']:
+            self.cache.put(key, self.pixels, self.state)
+        self.cache.get('a')
+        self.cache.put('c', self.pixels, self.state)
+        assert self.cache.get('a') is not None
+        assert self.cache.get('b') is None
+
+    def test_disk_tier(self):
+        key = (1000, 8, 'cd/m2')
+        self.cache.put(key, self.pixels, self.state, self.tmpdir)
+        assert os.listdir(self.tmpdir) == [os.path.basename(self.cache.getPath(key, self.tmpdir))]
+        ## new process with empty memory tier
+        cache = legendcache.LegendCache()
+        pixels, state = cache.get(key, self.tmpdir)
+        assert numpy.allclose(pixels, self.pixels, rtol=0.01)
+        assert state == self.state
+        assert type(state['_legendOffX']) == int
+        assert cache.get((1000, 8, 'Lux'), self.tmpdir) is None
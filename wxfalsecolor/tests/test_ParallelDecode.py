@@ -0,0 +1,89 @@
+import os
+import tempfile
+import numpy
+import paralleldecode
+import rgbecodec
+
+
+class TestParallelDecode(object):
+
+    def setUp(self):
+        self._minpixels = paralleldecode.PARALLEL_MIN_PIXELS
+        paralleldecode.PARALLEL_MIN_PIXELS = 0
+        pixels = numpy.random.RandomState(7).rand(3,40,32).astype(numpy.float32)
+        pixels[:,10:20] = 0.5
+        self.data = rgbecodec.encodePicture(pixels, ["EXPOSURE=2"], rle=True)
+
+    def tearDown(self):
+        paralleldecode.PARALLEL_MIN_PIXELS = self._minpixels
+
+    def test_scanline_ranges(self):
+        assert paralleldecode.getScanlineRanges(10, 4) == [(0,2), (2,5), (5,7), (7,10)]
+        assert paralleldecode.getScanlineRanges(2, 8) == [(0,1), (1,2)]
+
+    def test_same_pixels_as_serial_decode(self):
+        expected, res = rgbecodec.decodePicture(self.data)
+        pixels, res = paralleldecode.decodePicture(self.data, workers=2)
+        assert res == (32,40)
+        assert pixels.dtype == numpy.float32
+        assert numpy.array_equal(pixels, expected)
+
+    def test_exposure_and_orientation(self):
+        data = self.data.replace("-Y 40 +X 32", "+Y 40 -X 32")
+        for original in (True, False):
+            expected, res = rgbecodec.decodePicture(data, original)
+            pixels, res = paralleldecode.decodePicture(data, original, workers=2)
+            assert numpy.array_equal(pixels, expected)
+
+    def test_small_picture_uses_serial_decode(self):
+        paralleldecode.PARALLEL_MIN_PIXELS = self._minpixels
+        called = []
+        decode = paralleldecode.decodeScanlinesParallel
+        paralleldecode.decodeScanlinesParallel = lambda *args: called.append(args)
+        try:
+            pixels, res = paralleldecode.decodePicture(self.data, workers=2)
+        finally:
+            paralleldecode.decodeScanlinesParallel = decode
+        assert not called and res == (32,40)
+
+    def test_truncated_picture(self):
+        data = self.data[:-200]
+        try:
+            paralleldecode.decodePicture(data, workers=2)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("truncated picture decoded")
+
+    def test_flat_picture_is_not_indexed(self):
+        pixels, res = rgbecodec.decodePicture(self.data)
+        flat = rgbecodec.encodePicture(pixels, rle=False)
+        lines, resstring, offset = rgbecodec.parseHeader(flat)
+        assert rgbecodec.indexScanlines(flat, offset, 32, 40, rleonly=True) is None
+        lines, resstring, offset = rgbecodec.parseHeader(self.data)
+        assert rgbecodec.indexScanlines(self.data, offset, 32, 40, rleonly=True) is not None
+        called = []
+        decode = paralleldecode.decodeScanlinesParallel
+        paralleldecode.decodeScanlinesParallel = lambda *args: called.append(args)
+        try:
+            result, res = paralleldecode.decodePicture(flat, original=False, workers=2)
+        finally:
+            paralleldecode.decodeScanlinesParallel = decode
+        assert not called and numpy.array_equal(result, pixels)
+
+    def test_worker_maps_picture_file(self):
+        fd, path = tempfile.mkstemp(suffix=".hdr")
+        try:
+            os.write(fd, self.data)
+            os.close(fd)
+            lines, resstring, offset = rgbecodec.parseHeader(self.data)
+            index = rgbecodec.indexScanlines(self.data, offset, 32, 40)
+            buf = numpy.zeros((3,40,32), numpy.float32)
+            paralleldecode._initWorker(buf, buf.shape, [2.0,2.0,2.0], path=path)
+            assert paralleldecode._decodeRange((5, 12, index[5], index[12])) == 7
+            expected, res = rgbecodec.decodePicture(self.data)
+            assert numpy.array_equal(buf[:,5:12], expected[:,5:12])
+            assert not buf[:,:5].any()
+        finally:
+            paralleldecode._worker.clear()
+            os.remove(path)
@@ -0,0 +1,37 @@
+import numpy
+import photometry
+import rgbecodec
+
+
+class TestPhotometry(object):
+
+    def test_radiance_primaries(self):
+        ## default primaries of Radiance (color.h)
+        coefficients = photometry.primariesToCoefficients(
+                [0.640,0.330, 0.290,0.600, 0.150,0.060, 1/3.0,1/3.0])
+        assert numpy.allclose(coefficients, photometry.RGB_COEFFICIENTS, atol=0.001)
+        assert abs(sum(coefficients) - 1) < 1e-9
+
+    def test_header_coefficients(self):
+        data = "#?RADIANCE\nFORMAT=%s\n\n-Y 1 +X 1\n"
+        header = rgbecodec.parsePictureHeader(data % photometry.XYZE_FORMAT)
+        assert photometry.getCoefficients(header) == photometry.XYZ_COEFFICIENTS
+        header = rgbecodec.parsePictureHeader(data % "32-bit_rle_rgbe")
+        assert photometry.getCoefficients(header) == photometry.RGB_COEFFICIENTS
+        ## sRGB primaries with D65 white point
+        srgb = "PRIMARIES= 0.64 0.33 0.30 0.60 0.15 0.06 0.3127 0.3290\n"
+        header = rgbecodec.parsePictureHeader((data % "32-bit_rle_rgbe").replace("\n", "\n" + srgb, 1))
+        assert numpy.allclose(photometry.getCoefficients(header), (0.2126,0.7152,0.0722), atol=0.0005)
+
+    def test_indented_history(self):
+        ## PRIMARIES and FORMAT of an earlier conversion step do not apply
+        data = ("#?RADIANCE\n\tPRIMARIES= 0.64 0.33 0.30 0.60 0.15 0.06 0.3127 0.3290\n"
+                "\tFORMAT=%s\nFORMAT=32-bit_rle_rgbe\n\n-Y 1 +X 1\n" % photometry.XYZE_FORMAT)
+        header = rgbecodec.parsePictureHeader(data)
+        assert photometry.getCoefficients(header) == photometry.RGB_COEFFICIENTS
+
+    def test_luminance_plane(self):
+        pixels = numpy.random.RandomState(2).rand(3,4,5).astype(numpy.float32)
+        lum = photometry.computeLuminance(pixels, (0.2, 0.5, 0.3))
+        assert lum.dtype == numpy.float32
+        assert numpy.allclose(lum, photometry.luminance(*pixels, coefficients=(0.2,0.5,0.3)))
@@ -0,0 +1,76 @@
+import numpy
+import pixelstore
+
+
+def _testPixels():
+    pixels = numpy.random.RandomState(3).rand(3, 12, 20).astype(numpy.float32)
+    pixels[0,2:5,3:8] = 0
+    return pixels
+
+
+class TestPixelStore(object):
+
+    def setUp(self):
+        self.pixels = _testPixels()
+        self.stores = [pixelstore.fromPixels(self.pixels),
+                       pixelstore.fromChannels(20, 12, *[c.ravel().tolist() for c in self.pixels])]
+
+    def test_no_copy(self):
+        assert self.stores[0]._channels is self.pixels
+
+    def test_pixel_values(self):
+        r,g,b = [float(c) for c in self.pixels[:,7,11]]
+        for store in self.stores:
+            rgbv = store.getRGBV(11, 7)
+            assert numpy.allclose(rgbv, (r,g,b,(r*.265+g*.67+b*.065)*179))
+            assert store.getRGBV(20, 0) == pixelstore.NO_VALUE
+            assert store.getRGBV(-1, 0) == pixelstore.NO_VALUE
+
+    def test_average_skips_black_pixels(self):
+        block = self.pixels[:,1:6,2:10]
+        valid = block[0] > 0
+        expected = [c[valid].mean() for c in block]
+        expected.append(pixelstore.rgbToValue(*expected))
+        for store in self.stores:
+            assert numpy.allclose(store.getAverage(2, 1, 9, 5), expected)
+            assert store.getAverage(3, 2, 7, 4) == pixelstore.NO_VALUE
+
+    def test_random_rectangles(self):
+        rand = numpy.random.RandomState(5)
+        for i in range(20):
+            x0, x1 = sorted(rand.randint(0, 20, 2))
+            y0, y1 = sorted(rand.randint(0, 12, 2))
+            block = self.pixels[:,y0:y1+1,x0:x1+1]
+            valid = block[0] > 0
+            if not valid.any():
+                continue
+            expected = [c[valid].mean(dtype=numpy.float64) for c in block]
+            for store in self.stores:
+                assert numpy.allclose(store.getAverage(x0, y0, x1, y1)[:3], expected)
+
+    def test_average_clipped_to_picture(self):
+        expected = self.stores[0].getAverage(15, 10, 19, 11)
+        for store in self.stores:
+            assert numpy.allclose(store.getAverage(15, 10, 40, 30), expected)
+            assert store.getAverage(25, 0, 30, 5) == pixelstore.NO_VALUE
+
+    def test_direct_sums_without_tables(self):
+        rects = [(2, 1, 9, 5), (3, 2, 7, 4), (15, 10, 40, 30), (0, 0, 19, 11), (6, 3, 6, 3)]
+        expected = [self.stores[0].getAverage(*rect) for rect in rects]
+        maxpixels = pixelstore.SUMMED_AREA_MAX_PIXELS
+        pixelstore.SUMMED_AREA_MAX_PIXELS = 20*12 - 1
+        try:
+            for store in [pixelstore.fromPixels(self.pixels),
+                          pixelstore.fromChannels(20, 12, *[c.ravel().tolist() for c in self.pixels])]:
+                for rect, avg in zip(rects, expected):
+                    assert numpy.allclose(store.getAverage(*rect), avg), rect
+                assert store._tables is None
+        finally:
+            pixelstore.SUMMED_AREA_MAX_PIXELS = maxpixels
+
+    def test_wrong_size(self):
+        try:
+            pixelstore.fromChannels(20, 11, *[c.ravel() for c in self.pixels])
+        except ValueError:
+            return
+        assert False
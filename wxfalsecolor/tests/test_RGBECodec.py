@@ -0,0 +1,427 @@
+import math
+import os
+import tempfile
+import cStringIO
+import numpy
+import rgbecodec
+
+
+def _toRGBE(r, g, b):
+    """convert one pixel to RGBE bytes (like Radiance setcolr)"""
+    d = max(r, g, b)
+    if d <= 1e-32:
+        return [0, 0, 0, 0]
+    m, e = math.frexp(d)
+    d = m * 256.0 / d
+    return [int(r*d), int(g*d), int(b*d), e + 128]
+
+
+def _rleChannel(values):
+    """encode one channel with runs for repeated values"""
+    out = []
+    i = 0
+    while i < len(values):
+        j = i
+        while j < len(values) and j-i < 127 and values[j] == values[i]:
+            j += 1
+        if j - i >= 4:
+            out += [128 + j - i, values[i]]
+            i = j
+        else:
+            n = min(128, len(values) - i)
+            out += [n] + values[i:i+n]
+            i += n
+    return out
+
+
+def _makePicture(pixels, header="", rle=True):
+    """return Radiance picture string for list of scanlines of (r,g,b)"""
+    yres = len(pixels)
+    xres = len(pixels[0])
+    data = "#?RADIANCE\n%sFORMAT=32-bit_rle_rgbe\n\n-Y %d +X %d\n" % (header, yres, xres)
+    body = []
+    for scan in pixels:
+        rgbe = [_toRGBE(*p) for p in scan]
+        if rle:
+            body += [2, 2, xres >> 8, xres & 255]
+            for c in range(4):
+                body += _rleChannel([v[c] for v in rgbe])
+        else:
+            for v in rgbe:
+                body += v
+    return data + "".join([chr(b) for b in body])
+
+
+def _isClose(a, b):
+    """compare with the precision of the shared RGBE exponent"""
+    tolerance = numpy.maximum(numpy.abs(b).max(axis=0), 1e-6) / 100.0
+    return (numpy.abs(a - b) <= tolerance).all()
+
+
+def _testPixels(xres=20, yres=6):
+    """return scanlines with gradients and flat areas"""
+    pixels = []
+    for y in range(yres):
+        scan = []
+        for x in range(xres):
+            if x < xres/2:
+                scan.append((0.5, 0.5, 0.5))
+            else:
+                scan.append((x*0.1, y*1.5, 0.01*(x+y)))
+        pixels.append(scan)
+    return pixels
+
+
+class TestRGBEDecoder(object):
+
+    def setUp(self):
+        self.pixels = _testPixels()
+        self.expected = numpy.array(self.pixels, numpy.float32).transpose(2,0,1)
+
+    def test_rle_picture(self):
+        data = _makePicture(self.pixels)
+        pixels, res = rgbecodec.decodePicture(data)
+        assert res == (20,6)
+        assert pixels.shape == (3,6,20)
+        assert pixels.dtype == numpy.float32
+        assert _isClose(pixels, self.expected)
+
+    def test_flat_picture(self):
+        data = _makePicture(self.pixels, rle=False)
+        pixels, res = rgbecodec.decodePicture(data)
+        assert _isClose(pixels, self.expected)
+
+    def test_old_style_runs(self):
+        data = _makePicture([[(1.0,2.0,3.0)]], rle=False)
+        data = data.replace("-Y 1 +X 1", "-Y 1 +X 5") + "\x01\x01\x01\x04"
+        pixels, res = rgbecodec.decodePicture(data)
+        assert res == (5,1)
+        assert numpy.allclose(pixels[:,0,4], [1.0,2.0,3.0], rtol=0.01)
+
+    def test_exposure(self):
+        data = _makePicture(self.pixels, header="EXPOSURE=2\nEXPOSURE=0.25\n")
+        pixels, res = rgbecodec.decodePicture(data)
+        assert _isClose(pixels, self.expected*2)
+        raw, res = rgbecodec.decodePicture(data, original=False)
+        assert _isClose(raw, self.expected)
+
+    def test_colorcorr(self):
+        data = _makePicture(self.pixels, header="COLORCORR=1 2 4\n")
+        pixels, res = rgbecodec.decodePicture(data)
+        cc = numpy.array([1.0,2.0,4.0]).reshape(3,1,1)
+        assert _isClose(pixels, self.expected/cc)
+
+    def test_zero_count_codes(self):
+        ## empty literals are skipped like Radiance freadscan does
+        data = _makePicture(self.pixels)
+        lines, resstring, offset = rgbecodec.parseHeader(data)
+        data = data[:offset+4] + "\x00" + data[offset+4:]
+        pixels, res = rgbecodec.decodePicture(data)
+        assert _isClose(pixels, self.expected)
+        index = rgbecodec.indexScanlines(data, offset, res[0], res[1])
+        assert index[-1] == len(data)
+
+    def test_truncated_data(self):
+        data = _makePicture(self.pixels)
+        try:
+            rgbecodec.decodePicture(data[:-10])
+        except ValueError:
+            return
+        assert False, "no ValueError for truncated picture"
+
+
+class TestRGBEWriter(object):
+
+    def setUp(self):
+        self.pixels = numpy.array(_testPixels(300, 5), numpy.float32).transpose(2,0,1)
+        ## runs longer than 127 and a run of 128 (split into 127+1)
+        self.pixels[:,0,:] = 0.25
+        self.pixels[:,1,:128] = 2.0
+
+    def test_rle_picture(self):
+        data = rgbecodec.encodePicture(self.pixels, ["EXPOSURE=2"], rle=True)
+        assert len(data) < len(rgbecodec.encodePicture(self.pixels))
+        lines, resstring, offset = rgbecodec.parseHeader(data)
+        assert lines == ["#?RADIANCE", "EXPOSURE=2", "FORMAT=32-bit_rle_rgbe"]
+        assert data[offset:offset+4] == "\x02\x02\x01\x2c"
+        pixels, res = rgbecodec.decodePicture(data, original=False)
+        assert res == (300,5)
+        assert _isClose(pixels, self.pixels)
+
+    def test_rle_channel_codes(self):
+        out = bytearray()
+        rgbecodec._encodeChannelRLE(numpy.array([5]*130 + [1,2,3] + [7]*4, numpy.uint8), out)
+        ## run of 127, literal of the rest (5,5,5,1,2,3), run of 4
+        assert list(out) == [255, 5, 6, 5, 5, 5, 1, 2, 3, 132, 7]
+
+    def test_flat_picture(self):
+        data = rgbecodec.encodePicture(self.pixels)
+        lines, resstring, offset = rgbecodec.parseHeader(data)
+        assert len(data) - offset == 300*5*4
+
+    def test_short_scanlines(self):
+        ## scanlines shorter than MINELEN can not be run length encoded
+        pixels = self.pixels[:,:,:5]
+        data = rgbecodec.encodePicture(pixels, rle=True)
+        lines, resstring, offset = rgbecodec.parseHeader(data)
+        assert len(data) - offset == 5*5*4
+
+    def test_streaming(self):
+        io = cStringIO.StringIO()
+        writer = rgbecodec.RGBEWriter(io, 300, 5)
+        writer.writeScanlines(self.pixels[:,:2])
+        writer.writeScanlines(self.pixels[:,2:])
+        assert io.getvalue() == rgbecodec.encodePicture(self.pixels, rle=True)
+        try:
+            writer.writeScanlines(self.pixels[:,:1])
+        except ValueError:
+            return
+        assert False, "no ValueError for too many scanlines"
+
+
+
+class TestScanlineReader(object):
+
+    def setUp(self):
+        self.pixels = _testPixels(xres=40, yres=12)
+        self.expected = numpy.array(self.pixels, numpy.float32).transpose(2,0,1)
+
+    def test_index(self):
+        for rle in (True, False):
+            data = _makePicture(self.pixels, rle=rle)
+            lines, resstring, offset = rgbecodec.parseHeader(data)
+            index = rgbecodec.indexScanlines(data, offset, 40, 12)
+            assert len(index) == 13
+            assert index[0] == offset and index[-1] == len(data)
+            if not rle:
+                assert index[1] - index[0] == 4*40
+
+    def test_old_style_runs(self):
+        data = _makePicture([[(1.0,2.0,3.0)]]*2, rle=False)
+        data = data.replace("-Y 2 +X 1", "-Y 2 +X 5")
+        body = data[-8:]
+        data = data[:-8] + body[:4] + "\x01\x01\x01\x04" + body[4:] + "\x01\x01\x01\x04"
+        reader = rgbecodec.ScanlineReader(data)
+        assert reader.getIndex()[1] - reader.getIndex()[0] == 8
+        assert numpy.allclose(reader.getPixel(4,1), [1.0,2.0,3.0], rtol=0.01)
+
+    def test_pixels_and_cache(self):
+        data = _makePicture(self.pixels, header="EXPOSURE=2\n")
+        reader = rgbecodec.ScanlineReader(data, cachesize=4)
+        for y in range(12):
+            assert _isClose(reader.getScanline(y), self.expected[:,y]/2)
+        assert reader._cache.keys() == [8,9,10,11]
+        assert reader.getScanline(10) is reader.getScanline(10)
+        assert _isClose(numpy.array(reader.getPixel(30,5)), self.expected[:,5,30]/2)
+        assert reader.getPixel(40,5) is None
+
+    def test_truncated_data(self):
+        data = _makePicture(self.pixels)
+        try:
+            rgbecodec.ScanlineReader(data[:-10]).getIndex()
+        except ValueError:
+            return
+        assert False, "no ValueError for truncated picture"
+
+
+
+class TestScanlineStream(object):
+
+    def setUp(self):
+        self.pixels = _testPixels(xres=40, yres=12)
+
+    def test_read_scanlines(self):
+        for rle in (True, False):
+            data = _makePicture(self.pixels, rle=rle)
+            expected, res = rgbecodec.decodePicture(data, original=False)
+            stream = rgbecodec.ScanlineStream(cStringIO.StringIO(data), chunksize=16)
+            assert stream.resolution == (40,12)
+            blocks = [rgbecodec.rgbeToFloat(stream.readScanlines(5)) for i in range(3)]
+            assert [b.shape[1] for b in blocks] == [5,5,2]
+            assert stream.readScanlines(5).shape == (4,0,40)
+            assert numpy.array_equal(numpy.concatenate(blocks, axis=1), expected)
+
+    def test_read_all(self):
+        data = _makePicture(self.pixels, header="EXPOSURE=2\n")
+        stream = rgbecodec.ScanlineStream(cStringIO.StringIO(data), chunksize=16)
+        assert stream.header.exposure == 2
+        assert stream.readAll() == data
+
+    def test_pixel_blocks(self):
+        data = _makePicture(self.pixels, header="EXPOSURE=2\n")
+        for d in (data, data.replace("-Y 12 +X 40", "+Y 12 -X 40")):
+            expected, res = rgbecodec.decodePicture(d)
+            blocks = list(rgbecodec.iterPixelBlocks(d, 5))
+            assert [b.shape[1] for b in blocks] == [5,5,2]
+            assert numpy.array_equal(numpy.concatenate(blocks, axis=1), expected)
+
+    def test_truncated_data(self):
+        stream = rgbecodec.ScanlineStream(cStringIO.StringIO(_makePicture(self.pixels)[:-10]))
+        stream.readScanlines(11)
+        try:
+            stream.readScanlines(1)
+        except ValueError:
+            return
+        assert False, "no ValueError for truncated picture"
+
+
+
+class TestMappedPicture(object):
+
+    def setUp(self):
+        self.pixels = _testPixels()
+        self.expected = numpy.array(self.pixels, numpy.float32).transpose(2,0,1)
+        fd, self.path = tempfile.mkstemp(suffix=".hdr")
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def _write(self, data):
+        f = open(self.path, 'wb')
+        f.write(data)
+        f.close()
+
+    def test_read_header(self):
+        comments = "".join(["# comment line %d\n" % i for i in range(200)])
+        data = _makePicture(_testPixels(200, 100), header=comments, rle=False)
+        self._write(data)
+        f = open(self.path, 'rb')
+        header = rgbecodec.readPictureHeader(f)
+        assert header.offset > rgbecodec.HEADER_CHUNK
+        assert f.tell() < len(data)
+        f.close()
+        assert (header.lines, header.resstring, header.offset) == rgbecodec.parseHeader(data)
+
+    def test_flat_view(self):
+        self._write(_makePicture(self.pixels, rle=False))
+        data = rgbecodec.mapPicture(self.path)
+        lines, resstring, offset = rgbecodec.parseHeader(data)
+        view = rgbecodec.getFlatView(data, offset, 20, 6)
+        assert view.shape == (4,6,20) and not view.flags['OWNDATA']
+        pixels, res = rgbecodec.decodePicture(data)
+        assert _isClose(pixels, self.expected)
+        del view
+        data.close()
+
+    def test_no_flat_view(self):
+        for data in (_makePicture(self.pixels), _makePicture(self.pixels, rle=False)[:-4]):
+            lines, resstring, offset = rgbecodec.parseHeader(data)
+            assert rgbecodec.getFlatView(data, offset, 20, 6) is None
+
+
+
+class TestPictureHeader(object):
+
+    def test_header_values(self):
+        header = "\n".join(["#?RADIANCE",
+            "rpict -vf view.vf -i -x 20 -y 6 scene.oct",
+            "VIEW= -vtv -vp 0 0 1",
+            "VIEW= -vh 60",
+            "EXPOSURE=2", "EXPOSURE=0.5e-1",
+            "COLORCORR=1 2 4",
+            "PIXASPECT=1.5",
+            "# comment",
+            "\tpcond -h",
+            "FORMAT=32-bit_rle_rgbe"])
+        data = header + "\n\n+X 20 -Y 6\n" + "\0"*480
+        info = rgbecodec.parsePictureHeader(data)
+        assert info.format == "32-bit_rle_rgbe"
+        assert abs(info.exposure - 0.1) < 1e-9
+        assert info.colorcorr == [1.0,2.0,4.0]
+        assert info.pixaspect == 1.5
+        assert info.view == "-vtv -vp 0 0 1 -vh 60"
+        assert info.history == ["rpict -vf view.vf -i -x 20 -y 6 scene.oct", "\tpcond -h"]
+        assert info.orientation == ("+X", "-Y")
+        assert info.resolution == (20,6)
+        ## indented commands are earlier processing steps
+        assert info.isIrradiance()
+
+    def test_indented_settings(self):
+        ## pcomb indents the header of its input picture
+        header = "\n".join(["#?RADIANCE",
+            "\trpict -vf view.vf -x 20 -y 6 scene.oct",
+            "\tVIEW= -vtv -vp 0 0 1",
+            "\tEXPOSURE=2",
+            "\tCOLORCORR=1 2 4",
+            "\tPRIMARIES=0.64 0.33 0.3 0.6 0.15 0.06 0.3127 0.329",
+            "\tFORMAT=32-bit_rle_xyze",
+            "pcomb -s 0.5 -",
+            "EXPOSURE=0.5"])
+        data = _makePicture(_testPixels(), header=header[len("#?RADIANCE\n"):] + "\n")
+        info = rgbecodec.parsePictureHeader(data)
+        assert info.format == "32-bit_rle_rgbe"
+        assert info.exposure == 0.5
+        assert info.colorcorr == [1.0,1.0,1.0]
+        assert info.getChannelExposure() == [0.5,0.5,0.5]
+        assert info.primaries is None
+        assert info.view == ""
+        assert "\tEXPOSURE=2" in info.history and "pcomb -s 0.5 -" in info.history
+        pixels, res = rgbecodec.decodePicture(data)
+        raw, res = rgbecodec.decodePicture(data, original=False)
+        assert _isClose(pixels, raw*2)
+
+    def test_pcond_history(self):
+        data = _makePicture(_testPixels(), header="rpict -i\npcond -h\n")
+        assert not rgbecodec.parsePictureHeader(data).isIrradiance()
+
+    def test_bad_headers(self):
+        for data in ("#?RADIANCE\n\n-Y 6 -Y 20\n", "#?RADIANCE\n\n-Y 6\n", "P6\n20 6\n255\n"):
+            try:
+                rgbecodec.readPictureHeader(cStringIO.StringIO(data))
+            except ValueError:
+                continue
+            assert False, "no ValueError for '%s'" % data
+
+
+
+ORIENTATIONS = [(a, b) for a in ("-Y","+Y") for b in ("+X","-X")] + \
+               [(a, b) for a in ("+X","-X") for b in ("-Y","+Y")]
+
+
+class TestOrientation(object):
+
+    def setUp(self):
+        ## 5x3 picture with distinct values
+        self.expected = numpy.arange(1, 46, dtype=numpy.float32).reshape(3,3,5)
+
+    def _makeStored(self, orientation):
+        """return picture in file order for <orientation>"""
+        nscans, scanlen = rgbecodec.getScanlineShape((5,3), orientation)
+        stored = numpy.zeros((3,nscans,scanlen), numpy.float32)
+        for y in range(3):
+            for x in range(5):
+                scan, pos = rgbecodec.getStoredPosition(x, y, (5,3), orientation)
+                stored[:,scan,pos] = self.expected[:,y,x]
+        sizes = {'X': 5, 'Y': 3}
+        resstring = "%s %d %s %d" % (orientation[0], sizes[orientation[0][1]], orientation[1], sizes[orientation[1][1]])
+        data = rgbecodec.encodePicture(stored)
+        return data.replace("-Y %d +X %d" % (nscans, scanlen), resstring, 1), stored
+
+    def test_all_orientations(self):
+        for orientation in ORIENTATIONS:
+            data, stored = self._makeStored(orientation)
+            header = rgbecodec.parsePictureHeader(data)
+            assert header.orientation == orientation
+            assert header.resolution == (5,3)
+            pixels, res = rgbecodec.decodePicture(data)
+            assert res == (5,3)
+            assert _isClose(pixels, self.expected), orientation
+            reader = rgbecodec.ScanlineReader(data)
+            assert _isClose(numpy.array(reader.getPixel(4,0)), self.expected[:,0,4])
+            assert _isClose(numpy.array(reader.getPixel(1,2)), self.expected[:,2,1])
+
+    def test_views(self):
+        stored = numpy.zeros((4,5,3), numpy.uint8)
+        for orientation in ORIENTATIONS[4:]:
+            view = rgbecodec.orientPixels(stored, orientation)
+            assert view.shape == (4,3,5)
+            assert view.base is stored or view.base.base is stored
+
+    def test_bad_resolution(self):
+        for resstring in ("-Y 3 -Y 5", "Y 3 +X 5", "-Y 3 +X", "-Z 3 +X 5"):
+            try:
+                rgbecodec.parseResolution(resstring)
+            except ValueError:
+                continue
+            assert False, resstring
@@ -0,0 +1,73 @@
+import cStringIO
+import struct
+import zlib
+import numpy
+import displaycodec
+import tiffcodec
+
+
+def _readTIFF(data):
+    """return tags and decoded strip data of little endian TIFF"""
+    order, magic, offset = struct.unpack("<2sHI", data[:8])
+    assert (order, magic) == ("II", 42)
+    n, = struct.unpack("<H", data[offset:offset+2])
+    sizes = {3: 2, 4: 4, 5: 8}
+    formats = {3: "H", 4: "I", 5: "II"}
+    tags = {}
+    for i in range(n):
+        entry = data[offset+2+12*i:offset+14+12*i]
+        tag, type, count = struct.unpack("<HHI", entry[:8])
+        size = sizes[type] * count
+        if size <= 4:
+            raw = entry[8:8+size]
+        else:
+            pos, = struct.unpack("<I", entry[8:])
+            raw = data[pos:pos+size]
+        tags[tag] = struct.unpack("<" + formats[type]*count, raw)
+    strips = [data[o:o+c] for o,c in zip(tags[273], tags[279])]
+    if tags[259] == (8,):
+        strips = [zlib.decompress(s) for s in strips]
+    return tags, "".join(strips)
+
+
+class TestTiffCodec(object):
+
+    def setUp(self):
+        self.pixels = numpy.random.RandomState(1).rand(3, 100, 300).astype(numpy.float32)
+        self.pixels *= 5
+
+    def _write(self, **kwargs):
+        io = cStringIO.StringIO()
+        tiffcodec.writeTIFF(io, self.pixels, **kwargs)
+        return _readTIFF(io.getvalue())
+
+    def test_8bit(self):
+        tags, data = self._write()
+        assert tags[256] == (300,) and tags[257] == (100,)
+        assert tags[258] == (8,8,8) and tags[259] == (1,)
+        assert data == displaycodec.toDisplayRGB(self.pixels).tostring()
+
+    def test_float_strips(self):
+        tags, data = self._write(bits=32, compress=True)
+        assert tags[259] == (8,) and tags[339] == (3,3,3)
+        rows = tiffcodec.getRowsPerStrip(300, 32)
+        assert tags[278] == (rows,)
+        assert len(tags[273]) == (100 + rows - 1) / rows > 1
+        rgb = numpy.fromstring(data, '<f4').reshape(100, 300, 3)
+        assert (rgb.transpose(2,0,1) == self.pixels).all()
+
+    def test_blocks(self):
+        rows = tiffcodec.getRowsPerStrip(300, 32)
+        blocks = [self.pixels[:,y:y+rows] for y in range(0, 100, rows)]
+        io = cStringIO.StringIO()
+        tiffcodec.writeTIFFBlocks(io, 300, 100, iter(blocks), bits=32)
+        expected = cStringIO.StringIO()
+        tiffcodec.writeTIFF(expected, self.pixels, bits=32)
+        assert io.getvalue() == expected.getvalue()
+
+    def test_invalid_depth(self):
+        try:
+            self._write(bits=16)
+        except ValueError:
+            return
+        assert False
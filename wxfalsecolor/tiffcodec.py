@@ -0,0 +1,150 @@
+##
+## tiffcodec.py - part of wxfalsecolor
+##
+## $Id$
+## $URL$
+
+"""in-process TIFF writer for float pictures
+
+Pictures are written as 8-bit RGB (display values like ra_tiff) or
+as 32-bit IEEE float RGB with the unchanged picture values, each
+uncompressed or deflate compressed. Strips are converted and written
+one at a time and the image directory follows the strip data, so the
+file object has to support seek() and tell(). writeTIFFBlocks()
+takes the strips from an iterator, so a picture does not have to be
+decoded completely.
+"""
+
+import struct
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import displaycodec
+
+## uncompressed size of one strip in bytes
+STRIP_SIZE = 65536
+
+## zlib compression level of deflate compressed strips
+DEFLATE_LEVEL = 6
+
+## TIFF compression values
+COMPRESSION_NONE = 1
+COMPRESSION_DEFLATE = 8
+
+## TIFF field types and struct formats of their values
+## (rationals are pairs of values)
+SHORT = 3
+LONG = 4
+RATIONAL = 5
+_TYPE_FORMATS = {SHORT: "H", LONG: "I", RATIONAL: "I"}
+
+
+
+def getRowsPerStrip(xres, bits=8):
+    """return number of scanlines per strip for <xres> pixels"""
+    rowsize = xres * 3 * bits / 8
+    return max(1, STRIP_SIZE / rowsize)
+
+
+def _iterStrips(blocks, bits, gamma):
+    """yield interleaved RGB data of planar float blocks of scanlines"""
+    for block in blocks:
+        if bits == 8:
+            yield displaycodec.toDisplayRGB(block, gamma).tostring()
+        else:
+            rgb = numpy.empty(block.shape[1:] + (3,), '<f4')
+            for c in range(3):
+                rgb[:,:,c] = block[c]
+            yield rgb.tostring()
+
+
+def _packEntry(tag, type, values, extoffset):
+    """return IFD entry and out-of-line data of field"""
+    fmt = "<" + _TYPE_FORMATS[type] * len(values)
+    if type == RATIONAL:
+        count = len(values) / 2
+    else:
+        count = len(values)
+    data = struct.pack(fmt, *values)
+    if len(data) <= 4:
+        return struct.pack("<HHI", tag, type, count) + data.ljust(4, "\0"), ""
+    return struct.pack("<HHII", tag, type, count, extoffset), data
+
+
+def _packIFD(fields, offset):
+    """return image file directory of <fields> starting at <offset>"""
+    fields = sorted(fields)
+    ifdsize = 2 + 12*len(fields) + 4
+    entries = []
+    extdata = ""
+    for tag, type, values in fields:
+        entry, data = _packEntry(tag, type, values, offset + ifdsize + len(extdata))
+        entries.append(entry)
+        ## out-of-line values start on a word boundary
+        extdata += data + "\0" * (len(data) % 2)
+    return struct.pack("<H", len(fields)) + "".join(entries) + struct.pack("<I", 0) + extdata
+
+
+def writeTIFF(fileobj, pixels, bits=8, compress=False, gamma=displaycodec.DEFAULT_GAMMA):
+    """write planar float pixels as 8-bit or 32-bit float RGB TIFF image"""
+    yres, xres = pixels.shape[1:]
+    rows = getRowsPerStrip(xres, bits)
+    blocks = (pixels[:,y0:y0+rows] for y0 in xrange(0, yres, rows))
+    writeTIFFBlocks(fileobj, xres, yres, blocks, bits, compress, gamma)
+
+
+def writeTIFFBlocks(fileobj, xres, yres, blocks, bits=8, compress=False, gamma=displaycodec.DEFAULT_GAMMA):
+    """write planar float blocks of scanlines as 8-bit or 32-bit float RGB TIFF image
+
+    Each block of <blocks> is one strip of getRowsPerStrip() scanlines
+    (the last block can be smaller).
+    """
+    if bits not in (8, 32):
+        raise ValueError("unsupported TIFF sample size: %r" % bits)
+    rows = getRowsPerStrip(xres, bits)
+    start = fileobj.tell()
+    fileobj.write(struct.pack("<2sHI", "II", 42, 0))
+    offsets = []
+    counts = []
+    pos = 8
+    for data in _iterStrips(blocks, bits, gamma):
+        if compress:
+            data = zlib.compress(data, DEFLATE_LEVEL)
+        fileobj.write(data)
+        offsets.append(pos)
+        counts.append(len(data))
+        pos += len(data)
+    if pos % 2:
+        fileobj.write("\0")
+        pos += 1
+    if compress:
+        compression = COMPRESSION_DEFLATE
+    else:
+        compression = COMPRESSION_NONE
+    if bits == 32:
+        sampleformat = 3
+    else:
+        sampleformat = 1
+    fields = [(256, LONG,     [xres]),
+              (257, LONG,     [yres]),
+              (258, SHORT,    [bits]*3),
+              (259, SHORT,    [compression]),
+              (262, SHORT,    [2]),
+              (273, LONG,     offsets),
+              (277, SHORT,    [3]),
+              (278, LONG,     [rows]),
+              (279, LONG,     counts),
+              (282, RATIONAL, [72, 1]),
+              (283, RATIONAL, [72, 1]),
+              (284, SHORT,    [1]),
+              (296, SHORT,    [2]),
+              (339, SHORT,    [sampleformat]*3)]
+    fileobj.write(_packIFD(fields, pos))
+    end = fileobj.tell()
+    fileobj.seek(start + 4)
+    fileobj.write(struct.pack("<I", pos))
+    fileobj.seek(end)
@@ -56,7 +56,7 @@ from config import WxfcConfig
 from controlpanels import FoldableControlsPanel
 from falsecolor2 import FalsecolorOptionParser, InterfaceBase
 from imagepanel import ImagePanel
-from rgbeimage import RGBEImage, WX_IMAGE_FORMATS, WX_IMAGE_WILDCARD
+from rgbeimage import RGBEImage, WX_IMAGE_FORMATS, WX_IMAGE_WILDCARD, TIFF_FLOAT_WILDCARD, TIFF_FLOAT_RAW_WILDCARD
 from updatemanager import UpdateManager
 
 
@@ -522,7 +522,11 @@ class WxfcFrame(wx.Frame):
 
 
     def _loadImageData(self):
-        """load image data of small images immediately"""
+        """load image data of small images immediately
+
+        Values under the cursor of larger images are read from single
+        scanlines until the data is loaded with 'load data'.
+        """
         ## TODO: evaluate image data (exclude fc images)
         max_size = self._config.getint("lables", "max_data_load", 1000000)
         if max_size == 0:
@@ -536,14 +540,9 @@ class WxfcFrame(wx.Frame):
             ## call OnShowValues with fake event
             self.lablecontrols.OnShowValues(-1)
         else:
-            self.statusbar.SetStatusText("confirm 'load data'")
-            msg = "This is a large image.\nDo you want to load image data now?"
-            dlg = wx.MessageDialog(self, message=msg, caption="Load data?", style=wx.YES_NO|wx.YES_DEFAULT|wx.ICON_QUESTION)
-            if dlg.ShowModal() == wx.ID_YES:
-                self.lablecontrols.OnShowValues(-1)
-            else:
-                self.lablecontrols.reset()
-                self.statusbar.SetStatusText("skipping 'load data'.")
+            self._log.info("large image: reading values from scanlines")
+            self.lablecontrols.reset()
+            self.statusbar.SetStatusText("use 'load data' for average values")
 
 
     def loadValues(self):
@@ -584,7 +583,8 @@ class WxfcFrame(wx.Frame):
         dirname, filename = os.path.split(self.path)
         filebase = os.path.splitext(filename)[0]
         #formats = "|".join(["HDR file|*.hdr", WX_IMAGE_WILDCARD, "PIC (old)|*.pic"])
-        formats = "|".join(["HDR file|*.hdr", WX_IMAGE_WILDCARD, "PPM file|*.ppm"])
+        formats = "|".join(["HDR file|*.hdr", WX_IMAGE_WILDCARD, "PPM file|*.ppm",
+                             TIFF_FLOAT_WILDCARD, TIFF_FLOAT_RAW_WILDCARD])
         filedialog = wx.FileDialog(self,
                           message = 'save image',
                           defaultDir = dirname,
@@ -593,7 +593,15 @@ class WxfcFrame(wx.Frame):
                           style = wx.SAVE)
         if filedialog.ShowModal() == wx.ID_OK:
             path = filedialog.GetPath()
-            result = self.rgbeImg.saveToFile(path)
+            tifbits = 8
+            tifcompress = True
+            ## float TIFF entries are the last two entries of the format list
+            last = formats.count("|") / 2
+            if filedialog.GetFilterIndex() in (last-1, last):
+                tifbits = 32
+            if filedialog.GetFilterIndex() == last:
+                tifcompress = False
+            result = self.rgbeImg.saveToFile(path, tifbits, tifcompress)
             if result != True:
                 msg = "Error saving image:\n" + self.rgbeImg.error
                 self.showError(msg)